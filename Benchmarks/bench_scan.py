@@ -0,0 +1,441 @@
+#End-to-end scan benchmark: getbounding -> crop_out_card -> get_text_from_image -> get_best_matched_clip
+#Runs fully offline (no Supabase) over Image_detection/images plus a synthetic multi-card corpus,
+#reports per-stage p50/p95/p99, images/sec, peak RSS and accuracy, and compares against a JSON baseline.
+#Usage:
+#  python bench_scan.py                                   # run and print
+#  python bench_scan.py --save-baseline baselines/local.json
+#  python bench_scan.py --compare baselines/local.json --fail-on-regression
+#  python bench_scan.py --ocr-compare                     # batched header OCR vs the per-card thread fan-out
+#  python bench_scan.py --crop-compare 224,320,448,800      # CROP_MIN_HEIGHT: re-decode rate, ingest ms and ids vs full-res
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from Image_detection import scan_card
+from Image_detection.scan_card import getbounding, crop_out_card, get_text_from_image, get_text_from_images, get_best_matched_clip
+from Image_detection.card_identity import identity_from_filename
+from Image_detection.image_ingest import decode_upload
+
+SAMPLE_IMAGES_DIR = os.path.join(PROJECT_ROOT, 'Image_detection', 'images')
+LABELS_FILE = os.path.join(SCRIPT_DIR, 'labels.json')  # optional {"filename.jpg": "set-number"} ground truth
+BASELINE_DIR = os.path.join(SCRIPT_DIR, 'baselines')
+
+STAGES = ["detect", "crop", "ocr", "clip", "total"]
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def summarize(samples): #Latency summary in milliseconds
+    if not samples:
+        return None
+    arr = np.array(samples) * 1000
+    return {
+        "n": len(samples),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+    }
+
+def list_images(folder):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+
+def load_labels():
+    if os.path.exists(LABELS_FILE):
+        with open(LABELS_FILE) as f:
+            return json.load(f)
+    return {}
+
+@contextlib.contextmanager
+def quiet(enabled): #The pipeline prints a lot, keep it out of the report unless --verbose
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def identify(card_image, timings): #OCR + CLIP on one crop, appends stage timings, returns best match dict (or None)
+    start = time.perf_counter()
+    card_info = get_text_from_image(card_image, debug=False)
+    timings["ocr"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    best, _ = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=card_info.get('name'))
+    timings["clip"].append(time.perf_counter() - start)
+    return best
+
+def run_single(image, timings): #Same path as /scan_card/
+    total_start = time.perf_counter()
+
+    start = time.perf_counter()
+    result = getbounding(image, display=False)
+    timings["detect"].append(time.perf_counter() - start)
+    if not result or not isinstance(result, tuple) or result[1] is None:
+        timings["total"].append(time.perf_counter() - total_start)
+        return []
+
+    start = time.perf_counter()
+    card_image = crop_out_card(image, result[1])
+    timings["crop"].append(time.perf_counter() - start)
+
+    best = identify(card_image, timings)
+    timings["total"].append(time.perf_counter() - total_start)
+    return [(result[1], best)]
+
+def run_multi(image, timings): #Same path as /scan_multiple_cards/ (sequential, so stage timings stay per card)
+    total_start = time.perf_counter()
+
+    start = time.perf_counter()
+    result = getbounding(image, display=False, multi_card=True, conf_threshold=0.7)
+    timings["detect"].append(time.perf_counter() - start)
+    if not result or not isinstance(result, tuple) or not result[1]:
+        timings["total"].append(time.perf_counter() - total_start)
+        return []
+
+    found = []
+    for bbox_data in result[1]:
+        start = time.perf_counter()
+        card_image = crop_out_card(image, bbox_data['bbox_norm'])
+        timings["crop"].append(time.perf_counter() - start)
+        found.append((bbox_data['bbox_norm'], identify(card_image, timings)))
+
+    timings["total"].append(time.perf_counter() - total_start)
+    return found
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def card_sources(labels): #(image, card_id or None) cards to paste into synthetic scenes: reference images if present, else sample crops
+    sources = []
+    reference_dir = os.path.join(PROJECT_ROOT, 'Image_detection', 'reference_images', 'EverySinglePokemonCard')
+    reference_files = list_images(reference_dir)
+    if reference_files:
+        random.seed(0)
+        for filename in random.sample(reference_files, min(40, len(reference_files))):
+            image = cv2.imread(os.path.join(reference_dir, filename))
+            if image is not None:
+                sources.append((image, identity_from_filename(filename)['card_id']))
+        return sources
+
+    for filename in list_images(SAMPLE_IMAGES_DIR):
+        image = cv2.imread(os.path.join(SAMPLE_IMAGES_DIR, filename))
+        result = getbounding(image, display=False) if image is not None else None
+        if result and isinstance(result, tuple) and result[1] is not None:
+            sources.append((crop_out_card(image, result[1]), labels.get(filename)))
+    return sources
+
+def make_synthetic_scene(sources, rows, cols, rng, card_height=700): #Lay cards out on a noisy table, returns (image, [(bbox_norm, card_id)])
+    card_width = int(card_height * 63 / 88)  # real card aspect ratio
+    gap = card_height // 6
+    h = rows * card_height + (rows + 1) * gap
+    w = cols * card_width + (cols + 1) * gap
+    canvas = rng.integers(60, 120, size=(h, w, 3), dtype=np.uint8)
+    canvas = cv2.GaussianBlur(canvas, (0, 0), 5)
+
+    truth = []
+    for r in range(rows):
+        for c in range(cols):
+            card, card_id = sources[rng.integers(len(sources))]
+            card = cv2.resize(card, (card_width, card_height), interpolation=cv2.INTER_AREA)
+            x = gap + c * (card_width + gap) + int(rng.integers(-gap // 3, gap // 3 + 1))
+            y = gap + r * (card_height + gap) + int(rng.integers(-gap // 3, gap // 3 + 1))
+            canvas[y:y + card_height, x:x + card_width] = card
+            truth.append(([x / w, y / h, (x + card_width) / w, (y + card_height) / h], card_id))
+    return canvas, truth
+
+def build_corpora(args, labels):
+    corpora = {"samples": [], "synthetic": []}
+    for filename in list_images(SAMPLE_IMAGES_DIR):
+        image = cv2.imread(os.path.join(SAMPLE_IMAGES_DIR, filename))
+        if image is not None:
+            truth = [(None, labels.get(filename))]
+            corpora["samples"].append((filename, image, truth, run_single))
+
+    if args.synthetic > 0:
+        sources = card_sources(labels)
+        if not sources:
+            print("No card sources for the synthetic corpus (no detections in the sample images), skipping it")
+        rng = np.random.default_rng(0)
+        layouts = [(1, 2), (2, 2), (3, 3), (3, 4)]
+        for i in range(args.synthetic if sources else 0):
+            rows, cols = layouts[i % len(layouts)]
+            image, truth = make_synthetic_scene(sources, rows, cols, rng)
+            corpora["synthetic"].append((f"synthetic_{i}_{rows}x{cols}", image, truth, run_multi))
+    return corpora
+
+def run_corpus(items, args): #Returns the per-corpus report
+    timings = {stage: [] for stage in STAGES}
+    labeled = correct = 0
+    placed = detected = 0
+
+    # Warm up model loads so they don't land in the percentiles
+    for _, image, _, runner in items[:args.warmup]:
+        with quiet(not args.verbose):
+            runner(image, {stage: [] for stage in STAGES})
+
+    wall_start = time.perf_counter()
+    for _ in range(args.repeat):
+        for name, image, truth, runner in items:
+            with quiet(not args.verbose):
+                found = runner(image, timings)
+
+            if runner is run_multi:
+                placed += len(truth)
+                for bbox_true, card_id in truth:
+                    match = max(found, key=lambda f: iou(f[0], bbox_true), default=None)
+                    hit = match is not None and iou(match[0], bbox_true) >= 0.5
+                    detected += hit
+                    if card_id:
+                        labeled += 1
+                        correct += bool(hit and match[1] and match[1]['card_id'] == card_id)
+            else:
+                card_id = truth[0][1]
+                if card_id:
+                    labeled += 1
+                    correct += bool(found and found[0][1] and found[0][1]['card_id'] == card_id)
+    wall = time.perf_counter() - wall_start
+
+    images = len(items) * args.repeat
+    report = {
+        "images": images,
+        "wall_seconds": wall,
+        "images_per_sec": images / wall if wall > 0 else 0.0,
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()},
+        "accuracy": correct / labeled if labeled else None,
+        "labeled": labeled,
+    }
+    if placed:
+        report["detection_recall"] = detected / placed
+    return report
+
+def compare_ocr(items, args): #Multi-card OCR: one thread per card (old /scan_multiple_cards/) vs one batched call over the headers
+    scenes = []
+    with quiet(not args.verbose):
+        for name, image, truth, runner in items:
+            result = getbounding(image, display=False, multi_card=True, conf_threshold=0.7)
+            if result and isinstance(result, tuple) and result[1]:
+                scenes.append((name, [crop_out_card(image, b['bbox_norm']) for b in result[1]]))
+        if scenes: # warm both paths
+            get_text_from_images(scenes[0][1])
+            get_text_from_image(scenes[0][1][0], debug=False)
+
+    fanout_times, batched_times = [], []
+    agree = cards = 0
+    for _ in range(args.repeat):
+        for name, crops in scenes:
+            with quiet(not args.verbose):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=min(10, len(crops))) as executor:
+                    fanout = list(executor.map(lambda crop: get_text_from_image(crop, debug=False), crops))
+                fanout_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                batched = get_text_from_images(crops)
+                batched_times.append(time.perf_counter() - start)
+            cards += len(crops)
+            agree += sum(a.get('name') == b.get('name') for a, b in zip(fanout, batched))
+
+    if not scenes:
+        return None
+    report = {
+        "scenes": len(scenes) * args.repeat,
+        "cards": cards,
+        "fanout": summarize(fanout_times),
+        "batched": summarize(batched_times),
+        "speedup": float(np.sum(fanout_times) / np.sum(batched_times)),
+        "name_agreement": agree / cards if cards else None,
+    }
+    print(f"\nMULTI-CARD OCR ({report['scenes']} scenes, {cards} cards)")
+    print(f"  {'path':8} {'p50 ms':>10} {'p95 ms':>10}")
+    for path in ("fanout", "batched"):
+        print(f"  {path:8} {report[path]['p50']:10.1f} {report[path]['p95']:10.1f}")
+    print(f"  speedup: {report['speedup']:.2f}x, OCR name agrees on {report['name_agreement']:.1%} of cards")
+    return report
+
+def phone_jpeg(image, long_side=4032, quality=90): #Scene upscaled to a 12MP phone photo and JPEG encoded, so decode_upload takes the reduced path
+    scale = long_side / max(image.shape[:2])
+    image = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)), interpolation=cv2.INTER_CUBIC)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+def compare_crop_heights(sources, heights, args): #Per CROP_MIN_HEIGHT: how often crops go back to the file, ingest cost, and ids vs full-res crops
+    rng = np.random.default_rng(1)
+    scenes = []
+    for rows, cols in [(1, 1), (1, 2), (2, 2), (3, 3)] * 2: # one card filling the frame up to a binder page
+        image, truth = make_synthetic_scene(sources, rows, cols, rng)
+        scenes.append((phone_jpeg(image), truth))
+
+    def ingest(data, truth, min_height):
+        start = time.perf_counter()
+        upload = decode_upload(data)
+        crops, redecoded = [], 0
+        for bbox, _ in truth:
+            source = upload.crop_source(bbox, min_height=min_height)
+            redecoded += source is not upload.image
+            crops.append(crop_out_card(source, bbox))
+        return crops, redecoded, time.perf_counter() - start
+
+    def card_ids(crops):
+        with quiet(not args.verbose):
+            found = [identify(crop, {stage: [] for stage in STAGES}) for crop in crops]
+        return [best['card_id'] if best else None for best in found]
+
+    full_height = 10 ** 9  # every small crop from the full-res decode, the reference
+    reference = [card_ids(ingest(data, truth, full_height)[0]) for data, truth in scenes]
+    report = {}
+    for min_height in [full_height] + heights:
+        times, redecoded, cards, agree, labeled, correct = [], 0, 0, 0, 0, 0
+        for (data, truth), ref in zip(scenes, reference):
+            for _ in range(args.repeat):
+                crops, count, seconds = ingest(data, truth, min_height)
+                times.append(seconds)
+            ids = card_ids(crops)
+            redecoded += count
+            cards += len(truth)
+            agree += sum(a == b for a, b in zip(ids, ref))
+            for (_, card_id), found in zip(truth, ids):
+                if card_id:
+                    labeled += 1
+                    correct += found == card_id
+        report["full" if min_height == full_height else str(min_height)] = {
+            "ingest": summarize(times),
+            "redecode_rate": redecoded / cards,
+            "agreement": agree / cards,
+            "accuracy": correct / labeled if labeled else None,
+        }
+
+    print(f"\nCROP_MIN_HEIGHT ({len(scenes)} scenes at 4032px, {sum(len(t) for _, t in scenes)} cards)")
+    print(f"  {'height':8} {'redecode':>9} {'p50 ms':>10} {'p95 ms':>10} {'same id':>8} {'accuracy':>9}")
+    for height, data in report.items():
+        accuracy = f"{data['accuracy']:.1%}" if data["accuracy"] is not None else "-"
+        print(f"  {height:8} {data['redecode_rate']:9.1%} {data['ingest']['p50']:10.1f} {data['ingest']['p95']:10.1f} {data['agreement']:8.1%} {accuracy:>9}")
+    return report
+
+def compare(current, baseline, latency_tol, accuracy_tol): #List of human readable regressions
+    regressions = []
+    for corpus, cur in current["corpora"].items():
+        base = baseline.get("corpora", {}).get(corpus)
+        if not base:
+            continue
+        for stage in STAGES:
+            cur_stage, base_stage = cur["stages"].get(stage), base["stages"].get(stage)
+            if not cur_stage or not base_stage:
+                continue
+            for pct in ("p50", "p95"):
+                if cur_stage[pct] > base_stage[pct] * (1 + latency_tol):
+                    regressions.append(f"{corpus}/{stage} {pct}: {base_stage[pct]:.1f}ms -> {cur_stage[pct]:.1f}ms")
+        if base["images_per_sec"] and cur["images_per_sec"] < base["images_per_sec"] * (1 - latency_tol):
+            regressions.append(f"{corpus} images/sec: {base['images_per_sec']:.2f} -> {cur['images_per_sec']:.2f}")
+        for metric in ("accuracy", "detection_recall"):
+            if base.get(metric) is not None and cur.get(metric) is not None and cur[metric] < base[metric] - accuracy_tol:
+                regressions.append(f"{corpus} {metric}: {base[metric]:.3f} -> {cur[metric]:.3f}")
+    if current["peak_rss_mb"] > baseline.get("peak_rss_mb", float("inf")) * (1 + latency_tol):
+        regressions.append(f"peak RSS: {baseline['peak_rss_mb']:.0f}MB -> {current['peak_rss_mb']:.0f}MB")
+    return regressions
+
+def print_report(report):
+    for corpus, data in report["corpora"].items():
+        print(f"\n{corpus.upper()} ({data['images']} images, {data['images_per_sec']:.2f} images/sec)")
+        print(f"  {'stage':8} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for stage in STAGES:
+            s = data["stages"][stage]
+            if s:
+                print(f"  {stage:8} {s['n']:5} {s['p50']:10.1f} {s['p95']:10.1f} {s['p99']:10.1f}")
+        if data["accuracy"] is not None:
+            print(f"  accuracy: {data['accuracy']:.1%} of {data['labeled']} labeled cards")
+        if "detection_recall" in data:
+            print(f"  detection recall: {data['detection_recall']:.1%}")
+    print(f"\nPeak RSS: {report['peak_rss_mb']:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end scan benchmark")
+    parser.add_argument("--synthetic", type=int, default=8, help="Number of synthetic multi-card scenes (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over each corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Images run before timing starts")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--latency-tolerance", type=float, default=0.20, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.02, help="Allowed accuracy drop before flagging")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if anything regressed")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own prints")
+    parser.add_argument("--ocr-compare", action="store_true", help="Also time batched header OCR against the per-card thread fan-out on the synthetic corpus")
+    parser.add_argument("--crop-compare", help="Comma separated CROP_MIN_HEIGHT values to compare against full-res crops on 12MP JPEG scenes")
+    args = parser.parse_args()
+
+    with quiet(not args.verbose):
+        if not scan_card.initialize_clip_matcher():
+            print("CLIP matcher failed to initialize (index missing?)", file=sys.stderr)
+            sys.exit(1)
+
+    labels = load_labels()
+    with quiet(not args.verbose):
+        corpora = build_corpora(args, labels)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "backend": scan_card.SCAN_BACKEND,
+            "clip_precision": scan_card._clip_precision,
+        },
+        "corpora": {},
+    }
+    for corpus, items in corpora.items():
+        if items:
+            report["corpora"][corpus] = run_corpus(items, args)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    print_report(report)
+    if args.ocr_compare and corpora["synthetic"]:
+        report["ocr_batching"] = compare_ocr(corpora["synthetic"], args)
+    if args.crop_compare:
+        with quiet(not args.verbose):
+            sources = card_sources(labels)
+        if sources:
+            report["crop_min_height"] = compare_crop_heights(sources, [int(h) for h in args.crop_compare.split(",")], args)
+        else:
+            print("No card sources for --crop-compare (no detections in the sample images), skipping it")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.latency_tolerance, args.accuracy_tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print(f"\nNo regressions vs {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#Parity check for the OpenCV/NumPy CLIP preprocessing (Image_detection/clip_preprocess.py) against the
+#torchvision transform clip.load returns (_clip_preprocess). Each image goes through both pipelines at a few
+#sizes (crops from phone photos are usually bigger than 224, webcam crops can be smaller) and we report the
+#max / mean absolute difference of the input tensors. --embed also runs both tensors through the CLIP image
+#encoder and reports the cosine similarity of the embeddings, which is what matching actually sees.
+#It also checks that clip_preprocess.pil_transform (the torch-free PIL path the onnx backend uses) matches the
+#torchvision transform to float rounding.
+#Exits 1 when a limit is exceeded, so it can gate a change to either pipeline.
+#Usage:
+#  python check_clip_preprocess.py
+#  python check_clip_preprocess.py --images ../Image_detection/images --embed --min-cosine 0.995
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+from PIL import Image
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from Image_detection import clip_preprocess
+
+SAMPLE_IMAGES_DIR = os.path.join(PROJECT_ROOT, 'Image_detection', 'images')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+HEIGHTS = (1200, 880, 400, 224, 150)  # crop heights to test, card aspect
+
+def load_images(folder, limit):
+    paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    images = [(os.path.basename(p), cv2.imread(p)) for p in paths]
+    return [(name, image) for name, image in images if image is not None]
+
+def torchvision_preprocess(transform, images_bgr): #The current PIL path: BGR -> RGB -> PIL -> transform, one by one
+    import torch
+    return torch.stack([transform(Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))) for img in images_bgr]).numpy()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare clip_preprocess.py with CLIP's torchvision preprocessing")
+    parser.add_argument("--images", default=SAMPLE_IMAGES_DIR)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--max-abs", type=float, default=0.35, help="largest allowed per-element difference (normalized units)")
+    parser.add_argument("--max-mean", type=float, default=0.03, help="largest allowed mean absolute difference")
+    parser.add_argument("--embed", action="store_true", help="also compare CLIP embeddings (loads the model)")
+    parser.add_argument("--min-cosine", type=float, default=0.995)
+    args = parser.parse_args()
+
+    from clip.clip import _transform
+    transform = _transform(clip_preprocess.INPUT_SIZE) # same transform clip.load returns, without loading the model
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"No images in {args.images}")
+        return 1
+
+    model = None
+    if args.embed:
+        import torch
+        import clip
+        from Image_detection import clip_encoder
+        model, _ = clip.load('ViT-B/32', device='cpu', jit=False, download_root=os.path.expanduser('~/.cache/clip'))
+        model = clip_encoder.drop_text_tower(model).eval()
+
+    failures = 0
+    pil_transform_diff = 0.0
+    pil_seconds = cv2_seconds = 0.0
+    print(f"{'image':28} {'crop':>9} {'max abs':>8} {'mean abs':>9} {'cosine':>8}")
+    for name, image in images:
+        crops = []
+        for height in HEIGHTS:
+            width = max(1, int(round(height * 63 / 88)))
+            crops.append(cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA if height < image.shape[0] else cv2.INTER_CUBIC))
+
+        start = time.perf_counter()
+        reference = torchvision_preprocess(transform, crops)
+        pil_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        candidate = clip_preprocess.preprocess_batch(crops).copy()
+        cv2_seconds += time.perf_counter() - start
+        pil_only = np.stack([clip_preprocess.pil_transform(Image.fromarray(cv2.cvtColor(c, cv2.COLOR_BGR2RGB))) for c in crops])
+        pil_transform_diff = max(pil_transform_diff, float(np.abs(reference - pil_only).max()))
+
+        cosines = [None] * len(crops)
+        if model is not None:
+            reference_emb = clip_encoder.encode_images(model, torch.from_numpy(reference))
+            candidate_emb = clip_encoder.encode_images(model, torch.from_numpy(candidate))
+            cosines = (reference_emb * candidate_emb).sum(axis=1)
+
+        for crop, ref, cand, cosine in zip(crops, reference, candidate, cosines):
+            diff = np.abs(ref - cand)
+            ok = diff.max() <= args.max_abs and diff.mean() <= args.max_mean and (cosine is None or cosine >= args.min_cosine)
+            failures += not ok
+            cosine_text = f"{cosine:8.5f}" if cosine is not None else f"{'-':>8}"
+            print(f"{name[:28]:28} {crop.shape[1]:>4}x{crop.shape[0]:<4} {diff.max():8.4f} {diff.mean():9.5f} {cosine_text}{'' if ok else '  FAIL'}")
+
+    total = len(images) * len(HEIGHTS)
+    print(f"\nPreprocessing time per crop: PIL/torchvision {pil_seconds / total * 1000:.2f} ms, cv2/numpy {cv2_seconds / total * 1000:.2f} ms")
+    print(f"{total - failures}/{total} crops within limits")
+    print(f"pil_transform vs torchvision max abs: {pil_transform_diff:.2e}{'' if pil_transform_diff <= 1e-4 else '  FAIL'}")
+    return 1 if failures or pil_transform_diff > 1e-4 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
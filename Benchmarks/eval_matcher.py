@@ -0,0 +1,281 @@
+#Identification accuracy harness for the matcher (FAISS search + OCR name check in get_best_matched_clip)
+#Detection, cropping, OCR and the CLIP embedding are done once per image, then every config
+#(index type x OCR on/off x top_k) reuses them, so the numbers only differ where the matcher does.
+#Reports top-1 / top-5 accuracy, how often the OCR check overrode CLIP's top-1, recall of the ANN
+#indexes against the exact flat search, and matcher latency for each config.
+#pcaN / binN are the two-stage COARSE_SEARCH indexes (coarse shortlist, exact rerank), one config per --shortlist.
+#Labeled data, either:
+#  --labels labels.json   {"photo.jpg": "sv4-12", ...} relative to --images (same format as bench_scan.py)
+#  --images folder/       with one subfolder per card id: folder/sv4-12/*.jpg
+#  --reference-sample N   N perturbed reference images (no labels needed, optimistic since they're the indexed images)
+#Usage:
+#  python eval_matcher.py --reference-sample 300 --indexes flat,ivf,hnsw --top-k 1,5,10,50
+#  python eval_matcher.py --reference-sample 300 --indexes flat,pca64,pca128,bin512 --shortlist 50,200,500 --ocr off
+#  python eval_matcher.py --images my_photos --labels my_photos/labels.json --output eval.json
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import numpy as np
+import cv2
+import faiss
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from Image_detection import scan_card
+from Image_detection.scan_card import getbounding, crop_out_card, get_text_from_image, embed_card_image, search_embedding, get_best_matched_clip
+from Image_detection.card_identity import identity_from_filename, REFERENCE_IMAGE_DIR
+from Image_detection.coarse_search import TwoStageIndex, build_coarse_index
+
+SAMPLE_IMAGES_DIR = os.path.join(PROJECT_ROOT, 'Image_detection', 'images')
+LABELS_FILE = os.path.join(SCRIPT_DIR, 'labels.json')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+@contextlib.contextmanager
+def quiet(enabled): #The pipeline prints a lot, keep it out of the report unless --verbose
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def perturb(image, rng): #Make a reference scan look a bit more like a phone photo: rotation, perspective, blur, lighting, noise
+    h, w = image.shape[:2]
+    jitter = 0.04 * min(h, w)
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    dst = src + rng.uniform(-jitter, jitter, size=(4, 2)).astype(np.float32)
+    out = cv2.warpPerspective(image, cv2.getPerspectiveTransform(src, dst), (w, h), borderMode=cv2.BORDER_REPLICATE)
+    angle = rng.uniform(-4, 4)
+    out = cv2.warpAffine(out, cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0), (w, h), borderMode=cv2.BORDER_REPLICATE)
+    out = cv2.GaussianBlur(out, (0, 0), rng.uniform(0.3, 1.5))
+    out = cv2.convertScaleAbs(out, alpha=rng.uniform(0.8, 1.2), beta=rng.uniform(-20, 20))
+    noise = rng.normal(0, 4, out.shape)
+    return np.clip(out.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+def load_dataset(args): #[(name, image, card_id, is_crop)]
+    items = []
+    if args.reference_sample:
+        files = sorted(f for f in os.listdir(REFERENCE_IMAGE_DIR) if f.lower().endswith(IMAGE_EXTENSIONS))
+        rng = np.random.default_rng(args.seed)
+        random.seed(args.seed)
+        for filename in random.sample(files, min(args.reference_sample, len(files))):
+            image = cv2.imread(os.path.join(REFERENCE_IMAGE_DIR, filename))
+            if image is not None:
+                items.append((filename, perturb(image, rng), identity_from_filename(filename)['card_id'], True))
+        return items
+
+    labels_path = args.labels or (LABELS_FILE if args.images == SAMPLE_IMAGES_DIR else None)
+    if labels_path and os.path.exists(labels_path):
+        with open(labels_path) as f:
+            labels = json.load(f)
+        for filename, card_id in sorted(labels.items()):
+            image = cv2.imread(os.path.join(args.images, filename))
+            if image is not None:
+                items.append((filename, image, card_id, args.no_detect))
+        return items
+
+    for card_id in sorted(os.listdir(args.images)): # folder-per-card layout
+        folder = os.path.join(args.images, card_id)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                image = cv2.imread(os.path.join(folder, filename))
+                if image is not None:
+                    items.append((f"{card_id}/{filename}", image, card_id, args.no_detect))
+    return items
+
+def prepare(items, verbose): #Detect + crop + OCR + embed once per image, returns the cached features and stage timings
+    prepared = []
+    stage_times = {"detect": [], "ocr": [], "embed": []}
+    for name, image, card_id, is_crop in items:
+        with quiet(not verbose):
+            crop = image
+            if not is_crop:
+                start = time.perf_counter()
+                result = getbounding(image, display=False)
+                stage_times["detect"].append(time.perf_counter() - start)
+                if not result or not isinstance(result, tuple) or result[1] is None:
+                    prepared.append({"name": name, "card_id": card_id, "embedding": None})
+                    continue
+                crop = crop_out_card(image, result[1])
+
+            start = time.perf_counter()
+            ocr_name = get_text_from_image(crop, debug=False, show_window=False).get('name')
+            stage_times["ocr"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            embedding = embed_card_image(crop)
+            stage_times["embed"].append(time.perf_counter() - start)
+        prepared.append({"name": name, "card_id": card_id, "embedding": embedding, "ocr_name": ocr_name, "crop": crop})
+    return prepared, stage_times
+
+def build_indexes(args): #(name -> FAISS index over the same vectors as the production flat index, exact flat index)
+    flat = scan_card._faiss_index
+    indexes = {}
+    wanted = [name.strip() for name in args.indexes.split(",")]
+    two_stage = isinstance(flat, TwoStageIndex) # matcher started with COARSE_SEARCH, rebuild the exact baseline
+    vectors = flat.reconstruct_n(0, flat.ntotal) if two_stage or any(name != "flat" for name in wanted) else None
+    if two_stage:
+        flat = faiss.IndexFlatIP(flat.d)
+        flat.add(vectors)
+
+    for name in wanted:
+        start = time.perf_counter()
+        if name == "flat":
+            indexes["flat"] = flat
+            continue
+        elif name.startswith(("pca", "bin")):
+            coarse = build_coarse_index(vectors, name)
+            for shortlist in [int(s) for s in args.shortlist.split(",")]:
+                indexes[f"{name}_short{shortlist}"] = TwoStageIndex(coarse, vectors, shortlist, name)
+        elif name == "ivf":
+            quantizer = faiss.IndexFlatIP(flat.d)
+            index = faiss.IndexIVFFlat(quantizer, flat.d, args.ivf_nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.add(vectors)
+            for nprobe in [int(n) for n in args.ivf_nprobe.split(",")]:
+                probed = faiss.clone_index(index)
+                probed.nprobe = nprobe
+                indexes[f"ivf{args.ivf_nlist}_nprobe{nprobe}"] = probed
+        elif name == "hnsw":
+            index = faiss.IndexHNSWFlat(flat.d, args.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.add(vectors)
+            for ef in [int(e) for e in args.hnsw_ef.split(",")]:
+                searched = faiss.clone_index(index)
+                searched.hnsw.efSearch = ef
+                indexes[f"hnsw{args.hnsw_m}_ef{ef}"] = searched
+        else:
+            raise ValueError(f"Unknown index type '{name}' (flat, ivf, hnsw, pcaN, binN)")
+        print(f"Built {name} index in {time.perf_counter() - start:.1f}s")
+    return indexes, flat
+
+def ranked_card_ids(best, matches): #Final answer first, then the rest of the CLIP ranking, duplicates (alt art scans of one card) dropped
+    ranked = []
+    for m in [best] + matches:
+        if m['card_id'] not in ranked:
+            ranked.append(m['card_id'])
+    return ranked
+
+def evaluate(prepared, index, use_ocr, top_k, flat_neighbors, verbose): #One config over the cached features
+    top1 = top5 = overrides = failed = 0
+    recall_hits = recall_total = 0
+    latencies = []
+    for item in prepared:
+        if item["embedding"] is None:
+            failed += 1
+            continue
+        ocr_name = item["ocr_name"] if use_ocr else None
+        start = time.perf_counter()
+        with quiet(not verbose):
+            best, matches = get_best_matched_clip(item["crop"], top_k=top_k, ocr_name=ocr_name, index=index, embedding=item["embedding"])
+        latencies.append(time.perf_counter() - start)
+        if best is None:
+            failed += 1
+            continue
+
+        clip_top1 = search_embedding(item["embedding"], top_k=1, index=index)[0]
+        if best['row_id'] != clip_top1['row_id']:
+            overrides += 1
+        ranked = ranked_card_ids(best, matches)
+        top1 += ranked[0] == item["card_id"]
+        top5 += item["card_id"] in ranked[:5]
+
+        # ANN recall against the exact search at the same k
+        exact = flat_neighbors[item["name"]][:top_k]
+        approx = {m['row_id'] for m in search_embedding(item["embedding"], top_k=top_k, index=index)}
+        recall_hits += len(approx & set(exact))
+        recall_total += len(exact)
+
+    n = len(prepared)
+    arr = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "images": n,
+        "no_detection": failed,
+        "top1_accuracy": top1 / n if n else None,
+        "top5_accuracy": top5 / n if n else None,
+        "ocr_override_rate": overrides / (n - failed) if n - failed else None,
+        "recall_vs_flat": recall_hits / recall_total if recall_total else None,
+        "latency_ms": {"mean": float(arr.mean()), "p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95))},
+    }
+
+def stage_summary(stage_times):
+    return {stage: (float(np.median(times) * 1000) if times else None) for stage, times in stage_times.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy / recall / latency of the card matcher across index and OCR configs")
+    parser.add_argument("--images", default=SAMPLE_IMAGES_DIR, help="Photo folder (flat with --labels, or one subfolder per card id)")
+    parser.add_argument("--labels", help="JSON {filename: card_id} for --images (defaults to Benchmarks/labels.json for the sample images)")
+    parser.add_argument("--no-detect", action="store_true", help="Images are already cropped cards, skip the detector")
+    parser.add_argument("--reference-sample", type=int, default=0, help="Evaluate on N perturbed reference images instead of photos")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--indexes", default="flat,ivf,hnsw", help="Comma separated: flat, ivf, hnsw, pcaN, binN (e.g. pca64, bin512)")
+    parser.add_argument("--ivf-nlist", type=int, default=256)
+    parser.add_argument("--ivf-nprobe", default="8,32", help="Comma separated nprobe values, one config each")
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--hnsw-ef", default="64,256", help="Comma separated efSearch values, one config each")
+    parser.add_argument("--shortlist", default="50,200,500", help="Comma separated coarse shortlist sizes for pcaN / binN, one config each")
+    parser.add_argument("--top-k", default="1,5,10,50", help="Comma separated top_k values passed to get_best_matched_clip")
+    parser.add_argument("--ocr", default="on,off", help="on, off or on,off")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own prints")
+    args = parser.parse_args()
+
+    items = load_dataset(args)
+    if not items:
+        print("No labeled images. Pass --labels, a folder-per-card --images, or --reference-sample N.")
+        sys.exit(1)
+    with quiet(not args.verbose):
+        if not scan_card.initialize_clip_matcher():
+            print("CLIP matcher failed to initialize")
+            sys.exit(1)
+
+    print(f"Preparing {len(items)} labeled images (detect, crop, OCR, embed once each)...")
+    prepared, stage_times = prepare(items, args.verbose)
+    indexes, flat = build_indexes(args)
+    top_ks = [int(k) for k in args.top_k.split(",")]
+    flat_neighbors = {
+        item["name"]: [m['row_id'] for m in search_embedding(item["embedding"], top_k=max(top_ks), index=flat)]
+        for item in prepared if item["embedding"] is not None
+    }
+
+    configs = []
+    print(f"\n{'index':22} {'ocr':4} {'top_k':>5} {'top1':>7} {'top5':>7} {'override':>9} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for index_name, index in indexes.items():
+        for use_ocr in [flag.strip() == "on" for flag in args.ocr.split(",")]:
+            for top_k in top_ks:
+                result = evaluate(prepared, index, use_ocr, top_k, flat_neighbors, args.verbose)
+                result.update({"index": index_name, "ocr": use_ocr, "top_k": top_k})
+                configs.append(result)
+                fmt = lambda v: f"{v:.1%}" if v is not None else "-"
+                print(f"{index_name:22} {'on' if use_ocr else 'off':4} {top_k:>5} {fmt(result['top1_accuracy']):>7} {fmt(result['top5_accuracy']):>7} "
+                      f"{fmt(result['ocr_override_rate']):>9} {fmt(result['recall_vs_flat']):>7} "
+                      f"{result['latency_ms']['p50']:>8.2f} {result['latency_ms']['p95']:>8.2f}")
+
+    stages = stage_summary(stage_times)
+    print(f"\nShared per-image stages (median ms): " + ", ".join(f"{k}={v:.1f}" for k, v in stages.items() if v is not None))
+    if any(item["embedding"] is None for item in prepared):
+        print(f"{sum(item['embedding'] is None for item in prepared)} image(s) had no detection and count as misses")
+
+    if args.output:
+        report = {
+            "images": len(items),
+            "backend": scan_card.SCAN_BACKEND,
+            "clip_precision": scan_card._clip_precision,
+            "index_size": scan_card._faiss_index.ntotal,
+            "stage_median_ms": stages,
+            "configs": configs,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
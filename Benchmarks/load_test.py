@@ -0,0 +1,212 @@
+#HTTP load generator for the FastAPI service (Image_detection/main.py)
+#Drives /scan_card/, /scan_multiple_cards/, /user_collection/{id} and /leaderboard/ with a weighted request mix
+#at each concurrency level and reports throughput, tail latency and where the server saturates.
+#With --spawn it starts its own uvicorn with SUPABASE_BACKEND=memory, so everything runs on one box without Supabase.
+#Usage:
+#  python load_test.py --spawn --concurrency 1,2,4,8,16 --duration 30
+#  python load_test.py --url http://127.0.0.1:8000 --mix scan_card=1,leaderboard=4 --output results.json
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import numpy as np
+import httpx
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from Image_detection.local_supabase import seed_user_ids
+
+SAMPLE_IMAGES_DIR = os.path.join(PROJECT_ROOT, 'Image_detection', 'images')
+DEFAULT_MIX = "scan_card=4,scan_multiple_cards=1,user_collection=4,leaderboard=1"
+
+def parse_mix(text): #"scan_card=4,leaderboard=1" -> {"scan_card": 4.0, "leaderboard": 1.0}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"scan_card", "scan_multiple_cards", "user_collection", "leaderboard"}
+    if unknown:
+        raise ValueError(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+def load_images(folder):
+    images = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.heic', '.heif')):
+            with open(os.path.join(folder, filename), 'rb') as f:
+                images.append((filename, f.read()))
+    return images
+
+async def send(client, endpoint, images, multi_images, user_ids, rng): #One request, returns (status, seconds)
+    start = time.perf_counter()
+    try:
+        if endpoint == "scan_card":
+            name, data = images[rng.randrange(len(images))]
+            response = await client.post("/scan_card/", files={"file": (name, data, "image/jpeg")})
+        elif endpoint == "scan_multiple_cards":
+            name, data = multi_images[rng.randrange(len(multi_images))]
+            response = await client.post("/scan_multiple_cards/", files={"file": (name, data, "image/jpeg")})
+        elif endpoint == "user_collection":
+            response = await client.get(f"/user_collection/{user_ids[rng.randrange(len(user_ids))]}")
+        else:
+            response = await client.get("/leaderboard/")
+        status = response.status_code
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+async def run_level(args, concurrency, mix, images, multi_images, user_ids): #Closed-loop: each worker sends its next request as soon as the last one returns
+    endpoints, weights = list(mix), list(mix.values())
+    records = []
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            status, seconds = await send(client, endpoint, images, multi_images, user_ids, rng)
+            records.append((endpoint, status, seconds))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    return summarize_level(concurrency, records, wall)
+
+def summarize_level(concurrency, records, wall):
+    level = {"concurrency": concurrency, "wall_seconds": wall, "requests": len(records), "endpoints": {}}
+    ok = [r for r in records if isinstance(r[1], int) and r[1] < 400]
+    level["throughput_rps"] = len(ok) / wall if wall else 0.0
+    all_latency = np.array([r[2] for r in ok]) * 1000 if ok else None
+    if all_latency is not None:
+        level["p50_ms"] = float(np.percentile(all_latency, 50))
+        level["p95_ms"] = float(np.percentile(all_latency, 95))
+        level["p99_ms"] = float(np.percentile(all_latency, 99))
+
+    for endpoint in sorted({r[0] for r in records}):
+        rows = [r for r in records if r[0] == endpoint]
+        good = np.array([r[2] for r in rows if isinstance(r[1], int) and r[1] < 400]) * 1000
+        statuses = {}
+        for r in rows:
+            statuses[str(r[1])] = statuses.get(str(r[1]), 0) + 1
+        level["endpoints"][endpoint] = {
+            "requests": len(rows),
+            "ok": int(len(good)),
+            "statuses": statuses,
+            "rps": len(good) / wall if wall else 0.0,
+            "p50_ms": float(np.percentile(good, 50)) if len(good) else None,
+            "p95_ms": float(np.percentile(good, 95)) if len(good) else None,
+            "p99_ms": float(np.percentile(good, 99)) if len(good) else None,
+        }
+    return level
+
+def find_saturation(levels): #First level where more concurrency stops buying throughput (<10% gain) but p95 keeps climbing (>50%)
+    for prev, cur in zip(levels, levels[1:]):
+        if not prev.get("p95_ms") or not cur.get("p95_ms"):
+            continue
+        gain = cur["throughput_rps"] / prev["throughput_rps"] - 1 if prev["throughput_rps"] else 0
+        latency_growth = cur["p95_ms"] / prev["p95_ms"] - 1
+        if gain < 0.10 and latency_growth > 0.50:
+            return prev["concurrency"]
+    return None
+
+def print_level(level):
+    print(f"\nconcurrency={level['concurrency']}  {level['throughput_rps']:.2f} ok req/s  "
+          f"p50={level.get('p50_ms', 0):.0f}ms p95={level.get('p95_ms', 0):.0f}ms p99={level.get('p99_ms', 0):.0f}ms")
+    for endpoint, data in level["endpoints"].items():
+        p50 = f"{data['p50_ms']:.0f}" if data["p50_ms"] is not None else "-"
+        p95 = f"{data['p95_ms']:.0f}" if data["p95_ms"] is not None else "-"
+        p99 = f"{data['p99_ms']:.0f}" if data["p99_ms"] is not None else "-"
+        print(f"  {endpoint:22} n={data['requests']:5} ok={data['ok']:5} {data['rps']:7.2f} req/s  "
+              f"p50={p50:>6}ms p95={p95:>6}ms p99={p99:>6}ms  {data['statuses']}")
+
+def spawn_server(port, extra_env): #uvicorn with the in-memory Supabase stand-in
+    env = dict(os.environ, SUPABASE_BACKEND="memory", **extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "Image_detection.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_ROOT, env=env
+    )
+
+def wait_until_ready(url, timeout): #Scans 503 until CLIP is up, so wait for /health to say so
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health = httpx.get(f"{url}/health", timeout=2).json()
+            if health.get("clip_ready"):
+                return True
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(1)
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Pokemon Card Scanner API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="Start a local uvicorn with SUPABASE_BACKEND=memory")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted request mix (default {DEFAULT_MIX})")
+    parser.add_argument("--images", default=SAMPLE_IMAGES_DIR, help="Photos for /scan_card/")
+    parser.add_argument("--multi-images", default=None, help="Photos for /scan_multiple_cards/ (defaults to --images)")
+    parser.add_argument("--users", type=int, default=50, help="Seeded user ids to spread /user_collection/ over")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--supabase-latency-ms", type=float, default=0, help="With --spawn, fake round trip per Supabase call")
+    parser.add_argument("--output", help="Write all levels to this JSON file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    images = load_images(args.images)
+    multi_images = load_images(args.multi_images) if args.multi_images else images
+    if not images and ("scan_card" in mix or "scan_multiple_cards" in mix):
+        print(f"No images in {args.images}")
+        sys.exit(1)
+    user_ids = seed_user_ids(args.users)
+
+    server = None
+    if args.spawn:
+        args.url = f"http://127.0.0.1:{args.port}"
+        server = spawn_server(args.port, {
+            "MEMORY_SUPABASE_USERS": str(args.users),
+            "MEMORY_SUPABASE_LATENCY_MS": str(args.supabase_latency_ms),
+        })
+
+    try:
+        print(f"Waiting for {args.url} to be ready...")
+        if not wait_until_ready(args.url, timeout=600):
+            print("Server never reported clip_ready")
+            sys.exit(1)
+
+        levels = []
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            level = asyncio.run(run_level(args, concurrency, mix, images, multi_images, user_ids))
+            levels.append(level)
+            print_level(level)
+
+        saturation = find_saturation(levels)
+        if saturation:
+            print(f"\nSaturates around concurrency={saturation} (throughput flat, p95 climbing)")
+        else:
+            print("\nNo saturation point inside the tested concurrency range")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"url": args.url, "mix": mix, "levels": levels, "saturation_concurrency": saturation}, f, indent=2)
+            print(f"Results written to {args.output}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+if __name__ == "__main__":
+    main()
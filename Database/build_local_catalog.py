@@ -0,0 +1,163 @@
+#Compile the pokemon-tcg-data JSON into an indexed SQLite catalog so the API/CLI can read card data without Supabase
+#Usage: python build_local_catalog.py [--output card_catalog.sqlite] [--data-folder ../pokemon-tcg-data/cards/en] [--sets-file ../pokemon-tcg-data/sets/en.json]
+import os
+import json
+import sqlite3
+import argparse
+from card_rows import DATA_FOLDER, card_row, child_rows, CHILD_TABLES
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(SCRIPT_DIR, "card_catalog.sqlite")
+SETS_FILE = os.path.abspath(os.path.join(DATA_FOLDER, "..", "..", "sets", "en.json"))
+
+# Same layout as the Supabase tables (see schema), arrays are stored as JSON text
+SCHEMA = """
+CREATE TABLE cards (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    supertype TEXT,
+    subtypes TEXT,
+    level INTEGER,
+    hp INTEGER,
+    types TEXT,
+    evolves_from TEXT,
+    rarity TEXT,
+    artist TEXT,
+    flavor_text TEXT,
+    retreat_cost TEXT,
+    converted_retreat_cost INTEGER,
+    set_name TEXT,
+    number TEXT,
+    national_pokedex_numbers TEXT,
+    image_small TEXT,
+    image_large TEXT,
+    raw_json TEXT NOT NULL
+);
+CREATE TABLE abilities (id INTEGER PRIMARY KEY, card_id TEXT NOT NULL, name TEXT, text TEXT, type TEXT);
+CREATE TABLE attacks (id INTEGER PRIMARY KEY, card_id TEXT NOT NULL, name TEXT, cost TEXT, converted_energy_cost INTEGER, damage TEXT, description TEXT);
+CREATE TABLE weaknesses (id INTEGER PRIMARY KEY, card_id TEXT NOT NULL, type TEXT, value TEXT);
+CREATE TABLE resistances (id INTEGER PRIMARY KEY, card_id TEXT NOT NULL, type TEXT, value TEXT);
+CREATE TABLE sets (id TEXT PRIMARY KEY, name TEXT, series TEXT, printed_total INTEGER, total INTEGER);
+CREATE TABLE catalog_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+INDEXES = """
+CREATE INDEX idx_cards_set_number ON cards(set_name, number);
+CREATE INDEX idx_cards_name ON cards(name COLLATE NOCASE);
+CREATE INDEX idx_abilities_card_id ON abilities(card_id);
+CREATE INDEX idx_attacks_card_id ON attacks(card_id);
+CREATE INDEX idx_weaknesses_card_id ON weaknesses(card_id);
+CREATE INDEX idx_resistances_card_id ON resistances(card_id);
+CREATE INDEX idx_sets_printed_total ON sets(printed_total);
+"""
+
+ARRAY_COLUMNS = {"subtypes", "types", "retreat_cost", "national_pokedex_numbers", "cost"}
+INT_COLUMNS = {"level", "hp", "converted_retreat_cost", "converted_energy_cost"}
+
+def to_sql_value(column, value): #Arrays -> JSON text, numeric strings -> int (matches the INTEGER columns in Postgres)
+    if value is None:
+        return None
+    if column in ARRAY_COLUMNS:
+        return json.dumps(value)
+    if column in INT_COLUMNS:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+def insert_rows(conn, table, rows):
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    placeholders = ", ".join("?" for _ in columns)
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+        [tuple(to_sql_value(c, row[c]) for c in columns) for row in rows]
+    )
+
+def set_rows(sets_file, card_counts): #Rows for the sets table. printed_total is the "/TTT" printed on the cards, used to narrow CLIP search by set
+    sets = {}
+    if sets_file and os.path.exists(sets_file):
+        with open(sets_file, "r", encoding="utf-8") as f:
+            for s in json.load(f):
+                sets[s["id"]] = {"id": s["id"], "name": s.get("name"), "series": s.get("series"),
+                                 "printed_total": s.get("printedTotal"), "total": s.get("total")}
+    else:
+        print(f"Sets file not found ({sets_file}), sets table will have no printed totals")
+    for set_id, count in card_counts.items(): # sets with cards but no entry in the sets file
+        sets.setdefault(set_id, {"id": set_id, "name": None, "series": None, "printed_total": None, "total": count})
+    return list(sets.values())
+
+def build_catalog(data_folder, output_path, sets_file=SETS_FILE): #Writes to a temp file and swaps it in so a running API never sees a half-built catalog
+    tmp_path = output_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(SCHEMA)
+
+    total_cards = 0
+    total_files = 0
+    card_counts = {}
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith(".json"):
+            continue
+        set_name = filename.replace(".json", "")
+
+        with open(os.path.join(data_folder, filename), "r", encoding="utf-8") as f:
+            cards_array = json.load(f)
+
+        if not isinstance(cards_array, list):
+            print(f"Skipping {filename} - not an array")
+            continue
+
+        card_rows = []
+        children = {table: [] for table in CHILD_TABLES}
+        for card_data in cards_array:
+            row = card_row(card_data, set_name)
+            row["raw_json"] = json.dumps(card_data, ensure_ascii=False)
+            card_rows.append(row)
+            for table, table_rows in child_rows(card_data).items():
+                children[table].extend(table_rows)
+
+        insert_rows(conn, "cards", card_rows)
+        for table in CHILD_TABLES:
+            insert_rows(conn, table, children[table])
+
+        total_cards += len(card_rows)
+        total_files += 1
+        card_counts[set_name] = len(card_rows)
+        print(f"{filename:30} | {len(card_rows):4} cards")
+
+    insert_rows(conn, "sets", set_rows(sets_file, card_counts))
+    conn.executescript(INDEXES)
+    conn.execute("INSERT INTO catalog_meta (key, value) VALUES ('card_count', ?)", (str(total_cards),))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+    conn.close()
+
+    os.replace(tmp_path, output_path)
+    return total_files, total_cards
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local SQLite card catalog from pokemon-tcg-data")
+    parser.add_argument("--data-folder", default=DATA_FOLDER, help="Path to pokemon-tcg-data/cards/en")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the SQLite file")
+    parser.add_argument("--sets-file", default=SETS_FILE, help="pokemon-tcg-data/sets/en.json, for the printed set totals")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_folder):
+        print(f"Data folder not found: {args.data_folder}")
+        exit(1)
+
+    total_files, total_cards = build_catalog(args.data_folder, args.output, args.sets_file)
+    print(f"Files processed: {total_files}")
+    print(f"Cards written:   {total_cards:,}")
+    print(f"Catalog: {args.output} ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
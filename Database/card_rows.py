@@ -0,0 +1,59 @@
+#Card JSON -> table rows, shared by sync_cards.py (Supabase) and build_local_catalog.py (offline SQLite)
+#No supabase/dotenv imports here, so the offline catalog build runs without them installed
+import os
+
+#Folder no longer exists, but it did at one point, if you wanna run this localy download the following link https://github.com/PokemonTCG/pokemon-tcg-data
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FOLDER = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "pokemon-tcg-data", "cards", "en"))
+
+CHILD_TABLES = ["abilities", "attacks", "weaknesses", "resistances"]
+
+def card_row(card_data, setname): #Same columns upload_cards.py writes into the cards table
+    return {
+        "id": card_data["id"],
+        "name": card_data["name"],
+        "supertype": card_data.get("supertype"),
+        "subtypes": card_data.get("subtypes"),
+        "level": card_data.get("level"),
+        "hp": card_data.get("hp"),
+        "types": card_data.get("types"),
+        "evolves_from": card_data.get("evolvesFrom"),
+        "rarity": card_data.get("rarity"),
+        "artist": card_data.get("artist"),
+        "flavor_text": card_data.get("flavorText"),
+        "retreat_cost": card_data.get("retreatCost"),
+        "converted_retreat_cost": card_data.get("convertedRetreatCost"),
+        "set_name": setname,
+        "number": card_data.get("number"),
+        "national_pokedex_numbers": card_data.get("nationalPokedexNumbers"),
+        "image_small": card_data.get("images", {}).get("small"),
+        "image_large": card_data.get("images", {}).get("large"),
+    }
+
+def child_rows(card_data): #Rows for abilities/attacks/weaknesses/resistances, keyed by table name
+    card_id = card_data["id"]
+    return {
+        "abilities": [
+            {"card_id": card_id, "name": ability["name"], "text": ability["text"], "type": ability.get("type")}
+            for ability in card_data.get("abilities", [])
+        ],
+        "attacks": [
+            {
+                "card_id": card_id,
+                "name": atk["name"],
+                "cost": atk.get("cost"),
+                "converted_energy_cost": atk.get("convertedEnergyCost"),
+                "damage": atk.get("damage"),
+                "description": atk.get("text")
+            }
+            for atk in card_data.get("attacks", [])
+        ],
+        "weaknesses": [
+            {"card_id": card_id, "type": wk["type"], "value": wk["value"]}
+            for wk in card_data.get("weaknesses", [])
+        ],
+        "resistances": [
+            {"card_id": card_id, "type": rs["type"], "value": rs["value"]}
+            for rs in card_data.get("resistances", [])
+        ],
+    }
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # CONFIRM THAT ALL OF THE CARDS ARE IN THE DATABASE
+# (only compares counts, sync_cards.py does a hash-based incremental sync that also catches edited cards)
 
 SUPABASE_URL = os.getenv("supabaseurl")
 SUPABASE_KEY = os.getenv("servicerolekey")
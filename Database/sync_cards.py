@@ -0,0 +1,169 @@
+#Incremental catalog sync. Hashes every card in the pokemon-tcg-data JSON and only touches rows whose hash changed,
+#so re-running against an unchanged catalog is one paged select and nothing else (confirm_size.py did a count per set)
+#Usage: python sync_cards.py [--dry-run] [--report diff.json] [--batch-size 200] [--sets base1 sv4 ...]
+import os
+import json
+import hashlib
+import argparse
+from supabase import create_client, Client
+from dotenv import load_dotenv
+from card_rows import DATA_FOLDER, CHILD_TABLES, card_row, child_rows
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("supabaseurl")
+SUPABASE_KEY = os.getenv("servicerolekey")
+
+PAGE_SIZE = 1000  # PostgREST caps a single response at 1000 rows by default
+
+def card_hash(card_data, setname): #Stable content hash of everything we store for a card (base row + child tables)
+    payload = json.dumps({"set_name": setname, "card": card_data}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_local_catalog(data_folder, only_sets=None): #Returns {card_id: (set_name, card_data, hash)} for every card in the JSON files
+    catalog = {}
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith(".json"):
+            continue
+        set_name = filename.replace(".json", "")
+        if only_sets and set_name not in only_sets:
+            continue
+
+        with open(os.path.join(data_folder, filename), "r", encoding="utf-8") as f:
+            cards_array = json.load(f)
+
+        if not isinstance(cards_array, list):
+            print(f"Skipping {filename} - not an array")
+            continue
+
+        for card_data in cards_array:
+            catalog[card_data["id"]] = (set_name, card_data, card_hash(card_data, set_name))
+    return catalog
+
+def fetch_stored_hashes(supabase): #One paged select over the whole cards table -> {card_id: (set_name, content_hash)}
+    stored = {}
+    start = 0
+    while True:
+        response = supabase.table("cards").select("id, set_name, content_hash").order("id").range(start, start + PAGE_SIZE - 1).execute()
+        rows = response.data or []
+        for row in rows:
+            stored[row["id"]] = (row.get("set_name"), row.get("content_hash"))
+        if len(rows) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+    return stored
+
+def diff_catalog(local, stored, only_sets=None): #Split local cards into new / changed / unchanged and find db rows with no local card
+    new_ids, changed_ids, unchanged = [], [], 0
+    for card_id, (set_name, _, local_hash) in local.items():
+        if card_id not in stored:
+            new_ids.append(card_id)
+        elif stored[card_id][1] != local_hash:
+            changed_ids.append(card_id)
+        else:
+            unchanged += 1
+
+    orphaned_ids = [
+        card_id for card_id, (set_name, _) in stored.items()
+        if card_id not in local and (not only_sets or set_name in only_sets)
+    ]
+    return {"new": sorted(new_ids), "changed": sorted(changed_ids), "unchanged": unchanged, "orphaned": sorted(orphaned_ids)}
+
+def print_diff_report(diff, local): #Per-set summary of what a sync would write
+    per_set = {}
+    for kind in ("new", "changed"):
+        for card_id in diff[kind]:
+            set_name = local[card_id][0]
+            per_set.setdefault(set_name, {"new": 0, "changed": 0})[kind] += 1
+
+    for set_name in sorted(per_set):
+        counts = per_set[set_name]
+        print(f"{set_name:20} | New: {counts['new']:4} | Changed: {counts['changed']:4}")
+
+    print(f"Local cards:     {len(local):,}")
+    print(f"New cards:       {len(diff['new']):,}")
+    print(f"Changed cards:   {len(diff['changed']):,}")
+    print(f"Unchanged cards: {diff['unchanged']:,}")
+    if diff["orphaned"]:
+        print(f"In DB but not in JSON (left alone): {len(diff['orphaned']):,}")
+
+def upsert_batch(supabase, batch, local): #Write one batch of cards; the hash goes in last so a half-written batch is retried next run
+    rows = [card_row(local[card_id][1], local[card_id][0]) for card_id in batch]
+    supabase.table("cards").upsert(rows).execute()
+
+    children = {table: [] for table in CHILD_TABLES}
+    for card_id in batch:
+        for table, table_rows in child_rows(local[card_id][1]).items():
+            children[table].extend(table_rows)
+
+    # delete the existing data so there are no duplicates
+    for table in CHILD_TABLES:
+        supabase.table(table).delete().in_("card_id", batch).execute()
+    for table in CHILD_TABLES:
+        if children[table]:
+            supabase.table(table).insert(children[table]).execute()
+
+    for row, card_id in zip(rows, batch):
+        row["content_hash"] = local[card_id][2]
+    supabase.table("cards").upsert(rows).execute()
+
+def sync(supabase, local, diff, batch_size): #Upsert every new/changed card in batches, returns (uploaded, failed)
+    to_write = diff["new"] + diff["changed"]
+    uploaded = 0
+    failed = []
+
+    for start in range(0, len(to_write), batch_size):
+        batch = to_write[start:start + batch_size]
+        try:
+            upsert_batch(supabase, batch, local)
+            uploaded += len(batch)
+            print(f"Synced {uploaded}/{len(to_write)}")
+        except Exception as e:
+            print(f"Failed batch starting at {batch[0]}: {e}")
+            failed.extend(batch)
+
+    return uploaded, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash-based incremental sync of pokemon-tcg-data into Supabase")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the diff, write nothing")
+    parser.add_argument("--report", help="Write the diff (card ids per category) to this JSON file")
+    parser.add_argument("--batch-size", type=int, default=200, help="Cards per upsert batch")
+    parser.add_argument("--data-folder", default=DATA_FOLDER, help="Path to pokemon-tcg-data/cards/en")
+    parser.add_argument("--sets", nargs="*", help="Only sync these set ids")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("Fix the env variables (supabaseurl / servicerolekey)")
+        exit(1)
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    only_sets = set(args.sets) if args.sets else None
+
+    local = load_local_catalog(args.data_folder, only_sets)
+    stored = fetch_stored_hashes(supabase)
+    diff = diff_catalog(local, stored, only_sets)
+
+    print_diff_report(diff, local)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(diff, f, indent=2)
+        print(f"Diff written to {args.report}")
+
+    if args.dry_run:
+        print("\nDry run, nothing written.")
+        return
+
+    if not diff["new"] and not diff["changed"]:
+        print("\nCatalog already in sync!")
+        return
+
+    uploaded, failed = sync(supabase, local, diff, args.batch_size)
+    print(f"Successfully synced: {uploaded}")
+    print(f"Failed: {len(failed)}")
+    if failed:
+        print("Failed cards keep their old hash and will be retried on the next run.")
+
+if __name__ == "__main__":
+    main()
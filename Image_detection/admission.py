@@ -0,0 +1,158 @@
+# ADMISSION CONTROL FOR THE SCAN ENDPOINTS
+# Scans are CPU bound, so letting every request in just makes all of them slow together. Each budget allows a
+# fixed number of card-units in flight (a single scan is 1 unit, a multi-card scan starts at 1 for decode +
+# detection and then takes whatever units are free, up to one per detected card, without waiting: a request
+# that waits while holding units can deadlock with another one doing the same). Requests beyond that wait in a
+# bounded FIFO queue with a deadline. A full queue gets a 429 and a missed deadline gets a 503, both with Retry-After based on how
+# long a unit currently takes.
+import os
+import math
+import time
+import asyncio
+import functools
+import contextvars
+from collections import deque
+from fastapi.responses import JSONResponse
+
+CPU_COUNT = os.cpu_count() or 1
+SINGLE_SCAN_BUDGET = int(os.getenv("SINGLE_SCAN_BUDGET", str(CPU_COUNT)))  # card-units in flight for /scan_card/ + /scan_card_extra_info/
+MULTI_SCAN_BUDGET = int(os.getenv("MULTI_SCAN_BUDGET", str(max(2, CPU_COUNT))))  # card-units in flight for /scan_multiple_cards/
+ADMISSION_QUEUE_LIMIT = int(os.getenv("ADMISSION_QUEUE_LIMIT", "32"))  # waiting requests per budget before 429s
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))  # seconds a request may wait before a 503
+
+_current_ticket = contextvars.ContextVar("admission_ticket", default=None)
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Ticket: #Units held by one request
+    def __init__(self, controller, units):
+        self.controller = controller
+        self.units = units
+        self.started = time.perf_counter()
+
+    def grow(self, extra): #Take up to extra more units that are free right now (multi-card scan after detection), returns the units now held
+        # Never waits: two multi-card scans each holding a unit and waiting for the other's would both time out
+        extra = min(extra, self.controller.capacity - self.units) # one request may use the whole budget, never more
+        if extra > 0:
+            self.units += self.controller.take_free(extra)
+        return self.units
+
+class AdmissionController:
+    def __init__(self, name, capacity, max_queue=ADMISSION_QUEUE_LIMIT, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiters = deque()  # (units, future), FIFO
+        self.unit_seconds = 1.0  # EWMA of wall time per card-unit, for Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self): #Seconds until the queued + in-flight work should have drained
+        queued = sum(units for units, _ in self.waiters)
+        return max(1, math.ceil((self.in_flight + queued) / self.capacity * self.unit_seconds))
+
+    def try_acquire(self, units=1): #Non-blocking, for callers that would rather skip work than wait (live scanning)
+        if not self.waiters and self.in_flight + units <= self.capacity:
+            self.in_flight += units
+            self.admitted += 1
+            return True
+        return False
+
+    def take_free(self, units): #Non-blocking, take up to units of the spare capacity for a request that is already admitted
+        granted = max(0, min(units, self.capacity - self.in_flight))
+        self.in_flight += granted
+        return granted
+
+    async def acquire(self, units=1):
+        units = min(units, self.capacity)
+        if self.try_acquire(units):
+            return
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(429, f"Too many {self.name} scans in progress", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (units, future)
+        self.waiters.append(entry)
+        self._wake_waiters()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done(): # admitted right as the deadline hit
+                return
+            self.waiters.remove(entry)
+            future.cancel()
+            self.timed_out += 1
+            raise AdmissionRejected(503, f"Timed out waiting for {self.name} scan capacity", self.retry_after())
+        except asyncio.CancelledError: # client went away while queued, don't leak the units
+            if future.done():
+                self.release(units)
+            else:
+                self.waiters.remove(entry)
+                future.cancel()
+            raise
+
+    def release(self, units, seconds=None):
+        self.in_flight -= units
+        if seconds is not None and units:
+            self.unit_seconds = 0.8 * self.unit_seconds + 0.2 * (seconds / units)
+        self._wake_waiters()
+
+    def _wake_waiters(self): #Admit queued requests in order while they fit
+        while self.waiters and self.in_flight + self.waiters[0][0] <= self.capacity:
+            units_waiting, future = self.waiters.popleft()
+            if not future.done():
+                self.in_flight += units_waiting
+                self.admitted += 1
+                future.set_result(True)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "utilization": round(self.in_flight / self.capacity, 3),
+            "queued": len(self.waiters),
+            "queue_limit": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_429": self.rejected,
+            "timed_out_503": self.timed_out,
+            "unit_seconds": round(self.unit_seconds, 3),
+        }
+
+single_scan_admission = AdmissionController("single", SINGLE_SCAN_BUDGET)
+multi_scan_admission = AdmissionController("multi", MULTI_SCAN_BUDGET)
+
+def rejected_response(e):
+    return JSONResponse(content={"error": e.reason, "retry_after": e.retry_after}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+
+def admission_controlled(controller, units=1): #Endpoint decorator: hold `units` for the whole request, 429/503 when the budget is exhausted
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                await controller.acquire(units)
+            except AdmissionRejected as e:
+                return rejected_response(e)
+            ticket = Ticket(controller, min(units, controller.capacity))
+            token = _current_ticket.set(ticket)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _current_ticket.reset(token)
+                controller.release(ticket.units, time.perf_counter() - ticket.started)
+        return wrapper
+    return decorator
+
+def current_ticket(): #The Ticket held by the request being handled (None outside admission_controlled endpoints)
+    return _current_ticket.get()
+
+def admission_stats():
+    return {"single": single_scan_admission.stats(), "multi": multi_scan_admission.stats()}
@@ -0,0 +1,152 @@
+# BINDER PAGE GRID MODE FOR /scan_multiple_cards/?mode=binder
+# Standard binder pages are 3x3 (9-pocket) or 3x4 (12-pocket). Instead of trusting one detector box per card we
+# find the page once (contour pass, or the hull of the detector boxes), fit the pocket grid that best explains
+# the detections, warp the page flat and slice every pocket. Slots come back in reading order (row by row,
+# left to right) so collection imports line up with the physical page. If no grid explains the detections
+# well enough the caller falls back to the normal getbounding(multi_card=True) path.
+import os
+import cv2
+import numpy as np
+
+CARD_ASPECT = 63 / 88  # width / height of a standard card
+GRID_LAYOUTS = [tuple(int(n) for n in layout.split("x")) for layout in os.getenv("GRID_LAYOUTS", "3x3,3x4,4x3,2x2").split(",")]  # rows x cols
+GRID_MIN_IOU = 0.3  # a detection counts for a pocket when its box overlaps the pocket at least this much
+GRID_MIN_EXPLAINED = 0.8  # fraction of detections that must land in a pocket
+GRID_MIN_CONFIDENCE = 0.7  # mean detector confidence of the matched pockets
+GRID_MAX_ASPECT_ERROR = 0.25  # page aspect vs the layout's expected aspect
+POCKET_INSET = 0.04  # trim this fraction off each pocket side (sleeve edges, neighbouring cards)
+EMPTY_POCKET_STD = 18  # grayscale std below this = empty pocket (only checked where the detector found nothing)
+POCKET_HEIGHT = 700  # pixel height of each pocket in the warped page
+
+def order_quad(points): #4 points -> top-left, top-right, bottom-right, bottom-left
+    points = np.array(points, dtype=np.float32).reshape(4, 2)
+    s = points.sum(axis=1)
+    d = np.diff(points, axis=1).reshape(-1)
+    return np.array([points[np.argmin(s)], points[np.argmin(d)], points[np.argmax(s)], points[np.argmax(d)]], dtype=np.float32)
+
+def find_page_contour(image, min_area=0.25): #Largest 4-sided contour covering at least min_area of the frame, or None
+    h, w = image.shape[:2]
+    gray = cv2.GaussianBlur(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    edges = cv2.dilate(cv2.Canny(gray, 50, 150), np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area * h * w:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4:
+            return order_quad(approx)
+    return None
+
+def detections_hull(detections): #Rotated rectangle around every detector box, works when the outer pockets are filled
+    corners = np.concatenate([[[x1, y1], [x2, y1], [x2, y2], [x1, y2]] for (x1, y1, x2, y2), _ in detections]).astype(np.float32)
+    return order_quad(cv2.boxPoints(cv2.minAreaRect(corners)))
+
+def quad_aspect(quad): #Approximate width / height of a (possibly skewed) quad
+    tl, tr, br, bl = quad
+    width = (np.linalg.norm(tr - tl) + np.linalg.norm(br - bl)) / 2
+    height = (np.linalg.norm(bl - tl) + np.linalg.norm(br - tr)) / 2
+    return width / height if height else 0
+
+def page_size(rows, cols, pocket_height=POCKET_HEIGHT):
+    pocket_width = int(round(pocket_height * CARD_ASPECT))
+    return cols * pocket_width, rows * pocket_height, pocket_width, pocket_height
+
+def score_layout(quad, rows, cols, detections): #How well a rows x cols grid on this quad explains the detections
+    page_w, page_h, pocket_w, pocket_h = page_size(rows, cols)
+    H = cv2.getPerspectiveTransform(quad, np.float32([[0, 0], [page_w, 0], [page_w, page_h], [0, page_h]]))
+
+    pockets = {}
+    for i, ((x1, y1, x2, y2), confidence) in enumerate(detections):
+        corners = cv2.perspectiveTransform(np.float32([[[x1, y1], [x2, y1], [x2, y2], [x1, y2]]]), H)[0]
+        bx1, by1 = corners.min(axis=0)
+        bx2, by2 = corners.max(axis=0)
+        col, row = int((bx1 + bx2) / 2 // pocket_w), int((by1 + by2) / 2 // pocket_h)
+        if not (0 <= row < rows and 0 <= col < cols):
+            continue
+        cx1, cy1 = col * pocket_w, row * pocket_h
+        ix = max(0.0, min(bx2, cx1 + pocket_w) - max(bx1, cx1))
+        iy = max(0.0, min(by2, cy1 + pocket_h) - max(by1, cy1))
+        inter = ix * iy
+        iou = inter / ((bx2 - bx1) * (by2 - by1) + pocket_w * pocket_h - inter)
+        if iou >= GRID_MIN_IOU and iou > pockets.get((row, col), (None, 0.0, 0.0))[1]: # keep the best box per pocket
+            pockets[(row, col)] = (i, iou, confidence)
+
+    explained = len(pockets) / len(detections) if detections else 0
+    confidence = float(np.mean([p[2] for p in pockets.values()])) if pockets else 0
+    mean_iou = float(np.mean([p[1] for p in pockets.values()])) if pockets else 0
+    aspect_error = abs(quad_aspect(quad) / (cols * CARD_ASPECT / rows) - 1)
+    return {
+        "rows": rows, "cols": cols, "quad": quad, "H": H, "pockets": pockets,
+        "explained": explained, "confidence": confidence, "mean_iou": mean_iou, "aspect_error": aspect_error,
+        "score": explained * mean_iou * (1 - min(aspect_error, 1)) * len(pockets),
+    }
+
+def fit_binder_grid(image, detections, layouts=GRID_LAYOUTS): #Best validated grid fit for a binder page photo, or None to fall back to per-card detection
+    if len(detections) < 2:
+        return None
+    quads = [q for q in (find_page_contour(image), detections_hull(detections)) if q is not None]
+
+    best = None
+    for quad in quads:
+        for rows, cols in layouts:
+            if len(detections) > rows * cols * 1.2: # more cards than pockets, wrong layout
+                continue
+            fit = score_layout(quad, rows, cols, detections)
+            valid = (fit["explained"] >= GRID_MIN_EXPLAINED and fit["confidence"] >= GRID_MIN_CONFIDENCE
+                     and fit["aspect_error"] <= GRID_MAX_ASPECT_ERROR)
+            if valid and (best is None or fit["score"] > best["score"]):
+                best = fit
+
+    if best:
+        print(f"Binder grid: {best['rows']}x{best['cols']}, {len(best['pockets'])}/{len(detections)} detections in pockets, "
+              f"mean IoU {best['mean_iou']:.2f}, confidence {best['confidence']:.1%}")
+    else:
+        print("Binder grid: no layout fits the detections, falling back to per-card detection")
+    return best
+
+def pocket_bbox_norm(fit, row, col, frame_shape): #Axis-aligned box around a pocket in the original frame, normalized
+    page_w, page_h, pocket_w, pocket_h = page_size(fit["rows"], fit["cols"])
+    cell = np.float32([[[col * pocket_w, row * pocket_h], [(col + 1) * pocket_w, row * pocket_h],
+                        [(col + 1) * pocket_w, (row + 1) * pocket_h], [col * pocket_w, (row + 1) * pocket_h]]])
+    corners = cv2.perspectiveTransform(cell, np.linalg.inv(fit["H"]))[0]
+    h, w = frame_shape[:2]
+    x1, y1 = corners.min(axis=0)
+    x2, y2 = corners.max(axis=0)
+    return [max(0.0, x1 / w), max(0.0, y1 / h), min(1.0, x2 / w), min(1.0, y2 / h)]
+
+def slice_pockets(source_image, fit, frame_shape): #Warp the page flat from source_image (any resolution of the same frame) -> pocket dicts in slot order
+    page_w, page_h, pocket_w, pocket_h = page_size(fit["rows"], fit["cols"])
+    scale = source_image.shape[1] / frame_shape[1]
+    M = cv2.getPerspectiveTransform(fit["quad"] * scale, np.float32([[0, 0], [page_w, 0], [page_w, page_h], [0, page_h]]))
+    page = cv2.warpPerspective(source_image, M, (page_w, page_h), flags=cv2.INTER_LINEAR)
+
+    inset_x, inset_y = int(pocket_w * POCKET_INSET), int(pocket_h * POCKET_INSET)
+    pockets = []
+    for row in range(fit["rows"]):
+        for col in range(fit["cols"]):
+            crop = page[row * pocket_h + inset_y:(row + 1) * pocket_h - inset_y, col * pocket_w + inset_x:(col + 1) * pocket_w - inset_x]
+            matched = fit["pockets"].get((row, col))
+            has_card = matched is not None or float(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY).std()) >= EMPTY_POCKET_STD
+            pockets.append({
+                "slot": row * fit["cols"] + col + 1,
+                "row": row + 1,
+                "col": col + 1,
+                "card_image": crop,
+                "bbox_norm": pocket_bbox_norm(fit, row, col, frame_shape),
+                "confidence": matched[2] if matched else 0.0,
+                "detected": matched is not None,
+                "empty": not has_card,
+            })
+    return pockets
+
+def draw_grid(image, fit, pockets): #Page outline + pocket boxes with slot numbers
+    out = image.copy()
+    thickness = max(2, int(round(min(image.shape[:2]) * 0.004)))
+    cv2.polylines(out, [fit["quad"].astype(np.int32)], True, (255, 0, 0), thickness)
+    h, w = image.shape[:2]
+    for pocket in pockets:
+        x1, y1, x2, y2 = pocket["bbox_norm"]
+        color = (128, 128, 128) if pocket["empty"] else ((0, 200, 0) if pocket["detected"] else (0, 200, 255))
+        cv2.rectangle(out, (int(x1 * w), int(y1 * h)), (int(x2 * w), int(y2 * h)), color, thickness)
+        cv2.putText(out, str(pocket["slot"]), (int(x1 * w) + 5, int(y1 * h) + 30), cv2.FONT_HERSHEY_SIMPLEX, 1, color, thickness)
+    return out
@@ -0,0 +1,57 @@
+# PER-ROW IDENTITY TABLE FOR THE FAISS INDEX
+# Row i of the table describes vector i of clip_card_index.faiss, so the matcher can hand back card ids directly
+# instead of every caller splitting filenames. Built by Training/training_card_identifier/build_faiss_index.py.
+import os
+import pickle
+
+project_root = os.path.join(os.path.dirname(__file__), '..')
+IDENTIFIER_DIR = os.path.join(project_root, 'Training', 'training_card_identifier')
+IDENTITY_TABLE_PATH = os.path.join(IDENTIFIER_DIR, 'clip_card_index_ids.pkl')
+REFERENCE_IMAGE_DIR = os.path.join(project_root, 'Image_detection', 'reference_images', 'EverySinglePokemonCard')
+
+COLUMNS = ('card_id', 'set_id', 'number', 'display_name', 'filename', 'image_path')
+
+def identity_from_filename(path): #Reference images are saved as {Card_Name}_{set_id}_{number}.jpg (see download_all_existing_pokemon_cards.py)
+    filename = os.path.basename(path)
+    stem = os.path.splitext(filename)[0]
+    parts = stem.split("_")
+    number = parts[-1]
+    set_id = parts[-2] if len(parts) >= 2 else ""
+    display_name = " ".join(parts[:-2])
+    return {
+        'card_id': f"{set_id}-{number}",
+        'set_id': set_id,
+        'number': number,
+        'display_name': display_name,
+        'filename': filename,
+    }
+
+def build_identity_table(image_paths, image_dir=REFERENCE_IMAGE_DIR, check_exists=False): #Column lists aligned with the FAISS row ids
+    table = {column: [] for column in COLUMNS}
+    for old_path in image_paths:
+        row = identity_from_filename(old_path)
+        image_path = os.path.join(image_dir, row['filename'])
+        # Only the build step checks the disk, the API never stats reference images
+        if check_exists and not os.path.exists(image_path) and os.path.exists(old_path):
+            image_path = old_path
+        row['image_path'] = image_path
+        for column in COLUMNS:
+            table[column].append(row[column])
+    return table
+
+def save_identity_table(table, path=IDENTITY_TABLE_PATH):
+    with open(path, 'wb') as f:
+        pickle.dump(table, f)
+
+def load_identity_table(path=IDENTITY_TABLE_PATH, map_path=None): #Load the table, or derive it once from the old path map if it was never built
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    if map_path and os.path.exists(map_path):
+        with open(map_path, 'rb') as f:
+            image_paths = pickle.load(f)
+        return build_identity_table(image_paths)
+    return None
+
+def get_row(table, idx): #Row idx of the table as a dict
+    return {column: table[column][idx] for column in COLUMNS}
@@ -0,0 +1,121 @@
+# CHEAP MULTI-CARD TRACKER FOR LIVE SCANNING (webcam mode in scan_card.py, /ws/live_scan in main.py)
+# The detector only runs every Nth frame. In between, boxes are moved by their last velocity. On detector frames,
+# boxes are matched to tracks greedily by IoU. A track is handed to OCR/CLIP once it has held still and is
+# sharp enough, and the identity is cached on the track so the same card isn't identified again every frame.
+# A failed identification (no match, blurry crop) backs off for a growing number of detector updates and gives up
+# after IDENTIFY_MAX_ATTEMPTS, until the card leaves the frame and comes back as a new track.
+import os
+import itertools
+import cv2
+import numpy as np
+
+TRACK_MATCH_IOU = 0.3  # detection <-> track association
+TRACK_MAX_MISSES = int(os.getenv("TRACK_MAX_MISSES", "3"))  # detector updates without a match before a track is dropped
+STABLE_UPDATES = int(os.getenv("STABLE_UPDATES", "3"))  # consecutive low-motion detector updates before identifying
+STABLE_MOTION = float(os.getenv("STABLE_MOTION", "0.03"))  # max center shift per update, as a fraction of the box diagonal
+SHARPNESS_MIN = float(os.getenv("SHARPNESS_MIN", "60"))  # variance of the Laplacian on the crop at SHARPNESS_HEIGHT
+SHARPNESS_HEIGHT = 400
+IDENTIFY_RETRY_UPDATES = int(os.getenv("IDENTIFY_RETRY_UPDATES", "5"))  # detector updates to wait after the first failed identification, doubled each time
+IDENTIFY_MAX_ATTEMPTS = int(os.getenv("IDENTIFY_MAX_ATTEMPTS", "3"))  # failed identifications before a track stops being offered
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def sharpness(card_image): #Variance of the Laplacian at a fixed height so the threshold doesn't depend on how big the card is in frame
+    h, w = card_image.shape[:2]
+    if h == 0 or w == 0:
+        return 0.0
+    gray = cv2.cvtColor(card_image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.resize(gray, (max(1, int(w * SHARPNESS_HEIGHT / h)), SHARPNESS_HEIGHT), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+def center_shift(old, new): #Center shift between two boxes relative to the old box's diagonal
+    diagonal = np.linalg.norm(old[2:] - old[:2])
+    if not diagonal:
+        return 1.0
+    return float(np.linalg.norm((new[:2] + new[2:]) / 2 - (old[:2] + old[2:]) / 2) / diagonal)
+
+def crop_box(frame, box): #Pixel crop of an xyxy box, clipped to the frame
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = [int(round(v)) for v in box]
+    return frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+
+class Track:
+    def __init__(self, track_id, box, confidence):
+        self.id = track_id
+        self.box = np.array(box, dtype=np.float32)
+        self.confidence = confidence
+        self.velocity = np.zeros(4, dtype=np.float32)  # per frame, for the frames the detector skips
+        self.misses = 0
+        self.still_updates = 0
+        self.sharpness = 0.0
+        self.identity = None  # cached identification result
+        self.pending = False  # identification in flight
+        self.failed_attempts = 0
+        self.retry_at = 0  # tracker update count before which a failed track isn't offered again
+
+    @property
+    def stable(self):
+        return self.still_updates >= STABLE_UPDATES
+
+class CardTracker:
+    def __init__(self):
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self.frames_since_detect = 0
+        self.updates = 0  # detector updates so far, the clock for identification retries
+
+    def predict(self): #Frames without a detector pass: coast along the last velocity
+        self.frames_since_detect += 1
+        for track in self.tracks:
+            track.box = track.box + track.velocity
+
+    def update(self, detections, frame): #Detector frame: associate [(xyxy, confidence)] with tracks, spawn new ones, drop lost ones
+        frames = max(1, self.frames_since_detect + 1)
+        self.frames_since_detect = 0
+        self.updates += 1
+
+        pairs = sorted(
+            ((box_iou(track.box, box), t, d) for t, track in enumerate(self.tracks) for d, (box, _) in enumerate(detections)),
+            reverse=True
+        )
+        matched_tracks, matched_detections = set(), set()
+        for iou, t, d in pairs:
+            if iou < TRACK_MATCH_IOU:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+            track = self.tracks[t]
+            box, confidence = np.array(detections[d][0], dtype=np.float32), detections[d][1]
+            previous = track.box - track.velocity * (frames - 1)  # where the detector last saw it
+            track.velocity = (box - previous) / frames
+            track.still_updates = track.still_updates + 1 if center_shift(previous, box) <= STABLE_MOTION else 0
+            track.box, track.confidence, track.misses = box, confidence, 0
+            track.sharpness = sharpness(crop_box(frame, box)) if track.still_updates else 0.0
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                track.still_updates = 0
+        self.tracks = [track for track in self.tracks if track.misses <= TRACK_MAX_MISSES]
+
+        for d, (box, confidence) in enumerate(detections):
+            if d not in matched_detections:
+                self.tracks.append(Track(next(self._ids), box, confidence))
+        return self.tracks
+
+    def identification_failed(self, track): #No identity for this track: wait RETRY_UPDATES, 2x, 4x... updates, stop after MAX_ATTEMPTS
+        track.failed_attempts += 1
+        track.retry_at = self.updates + IDENTIFY_RETRY_UPDATES * 2 ** (track.failed_attempts - 1)
+
+    def ready_for_identification(self): #Stable, sharp, not identified yet, nothing in flight for it and not backing off after a failure
+        return [track for track in self.tracks
+                if track.identity is None and not track.pending and track.stable and track.sharpness >= SHARPNESS_MIN
+                and track.failed_attempts < IDENTIFY_MAX_ATTEMPTS and self.updates >= track.retry_at]
@@ -0,0 +1,53 @@
+# CLIP IMAGE ENCODER HELPERS (precision modes for CPU inference)
+# CLIP_PRECISION=fp32 (default) | int8 (dynamic quantization of the Linear layers) | bf16
+import os
+import torch
+
+CLIP_PRECISION = os.getenv("CLIP_PRECISION", "fp32").lower()
+SUPPORTED_PRECISIONS = ("fp32", "int8", "bf16")
+
+def drop_text_tower(model): #Scanning only ever calls encode_image, the text transformer is ~250MB of dead weight
+    for attr in ("transformer", "token_embedding", "ln_final"):
+        if hasattr(model, attr):
+            setattr(model, attr, torch.nn.Identity())
+    for attr in ("positional_embedding", "text_projection"):
+        if hasattr(model, attr):
+            setattr(model, attr, None)
+    return model
+
+def apply_precision(model, precision=CLIP_PRECISION): #Returns (model, precision actually used). Falls back to fp32 if the mode isn't usable here.
+    precision = (precision or "fp32").lower()
+    if precision not in SUPPORTED_PRECISIONS:
+        print(f"Unknown CLIP_PRECISION '{precision}', using fp32")
+        return model, "fp32"
+
+    model.eval()
+    if precision == "fp32":
+        return model, "fp32"
+
+    try:
+        if precision == "int8":
+            # Only the visual tower is quantized, conv1 and the layer norms stay fp32
+            model.visual = torch.ao.quantization.quantize_dynamic(model.visual, {torch.nn.Linear}, dtype=torch.qint8)
+        elif precision == "bf16":
+            model.visual = model.visual.to(torch.bfloat16)
+            # encode_image casts its input to model.dtype, make sure a forward pass actually runs on this CPU
+            with torch.no_grad():
+                model.encode_image(torch.zeros(1, 3, 224, 224))
+        return model, precision
+    except Exception as e:
+        print(f"CLIP {precision} mode not supported here ({e}), using fp32")
+        model.visual = model.visual.float()
+        return model, "fp32"
+
+def encode_images(model, input_tensor): #Normalized float32 numpy embeddings, whatever precision the model runs in
+    with torch.no_grad():
+        emb = model.encode_image(input_tensor).float()
+        emb = emb / emb.norm(dim=-1, keepdim=True)
+    return emb.cpu().numpy().astype('float32')
+
+def model_size_mb(model): #Size of the serialized weights, what the model costs in RAM before activations
+    import io
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
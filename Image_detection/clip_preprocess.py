@@ -0,0 +1,79 @@
+# CLIP PREPROCESSING WITH OPENCV + NUMPY (no PIL, no torchvision)
+# Same steps as the transform clip.load returns: resize the short side to 224, center crop 224x224, scale to
+# [0, 1], normalize with CLIP's mean / std, CHW. BGR -> RGB is folded into the normalization by reading the
+# channels in reverse, and all crops of a batch are written straight into one preallocated float32 buffer per
+# thread (multi-card scans embed from worker threads), which torch.from_numpy / onnxruntime use without a copy.
+# Differences vs PIL: cv2 INTER_AREA stands in for PIL's antialiased bicubic when shrinking, INTER_CUBIC when
+# enlarging. Benchmarks/check_clip_preprocess.py measures the gap against _clip_preprocess.
+# The FAISS index was built with the PIL path, so that stays the default until check_clip_preprocess.py --embed and
+# eval_matcher.py show no regression with CLIP_PREPROCESS=cv2 (or the index is rebuilt with this module).
+import os
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+CLIP_PREPROCESS = os.getenv("CLIP_PREPROCESS", "pil").lower()  # pil (torchvision transform from clip.load, what the index was built with) or cv2 (this module)
+INPUT_SIZE = 224
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)  # RGB
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+# x_rgb = pixel / 255 -> (x_rgb - mean) / std, written as one multiply-add per pixel
+_SCALE = (1.0 / (255.0 * CLIP_STD)).astype(np.float32)
+_BIAS = (-CLIP_MEAN / CLIP_STD).astype(np.float32)
+
+_buffers = threading.local()
+
+def resize_short_side(image, size=INPUT_SIZE): #Short side -> size, long side truncated like torchvision's Resize(int)
+    h, w = image.shape[:2]
+    if h <= w:
+        new_h, new_w = size, int(size * w / h)
+    else:
+        new_h, new_w = int(size * h / w), size
+    if (new_h, new_w) == (h, w):
+        return image
+    interpolation = cv2.INTER_AREA if new_h < h else cv2.INTER_CUBIC
+    return cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+def center_crop(image, size=INPUT_SIZE): #Same rounding as torchvision's CenterCrop
+    h, w = image.shape[:2]
+    top = int(round((h - size) / 2.0))
+    left = int(round((w - size) / 2.0))
+    return image[top:top + size, left:left + size]
+
+def batch_buffer(n, size=INPUT_SIZE): #(n, 3, size, size) float32 view into this thread's buffer, grown when a bigger batch comes in
+    buffer = getattr(_buffers, "array", None)
+    if buffer is None or buffer.shape[0] < n or buffer.shape[2] != size:
+        buffer = _buffers.array = np.empty((max(n, 1), 3, size, size), dtype=np.float32)
+    return buffer[:n]
+
+def preprocess_into(out, image_bgr, size=INPUT_SIZE): #One BGR uint8 crop -> normalized RGB CHW written into out (3, size, size)
+    crop = center_crop(resize_short_side(image_bgr, size), size)
+    for channel in range(3): # out[c] = crop[..., 2 - c] * scale[c] + bias[c], channel 0 is R which is BGR index 2
+        np.multiply(crop[..., 2 - channel], _SCALE[channel], out=out[channel])
+        out[channel] += _BIAS[channel]
+    return out
+
+def preprocess_batch(images_bgr, size=INPUT_SIZE): #List of BGR crops -> (N, 3, size, size) float32 in the reusable buffer
+    # The result is only valid until this thread preprocesses the next batch, copy it if it has to live longer
+    batch = batch_buffer(len(images_bgr), size)
+    for i, image in enumerate(images_bgr):
+        preprocess_into(batch[i], image, size)
+    return batch
+
+def preprocess(image_bgr, size=INPUT_SIZE): #Single crop -> (1, 3, size, size), same buffer rules as preprocess_batch
+    return preprocess_batch([image_bgr], size)
+
+def pil_transform(image, size=INPUT_SIZE): #clip.load's torchvision transform redone with PIL + numpy: PIL image -> (3, size, size) float32
+    # Same bicubic Resize(size), CenterCrop(size), ToTensor, Normalize steps, for the onnx backend (CLIP_PREPROCESS=pil) without torch
+    w, h = image.size
+    if w <= h:
+        new_w, new_h = size, int(size * h / w)
+    else:
+        new_w, new_h = int(size * w / h), size
+    if (new_w, new_h) != (w, h):
+        image = image.resize((new_w, new_h), Image.BICUBIC)
+    top = int(round((new_h - size) / 2.0))
+    left = int(round((new_w - size) / 2.0))
+    crop = np.asarray(image.crop((left, top, left + size, top + size)).convert("RGB"), dtype=np.float32)
+    return (crop * _SCALE + _BIAS).transpose(2, 0, 1)
@@ -0,0 +1,79 @@
+# TWO-STAGE CLIP SEARCH: SMALL COARSE INDEX FOR A SHORTLIST, EXACT 512-D RERANK
+# The flat index compares every query against every 512-d float32 reference vector. With COARSE_SEARCH set, a much
+# smaller index finds a shortlist first: PCA down to 64/128 dims (L2 in the projected space, which ranks like cosine
+# for normalized vectors) or 512-bit binary codes (IndexLSH with per-dimension thresholds, Hamming distance).
+# The shortlist is then reranked with exact inner products against the full embedding matrix, which is memory
+# mapped, so only the shortlisted rows are ever read and the pages are shared between worker processes.
+# TwoStageIndex answers search() / reconstruct_batch() like the flat index, so the rest of the matcher
+# (set filter, name candidates, eval harness) doesn't care which one it got.
+# Files are written by Training/training_card_identifier/build_faiss_index.py next to the flat index.
+import os
+import numpy as np
+
+COARSE_SEARCH = os.getenv("COARSE_SEARCH", "").lower()  # "" = exact flat search, or pca64 / pca128 / bin512
+COARSE_SHORTLIST = int(os.getenv("COARSE_SHORTLIST", "200"))  # candidates reranked at full precision
+EMBEDDING_MATRIX_FILE = "clip_card_embeddings.f32.npy"  # (N, 512) float32, row i = FAISS row i
+
+def coarse_index_file(mode): #clip_card_index_pca64.faiss etc.
+    return f"clip_card_index_{mode}.faiss"
+
+def build_coarse_index(embeddings, mode): #Trained coarse faiss index for "pcaN" or "binN" over (N, d) float32 normalized embeddings
+    import faiss
+    d = embeddings.shape[1]
+    if mode.startswith("pca"):
+        dims = int(mode[3:])
+        index = faiss.IndexPreTransform(faiss.PCAMatrix(d, dims), faiss.IndexFlatL2(dims))
+    elif mode.startswith("bin"):
+        bits = int(mode[3:])
+        # random rotation only when the code is shorter than the vector, thresholds trained per dimension (median-ish)
+        index = faiss.IndexLSH(d, bits, bits != d, True)
+    else:
+        raise ValueError(f"Unknown coarse mode '{mode}', expected pcaN or binN")
+    index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+class TwoStageIndex:
+    def __init__(self, coarse, embeddings, shortlist=COARSE_SHORTLIST, mode=""):
+        self.coarse = coarse
+        self.embeddings = embeddings  # np.memmap or array, (ntotal, d) float32
+        self.shortlist = shortlist
+        self.mode = mode
+        self.ntotal, self.d = embeddings.shape
+
+    @classmethod
+    def load(cls, directory, mode=COARSE_SEARCH, shortlist=COARSE_SHORTLIST): #Coarse index + memory-mapped matrix from directory, or None if either is missing
+        import faiss
+        coarse_path = os.path.join(directory, coarse_index_file(mode))
+        matrix_path = os.path.join(directory, EMBEDDING_MATRIX_FILE)
+        if not os.path.exists(coarse_path) or not os.path.exists(matrix_path):
+            print(f"COARSE_SEARCH={mode} but {coarse_path} or {matrix_path} is missing (run build_faiss_index.py)")
+            return None
+        embeddings = np.load(matrix_path, mmap_mode='r')
+        coarse = faiss.read_index(coarse_path)
+        if coarse.ntotal != embeddings.shape[0]:
+            print(f"Coarse index has {coarse.ntotal} vectors but the embedding matrix has {embeddings.shape[0]} rows, not using it")
+            return None
+        return cls(coarse, embeddings, shortlist, mode)
+
+    def search(self, queries, k): #(D, I) like faiss: D are exact inner products, I global row ids, -1 padded
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        _, shortlist = self.coarse.search(queries, min(self.ntotal, max(k, self.shortlist)))
+        D = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        I = np.full((len(queries), k), -1, dtype=np.int64)
+        for qi, rows in enumerate(shortlist):
+            rows = np.sort(rows[rows >= 0]) # sorted rows read the memmap front to back
+            scores = self.embeddings[rows] @ queries[qi]
+            top = np.argsort(-scores)[:k]
+            D[qi, :len(top)] = scores[top]
+            I[qi, :len(top)] = rows[top]
+        return D, I
+
+    def reconstruct_batch(self, rows): #Full precision vectors, for the set filter and name candidate ranking
+        return np.asarray(self.embeddings[np.asarray(rows)], dtype=np.float32)
+
+    def reconstruct_n(self, start, n):
+        return np.asarray(self.embeddings[start:start + n], dtype=np.float32)
+
+    def reconstruct(self, row):
+        return np.asarray(self.embeddings[row], dtype=np.float32)
@@ -0,0 +1,232 @@
+# UPLOAD INGEST: SIZE-CAPPED READ + REDUCED-RESOLUTION DECODE
+# Phone photos are 12-48MP but YOLO only looks at 640px, so we decode straight to a detection-sized frame
+# (libjpeg DCT scaling via IMREAD_REDUCED_* is much cheaper than a full decode + resize) and only go back to
+# the file when a detected card would come out too small for OCR/CLIP, then only at the libjpeg scale that crop needs.
+# The format is sniffed from the magic bytes so HEIC (most iPhone uploads) goes straight to pillow_heif, and
+# decoding runs in a small bounded thread pool instead of on the event loop.
+import os
+import io
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(float(os.getenv("MAX_IMAGE_MEGAPIXELS", "64")) * 1_000_000)  # decompression bomb guard, checked on the header
+DETECT_MAX_SIDE = int(os.getenv("DETECT_MAX_SIDE", "960"))  # long side of the frame we detect on (YOLO letterboxes to 640), 12MP and 48MP photos land just above it at 1/4 and 1/8
+CROP_MIN_HEIGHT = int(os.getenv("CROP_MIN_HEIGHT", "448"))  # card crops shorter than this get re-cropped from a larger decode: 2x CLIP's 224 input, ~20px tall name text for OCR
+READ_CHUNK_BYTES = 1024 * 1024
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"hevm", b"hevs", b"mif1", b"msf1", b"avif", b"avis"}
+
+_heif_registered = False
+_decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+_decode_stats_lock = threading.Lock()
+_decode_stats = {}  # format -> {"count", "total_ms", "recent": deque of ms}
+
+class UploadTooLarge(Exception):
+    pass
+
+async def read_upload_capped(file, max_bytes=MAX_UPLOAD_BYTES): #Read an UploadFile in chunks and stop as soon as it goes over the limit
+    chunks, total = [], 0
+    while True:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLarge(f"Upload is larger than {max_bytes // (1024 * 1024)}MB")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def register_heif_decoder(): #Hook pillow_heif into Pillow once per process (call at startup), returns whether HEIC is supported
+    global _heif_registered
+    if not _heif_registered:
+        try:
+            import pillow_heif
+            pillow_heif.register_heif_opener()
+            _heif_registered = True
+        except Exception as e:
+            print(f"pillow_heif not available, HEIC uploads will be rejected: {e}")
+    return _heif_registered
+
+def sniff_format(image_data): #Container format from the magic bytes: jpeg, png, webp, heif, or None
+    head = image_data[:16]
+    if head[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp":
+        brands = {head[8:12]} | {image_data[i:i + 4] for i in range(16, min(len(image_data), 64), 4)}  # major + compatible brands
+        if brands & HEIF_BRANDS:
+            return "heif"
+    return None
+
+def header_size(image_data): #(width, height) from the file header without decoding pixels, None if Pillow can't tell
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            w, h = img.size
+            orientation = img.getexif().get(0x0112, 1)  # EXIF orientation, 5-8 swap width and height
+        return (h, w) if orientation in (5, 6, 7, 8) else (w, h)
+    except Exception:
+        return None
+
+def reduction_factor(size, max_side): #Largest libjpeg scale (1/2, 1/4, 1/8) that still leaves the long side >= max_side
+    if size is None:
+        return 1
+    long_side = max(size)
+    for factor in (8, 4, 2):
+        if long_side // factor >= max_side:
+            return factor
+    return 1
+
+def crop_reduction_factor(crop_height, min_height): #Largest libjpeg scale that still leaves a crop crop_height px tall at full-res >= min_height
+    for factor in (8, 4, 2):
+        if crop_height / factor >= min_height:
+            return factor
+    return 1
+
+def fit_long_side(image, max_side): #Downscale so the long side is at most max_side
+    h, w = image.shape[:2]
+    if max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    return cv2.resize(image, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_AREA)
+
+def decode_pillow(image_data, max_side=None): #Pillow fallback (HEIC/HEIF once pillow_heif is registered, odd PNG/WebP variants)
+    img = Image.open(io.BytesIO(image_data))
+    if max_side and img.format == "JPEG":
+        img.draft("RGB", (max_side, max_side))  # DCT scaling, same trick as IMREAD_REDUCED_*
+    img = img.convert('RGB')
+    image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    return fit_long_side(image, max_side) if max_side else image
+
+def decode_full(image_data): #Full-resolution BGR decode, None on failure
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        try:
+            image = decode_pillow(image_data)
+        except Exception:
+            return None
+    return image
+
+class IngestedImage: #Detection-resolution frame plus a lazily decoded full-resolution view for card crops
+    def __init__(self, image, image_data, full_size, full_image=None):
+        self.image = image
+        self.image_data = image_data
+        self.full_size = full_size  # (width, height) of the original
+        self.format = None
+        self.decode_ms = None
+        self._full_image = full_image
+        self._scaled = {}  # libjpeg scale -> reduced decode made for small crops
+        self._lock = threading.Lock() # multi-card crops run in a thread pool
+
+    @property
+    def is_reduced(self):
+        return self.full_size is not None and max(self.full_size) > max(self.image.shape[:2])
+
+    def full_image(self): #Decoded on first use only
+        with self._lock:
+            if self._full_image is None:
+                self._full_image = decode_full(self.image_data) if self.is_reduced else self.image
+                if self._full_image is None:
+                    self._full_image = self.image
+        return self._full_image
+
+    def scaled_image(self, factor): #JPEG decoded at 1/factor, falls back to full_image() for other formats or once full-res exists
+        if factor == 1 or self.format != "jpeg" or self._full_image is not None:
+            return self.full_image()
+        with self._lock:
+            if factor not in self._scaled:
+                image = cv2.imdecode(np.frombuffer(self.image_data, np.uint8), REDUCED_FLAGS[factor])
+                self._scaled[factor] = image
+            image = self._scaled[factor]
+        return image if image is not None else self.full_image()
+
+    def largest_within(self, max_bytes): #Biggest decode of this upload whose BGR pixels fit max_bytes: full-res, a libjpeg scale, or the detection frame
+        w, h = self.full_size
+        if w * h * 3 <= max_bytes:
+            return self.full_image()
+        if self.format == "jpeg" and self._full_image is None:
+            for factor in (2, 4, 8):
+                if -(-w // factor) * -(-h // factor) * 3 <= max_bytes: # libjpeg rounds scaled sizes up
+                    return self.scaled_image(factor)
+        return self.image
+
+    def crop_source(self, bbox_norm, min_height=CROP_MIN_HEIGHT): #Image to crop bbox_norm out of: the detection frame if the crop is big enough, else the smallest decode that is
+        h = self.image.shape[0]
+        crop_height = (bbox_norm[3] - bbox_norm[1]) * h
+        if not self.is_reduced or crop_height >= min_height:
+            return self.image
+        return self.scaled_image(crop_reduction_factor(crop_height * self.full_size[1] / h, min_height))
+
+def decode_upload(image_data, max_side=DETECT_MAX_SIDE, max_pixels=MAX_IMAGE_PIXELS): #Raw bytes -> IngestedImage, or None if it can't be decoded
+    start = time.perf_counter()
+    image_format = sniff_format(image_data)
+    if image_format == "heif" and not register_heif_decoder():
+        return None
+
+    size = header_size(image_data)
+    if size is not None and size[0] * size[1] > max_pixels:
+        raise UploadTooLarge(f"Image is {size[0]}x{size[1]}, over the {max_pixels // 1_000_000}MP limit")
+
+    full_image = None
+    image = None
+    if image_format == "heif": # OpenCV can't read HEIC, and HEVC has no reduced decode, so keep the full frame for crops
+        try:
+            full_image = decode_pillow(image_data)
+            image = full_image
+        except Exception:
+            return None
+    else:
+        factor = reduction_factor(size, max_side) if image_format == "jpeg" else 1
+        try:
+            image = cv2.imdecode(np.frombuffer(image_data, np.uint8), REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR))
+        except Exception:
+            image = None
+
+        if image is None:
+            try:
+                image = decode_pillow(image_data, max_side)
+            except Exception:
+                return None
+
+    if size is None:
+        size = (image.shape[1], image.shape[0])
+    upload = IngestedImage(fit_long_side(image, max_side), image_data, size, full_image=full_image)
+    upload.format = image_format or "other"
+    upload.decode_ms = (time.perf_counter() - start) * 1000
+    record_decode_time(upload.format, upload.decode_ms)
+    return upload
+
+async def decode_upload_async(image_data): #decode_upload on the bounded decode pool so big photos don't stall the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_decode_executor, decode_upload, image_data)
+
+def record_decode_time(image_format, ms):
+    with _decode_stats_lock:
+        stats = _decode_stats.setdefault(image_format, {"count": 0, "total_ms": 0.0, "recent": deque(maxlen=500)})
+        stats["count"] += 1
+        stats["total_ms"] += ms
+        stats["recent"].append(ms)
+
+def decode_stats(): #Per-format decode count, mean and p50/p95 over the last 500 decodes (served on /health)
+    with _decode_stats_lock:
+        summary = {}
+        for image_format, stats in _decode_stats.items():
+            recent = np.array(stats["recent"])
+            summary[image_format] = {
+                "count": stats["count"],
+                "mean_ms": round(stats["total_ms"] / stats["count"], 2),
+                "p50_ms": round(float(np.percentile(recent, 50)), 2),
+                "p95_ms": round(float(np.percentile(recent, 95)), 2),
+            }
+        return {"workers": DECODE_WORKERS, "heif": _heif_registered, "formats": summary}
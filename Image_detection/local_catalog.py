@@ -0,0 +1,86 @@
+# READ PATH FOR THE LOCAL SQLITE CARD CATALOG (built by Database/build_local_catalog.py)
+# Zero network, so scans don't wait on Supabase for card data. Rows come back shaped like the Supabase ones.
+import os
+import json
+import sqlite3
+import threading
+
+project_root = os.path.join(os.path.dirname(__file__), '..')
+CATALOG_PATH = os.getenv("CARD_CATALOG_PATH", os.path.join(project_root, 'Database', 'card_catalog.sqlite'))
+
+ARRAY_COLUMNS = {"subtypes", "types", "retreat_cost", "national_pokedex_numbers", "cost"}
+
+_local = threading.local()
+
+def is_available(): #Local catalog can be turned off with USE_LOCAL_CATALOG=0 even if the file exists
+    if os.getenv("USE_LOCAL_CATALOG", "1") == "0":
+        return False
+    return os.path.exists(CATALOG_PATH)
+
+def _file_version(): #(inode, mtime) of the catalog file, changes when build_local_catalog.py os.replace()s a new one in
+    try:
+        st = os.stat(CATALOG_PATH)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+def _connection(): #One read-only connection per thread (sqlite connections shouldn't be shared across threads)
+    # Reopened when the file was swapped, an open connection would keep reading the old unlinked inode until a restart
+    version = _file_version()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.version != version:
+        if conn is not None:
+            conn.close()
+        uri = f"file:{os.path.abspath(CATALOG_PATH)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+        _local.version = version
+    return conn
+
+def _row_to_dict(row):
+    result = {}
+    for key in row.keys():
+        value = row[key]
+        if key in ARRAY_COLUMNS and value is not None:
+            value = json.loads(value)
+        result[key] = value
+    return result
+
+def get_card(card_id): #Same shape as a row of the Supabase cards table, or None
+    row = _connection().execute(
+        "SELECT id, name, supertype, subtypes, level, hp, types, evolves_from, rarity, artist, flavor_text, retreat_cost, "
+        "converted_retreat_cost, set_name, number, national_pokedex_numbers, image_small, image_large FROM cards WHERE id = ?",
+        (card_id,)
+    ).fetchone()
+    return _row_to_dict(row) if row else None
+
+def has_card(card_id): #Whether the card is in this catalog, so an empty child list means "none" rather than "not mirrored yet"
+    return _connection().execute("SELECT 1 FROM cards WHERE id = ?", (card_id,)).fetchone() is not None
+
+def get_card_json(card_id): #The original pokemon-tcg-data JSON for a card, or None
+    row = _connection().execute("SELECT raw_json FROM cards WHERE id = ?", (card_id,)).fetchone()
+    return json.loads(row["raw_json"]) if row else None
+
+def _get_children(table, card_id):
+    rows = _connection().execute(f"SELECT * FROM {table} WHERE card_id = ? ORDER BY id", (card_id,)).fetchall()
+    return [_row_to_dict(row) for row in rows]
+
+def get_attacks(card_id):
+    return _get_children("attacks", card_id)
+
+def get_abilities(card_id):
+    return _get_children("abilities", card_id)
+
+def get_weaknesses(card_id):
+    return _get_children("weaknesses", card_id)
+
+def get_resistances(card_id):
+    return _get_children("resistances", card_id)
+
+def get_set_totals(): #{set_id: printed_total} for sets that have one, {} if the catalog predates the sets table
+    try:
+        rows = _connection().execute("SELECT id, printed_total FROM sets WHERE printed_total IS NOT NULL").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row["id"]: row["printed_total"] for row in rows}
@@ -0,0 +1,288 @@
+# IN-MEMORY STAND-IN FOR THE SUPABASE CLIENT (load testing / offline runs)
+# SUPABASE_BACKEND=memory makes main.py use this instead of create_client. It covers the PostgREST query
+# builder calls the API and the Database scripts make (select/eq/in_/order/range/insert/update/upsert/delete,
+# count="exact" and embedded joins like cards(*, attacks(*))).
+# For a real Postgres stand-in run a local Supabase stack (`supabase start`) and point supabaseurl at it,
+# the normal remote client works against it unchanged.
+import os
+import re
+import copy
+import time
+import uuid
+import threading
+from datetime import datetime
+
+MEMORY_LATENCY_MS = float(os.getenv("MEMORY_SUPABASE_LATENCY_MS", "0"))  # fake network round trip per execute()
+SEED_USERS = int(os.getenv("MEMORY_SUPABASE_USERS", "50"))
+SEED_CARDS_PER_USER = int(os.getenv("MEMORY_SUPABASE_CARDS_PER_USER", "100"))
+
+# (parent table, embedded table) -> (parent column, child column, one row or many)
+RELATIONSHIPS = {
+    ("user_cards", "cards"): ("card_id", "id", "one"),
+    ("cards", "attacks"): ("id", "card_id", "many"),
+    ("cards", "weaknesses"): ("id", "card_id", "many"),
+    ("cards", "resistances"): ("id", "card_id", "many"),
+    ("cards", "abilities"): ("id", "card_id", "many"),
+    ("cards", "user_cards"): ("id", "card_id", "many"),
+    ("users", "user_cards"): ("id", "user_id", "many"),
+}
+
+class APIResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+def seed_user_ids(n=SEED_USERS): #Deterministic so the load generator can hit the same users without asking the server
+    return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"pokemon-scanner-load-user-{i}")) for i in range(n)]
+
+def _split_top_level(text): #Split a select string on commas that aren't inside parentheses
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+def _parse_select(columns): #"id, cards!fk(*, attacks(*))" -> (["id"], [("cards", "*, attacks(*)")])
+    plain, embeds = [], []
+    for part in _split_top_level(" ".join(columns.split())):
+        match = re.match(r"^(\w+)(?:!\w+)?\s*\((.*)\)$", part, re.S)
+        if match:
+            embeds.append((match.group(1), match.group(2)))
+        else:
+            plain.append(part)
+    return plain, embeds
+
+class QueryBuilder:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.count = None
+        self.payload = None
+        self.filters = []
+        self.order_by = None
+        self.row_range = None
+        self.eq_filters = []
+
+    # Query construction (same chaining style as postgrest-py)
+    def select(self, columns="*", count=None):
+        self.action, self.columns, self.count = "select", columns, count
+        return self
+
+    def insert(self, payload):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.action, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self.action, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.eq_filters.append((column, value))
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end)
+        return self
+
+    def limit(self, n):
+        self.row_range = (0, n - 1)
+        return self
+
+    def _matches(self, row):
+        return all(f(row) for f in self.filters)
+
+    def execute(self):
+        if MEMORY_LATENCY_MS:
+            time.sleep(MEMORY_LATENCY_MS / 1000)
+        with self.db.lock:
+            if self.action in ("update", "delete"):
+                self.db.indexes.pop(self.table, None)
+            return getattr(self, f"_execute_{self.action}")()
+
+    def _candidates(self): #Use the hash index for the first eq() filter instead of scanning the table
+        if self.eq_filters:
+            return self.db.lookup(self.table, *self.eq_filters[0])
+        return self.db.tables.setdefault(self.table, [])
+
+    def _execute_select(self):
+        rows = [row for row in self._candidates() if self._matches(row)]
+        total = len(rows)
+        if self.order_by:
+            column, desc = self.order_by
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        if self.row_range:
+            rows = rows[self.row_range[0]:self.row_range[1] + 1]
+        data = [self.db.project(self.table, row, self.columns) for row in rows]
+        return APIResponse(data, total if self.count else None)
+
+    def _execute_insert(self):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        inserted = [self.db.insert_row(self.table, row) for row in payload]
+        return APIResponse(copy.deepcopy(inserted))
+
+    def _execute_upsert(self):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        written = []
+        updated_existing = False
+        for row in payload:
+            existing = self.db.find_by_id(self.table, row.get("id"))
+            if existing is not None:
+                existing.update(copy.deepcopy(row))
+                written.append(existing)
+                updated_existing = True
+            else:
+                written.append(self.db.insert_row(self.table, row))
+        if updated_existing: # updated columns may be indexed
+            self.db.indexes.pop(self.table, None)
+        return APIResponse(copy.deepcopy(written))
+
+    def _execute_update(self):
+        updated = []
+        for row in self.db.tables.setdefault(self.table, []):
+            if self._matches(row):
+                row.update(copy.deepcopy(self.payload))
+                updated.append(row)
+        return APIResponse(copy.deepcopy(updated))
+
+    def _execute_delete(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        deleted = [row for row in rows if self._matches(row)]
+        self.db.tables[self.table] = [row for row in rows if not self._matches(row)]
+        return APIResponse(copy.deepcopy(deleted))
+
+class InMemorySupabase: #Only the parts of supabase.Client the app uses: .table(name)
+    def __init__(self):
+        self.tables = {}
+        self.next_ids = {}
+        self.indexes = {}  # table -> column -> value -> rows, kept up to date on insert, dropped on update/delete
+        self.lock = threading.RLock()
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    def lookup(self, table, column, value):
+        by_column = self.indexes.setdefault(table, {})
+        if column not in by_column:
+            index = {}
+            for row in self.tables.setdefault(table, []):
+                index.setdefault(row.get(column), []).append(row)
+            by_column[column] = index
+        return by_column[column].get(value, [])
+
+    def find_by_id(self, table, row_id):
+        if row_id is None:
+            return None
+        rows = self.lookup(table, "id", row_id)
+        return rows[0] if rows else None
+
+    def insert_row(self, table, row):
+        row = copy.deepcopy(row)
+        if "id" not in row and table not in ("cards", "users"): # serial primary keys
+            self.next_ids[table] = self.next_ids.get(table, 0) + 1
+            row["id"] = self.next_ids[table]
+        self.tables.setdefault(table, []).append(row)
+        for column, index in self.indexes.get(table, {}).items():
+            index.setdefault(row.get(column), []).append(row)
+        return row
+
+    def project(self, table, row, columns): #Apply the select list, resolving embedded resources
+        plain, embeds = _parse_select(columns)
+        if "*" in plain:
+            result = copy.deepcopy(row)
+        else:
+            result = {column: copy.deepcopy(row.get(column)) for column in plain}
+
+        for embed_table, embed_columns in embeds:
+            parent_col, child_col, kind = RELATIONSHIPS[(table, embed_table)]
+            children = self.lookup(embed_table, child_col, row.get(parent_col))
+            projected = [self.project(embed_table, child, embed_columns) for child in children]
+            result[embed_table] = (projected[0] if projected else None) if kind == "one" else projected
+        return result
+
+    def load_catalog(self, catalog_path): #Pull the cards + child tables out of the local SQLite catalog
+        import sqlite3
+        import json
+        conn = sqlite3.connect(f"file:{os.path.abspath(catalog_path)}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        array_columns = {"subtypes", "types", "retreat_cost", "national_pokedex_numbers", "cost"}
+        for table in ("cards", "attacks", "abilities", "weaknesses", "resistances"):
+            rows = []
+            for r in conn.execute(f"SELECT * FROM {table}"):
+                row = {k: (json.loads(r[k]) if k in array_columns and r[k] is not None else r[k]) for k in r.keys() if k != "raw_json"}
+                rows.append(row)
+            self.tables[table] = rows
+            if table != "cards":
+                self.next_ids[table] = max((row["id"] for row in rows), default=0)
+        conn.close()
+
+    def seed_users(self, card_ids, n_users=SEED_USERS, cards_per_user=SEED_CARDS_PER_USER): #Fake users with collections, half of them on the leaderboard
+        import random
+        rng = random.Random(0)
+        now = datetime.now().isoformat()
+        for i, user_id in enumerate(seed_user_ids(n_users)):
+            self.insert_row("users", {
+                "id": user_id,
+                "email": f"load{i}@example.com",
+                "password_hash": None,
+                "name": f"Load User {i}",
+                "created_at": now,
+                "show_on_leaderboard": i % 2 == 0
+            })
+            for card_id in rng.sample(card_ids, min(cards_per_user, len(card_ids))):
+                self.insert_row("user_cards", {
+                    "user_id": user_id,
+                    "card_id": card_id,
+                    "quantity": rng.randint(1, 4),
+                    "acquired_at": now,
+                    "source": "scanned"
+                })
+
+def create_memory_client(catalog_path=None, identity_table=None): #Seeded in-memory client: catalog from SQLite if built, else bare cards from the FAISS identity table
+    client = InMemorySupabase()
+    if catalog_path and os.path.exists(catalog_path):
+        client.load_catalog(catalog_path)
+    elif identity_table:
+        seen = set()
+        for card_id, set_id, number, name in zip(identity_table['card_id'], identity_table['set_id'], identity_table['number'], identity_table['display_name']):
+            if card_id not in seen:
+                seen.add(card_id)
+                client.insert_row("cards", {"id": card_id, "name": name, "set_name": set_id, "number": number})
+
+    card_ids = [row["id"] for row in client.tables.get("cards", [])]
+    if card_ids:
+        client.seed_users(card_ids)
+    print(f"In-memory Supabase ready: {len(card_ids)} cards, {len(client.tables.get('users', []))} users")
+    return client
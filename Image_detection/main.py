@@ -3,7 +3,9 @@ import os
 
 os.environ.setdefault('KMP_DUPLICATE_LIB_OK', 'TRUE')
 
-from fastapi import FastAPI, UploadFile, File
+from .startup_profile import lazy_import, timed, mark, summary as startup_summary, print_profile # first, so PROCESS_START is close to interpreter start
+
+from fastapi import FastAPI, UploadFile, File, WebSocket, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -12,15 +14,28 @@ import numpy as np
 import os
 import json
 import uuid
-from .scan_card import getbounding, crop_out_card, get_text_from_image, get_best_matched_clip, initialize_clip_matcher
+from .scan_card import getbounding, crop_out_card, get_text_from_image, get_text_from_images, BATCH_OCR, get_best_matched_clip, embed_card_images, initialize_clip_matcher, get_detector, get_ocr_reader, detect_cards, identify_card, LIVE_DETECT_EVERY, should_tile, TILE_MIN_SIDE
+from .scan_card import current_matcher, active_bundle, reload_bundle, bundle_status
+from .model_bundles import list_bundles
+from .card_tracker import CardTracker, crop_box
+from .binder_grid import fit_binder_grid, slice_pockets, draw_grid
+from .render import draw_detections, draw_ocr
+from . import local_catalog
+from .local_supabase import create_memory_client
+from .card_identity import load_identity_table, IDENTITY_TABLE_PATH
+from .admission import admission_controlled, single_scan_admission, multi_scan_admission, current_ticket, admission_stats, rejected_response, AdmissionRejected
+from .image_ingest import read_upload_capped, decode_upload_async, register_heif_decoder, decode_stats, UploadTooLarge
+from .shm_transport import get_scan_pool, shutdown_scan_pool, detect_task, detect_frame_task, identify_task, identify_card_task, RingFull, FrameTooLarge, BrokenProcessPool
 import uvicorn
-from supabase import create_client, Client
 from dotenv import load_dotenv
 from datetime import datetime
 import base64
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import threading
 import traceback
 import io
+import hmac
 from PIL import Image
 
 
@@ -28,7 +43,32 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("supabaseurl")
 SUPABASE_KEY = os.getenv("servicerolekey")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+SUPABASE_BACKEND = os.getenv("SUPABASE_BACKEND", "remote")  # remote (supabaseurl, also works for a local `supabase start` stack) or memory
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # enables the /admin/ endpoints, clients send it as the X-Admin-Token header
+
+class LazySupabase: #Builds the client on first use so importing main doesn't pay for the supabase package (or the identity table)
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    with timed("model", f"supabase ({SUPABASE_BACKEND})"):
+                        if SUPABASE_BACKEND == "memory": # for load testing on one box, see Benchmarks/load_test.py
+                            self._client = create_memory_client(
+                                catalog_path=local_catalog.CATALOG_PATH,
+                                identity_table=load_identity_table(IDENTITY_TABLE_PATH, map_path=os.path.join(os.path.dirname(IDENTITY_TABLE_PATH), 'clip_card_index_map.pkl'))
+                            )
+                        else:
+                            self._client = lazy_import("supabase").create_client(SUPABASE_URL, SUPABASE_KEY)
+        return self._client
+
+    def __getattr__(self, name): # supabase.table(...) etc. go straight to the real client
+        return getattr(self.client(), name)
+
+supabase = LazySupabase()
 
 app = FastAPI(title="Pokemon Card Scanner API", version="1.0.0")
 
@@ -47,36 +87,17 @@ def convert_numpy_types(obj):
     return obj
 
 
-async def read_image_from_upload(file: UploadFile): #read and turn an UploadFile into an OpenCV BGR image.
-    image_data = await file.read()
-
-    # Try OpenCV first
-    try:
-        np_array = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-        if image is not None:
-            return image, image_data
-    except Exception:
-        image = None
-
-    # Try Pillow
-    try:
-        try:
-            import pillow_heif
-            try:
-                pillow_heif.register_heif_opener()
-            except Exception:
-                pass
-        except Exception:
-            pass
+async def read_image_from_upload(file: UploadFile): #read and turn an UploadFile into a detection-resolution OpenCV BGR image (see image_ingest.py)
+    image_data = await read_upload_capped(file) # raises UploadTooLarge
 
-        pil_img = Image.open(io.BytesIO(image_data)).convert('RGB')
-        image = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-        return image, image_data
-    except Exception:
-        pass
+    upload = await decode_upload_async(image_data) # raises UploadTooLarge on decompression bombs
+    if upload is None:
+        return None, None
+    print(f"Decoded {upload.format} upload {upload.full_size[0]}x{upload.full_size[1]} in {upload.decode_ms:.0f}ms")
+    return upload.image, upload
 
-    return None, image_data
+def upload_too_large_response(e):
+    return JSONResponse(content={"error": str(e)}, status_code=413)
 
 # Add CORS middleware to allow requests
 app.add_middleware(
@@ -108,6 +129,13 @@ class UpdateQuantity(BaseModel):
 
 # Database helper functions
 def get_card_from_db(card_id: str):
+    if local_catalog.is_available(): # local SQLite mirror, no network round trip, cards it doesn't have yet come from the database
+        try:
+            card = local_catalog.get_card(card_id)
+            if card is not None:
+                return card
+        except Exception as e:
+            print(f"Error reading local catalog, falling back to database: {e}")
     try:
         response = supabase.table("cards").select("*").eq("id", card_id).execute()
         if response.data and len(response.data) > 0:
@@ -118,6 +146,13 @@ def get_card_from_db(card_id: str):
         return None
     
 def get_weaknesses_from_db(card_id: str): #maybe i'll need this later
+    if local_catalog.is_available():
+        try:
+            weaknesses = local_catalog.get_weaknesses(card_id)
+            if weaknesses or local_catalog.has_card(card_id):
+                return weaknesses
+        except Exception as e:
+            print(f"Error reading local catalog, falling back to database: {e}")
     try:
         response = supabase.table("weaknesses").select("*").eq("card_id", card_id).execute()
         if response.data:
@@ -128,6 +163,13 @@ def get_weaknesses_from_db(card_id: str): #maybe i'll need this later
         return []
 
 def get_resistances_from_db(card_id: str):  #maybe i'll need this later
+    if local_catalog.is_available():
+        try:
+            resistances = local_catalog.get_resistances(card_id)
+            if resistances or local_catalog.has_card(card_id):
+                return resistances
+        except Exception as e:
+            print(f"Error reading local catalog, falling back to database: {e}")
     try:
         response = supabase.table("resistances").select("*").eq("card_id", card_id).execute()
         if response.data:
@@ -138,6 +180,13 @@ def get_resistances_from_db(card_id: str):  #maybe i'll need this later
         return []
 
 def get_abilities_from_db(card_id: str): #maybe i'll need this later
+    if local_catalog.is_available():
+        try:
+            abilities = local_catalog.get_abilities(card_id)
+            if abilities or local_catalog.has_card(card_id):
+                return abilities
+        except Exception as e:
+            print(f"Error reading local catalog, falling back to database: {e}")
     try:
         response = supabase.table("abilities").select("*").eq("card_id", card_id).execute()
         if response.data:
@@ -148,6 +197,13 @@ def get_abilities_from_db(card_id: str): #maybe i'll need this later
         return []
 
 def get_card_attacks_from_db(card_id: str):  #maybe i'll need this later
+    if local_catalog.is_available():
+        try:
+            attacks = local_catalog.get_attacks(card_id)
+            if attacks or local_catalog.has_card(card_id):
+                return attacks
+        except Exception as e:
+            print(f"Error reading local catalog, falling back to database: {e}")
     try:
         response = (supabase.table("attacks").select("*").eq("card_id", card_id).execute())
         if response.data:
@@ -197,8 +253,11 @@ _clip_initialized = False
 async def startup_event():
     import asyncio
     global _clip_initialized
+
+    register_heif_decoder() # once per process instead of on every HEIC upload
     
-    # Run CLIP initialization in background thread to not block startup
+    # Warm up in a background thread to not block startup: CLIP first (scans are gated on it), then the
+    # detector, OCR reader and Supabase client so the first request doesn't pay for their imports
     def init_clip_background():
         global _clip_initialized
         print("Initializing CLIP in background...")
@@ -207,12 +266,48 @@ async def startup_event():
             print("CLIP ready")
         else:
             print("CLIP failed to initialize")
+        try:
+            get_detector()
+            get_ocr_reader()
+            supabase.client()
+        except Exception as e:
+            print(f"Warmup failed: {e}")
+        mark("models_warm")
+        print_profile()
     
+    # With SCAN_PROCESSES the workers hold the models, loading them here too would double the memory. Scans are
+    # ready once every worker has loaded its own, and every scan endpoint hands its model work to them
+    async def warm_scan_pool(scan_pool):
+        global _clip_initialized
+        print("Starting scan worker processes in background...")
+        try:
+            pids = await scan_pool.warm_up()
+            _clip_initialized = True
+            print(f"Scan workers ready: {sorted(pids)}")
+        except Exception as e:
+            print(f"Scan workers failed to start: {e}")
+        try:
+            await loop.run_in_executor(None, supabase.client)
+        except Exception as e:
+            print(f"Warmup failed: {e}")
+        mark("models_warm")
+        print_profile()
+
     # Run in thread pool executor to not block event loop
     loop = asyncio.get_event_loop()
-    loop.run_in_executor(None, init_clip_background)
+    scan_pool = get_scan_pool() # creates the shared memory ring
+    if scan_pool is not None:
+        print(f"Scan worker processes: {scan_pool.stats()}")
+        asyncio.create_task(warm_scan_pool(scan_pool))
+    else:
+        loop.run_in_executor(None, init_clip_background)
+    mark("app_ready")
     print("CLIP initialization started in background")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_scan_pool() # unlinks the shared memory segment
+
 @app.get("/") #home page
 async def root(): #check if up
     return {
@@ -225,10 +320,54 @@ async def root(): #check if up
 async def health():
     return {
         "status": "healthy",
-        "clip_ready": _clip_initialized
+        "clip_ready": _clip_initialized,
+        "local_catalog": local_catalog.is_available(),
+        "decode": decode_stats(),
+        "admission": admission_stats(),
+        "scan_processes": get_scan_pool().stats() if get_scan_pool() else None,
+        "model_bundle": active_bundle()
     }
 
+@app.get("/startup_profile") #import and model load times for this process
+async def startup_profile():
+    return startup_summary()
+
+def admin_denied(token): #403 response unless ADMIN_TOKEN is set and token matches it, else None
+    if not ADMIN_TOKEN or not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return JSONResponse(content={"error": "Admin token required"}, status_code=403)
+    return None
+
+@app.get("/admin/models") #Active model bundle, the versions on disk and reload progress
+async def admin_models(x_admin_token: str = Header(None)):
+    denied = admin_denied(x_admin_token)
+    if denied:
+        return denied
+    return {**bundle_status(), "available": list_bundles()}
+
+@app.post("/admin/reload_models") #Load a model bundle version in the background, smoke test it and swap it in (model_bundles.py)
+async def admin_reload_models(version: str, x_admin_token: str = Header(None)):
+    # Under serve_prefork.py the parent loads it once and rolls every worker onto it
+    denied = admin_denied(x_admin_token)
+    if denied:
+        return denied
+    try:
+        started = reload_bundle(version)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=404)
+    if not started:
+        return JSONResponse(content={"error": "A reload is already running", **bundle_status()}, status_code=409)
+    # Scans keep using the current bundle until the new one passed its smoke test, poll /admin/models for the outcome
+    return JSONResponse(content={"reloading": version, "active": active_bundle()}, status_code=202)
+
+def scan_pool_error_response(e): #503 for a scan the worker pool couldn't take (ring full, frame too big, dead worker)
+    if isinstance(e, BrokenProcessPool): # the pool is already being replaced
+        return JSONResponse(content={"error": "Scan worker crashed, please retry"}, status_code=503, headers={"Retry-After": "5"})
+    return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "1"})
+
 @app.post("/scan_card_extra_info/") #Scan uploaded image and return extra info (for seeing the process work)
+@admission_controlled(single_scan_admission)
 async def scan_card_extra_info(file: UploadFile = File(...)):
     try:
         # Check if CLIP is ready
@@ -241,8 +380,8 @@ async def scan_card_extra_info(file: UploadFile = File(...)):
                 status_code=503
             )
         
-        # GET THE IMAGE (supports HEIC/HEIF via Pillow/pyheif fallback)
-        image, _ = await read_image_from_upload(file)
+        # GET THE IMAGE (HEIC/HEIF is sniffed and decoded with pillow_heif)
+        image, upload = await read_image_from_upload(file)
 
         if image is None:
             return JSONResponse(
@@ -250,16 +389,22 @@ async def scan_card_extra_info(file: UploadFile = File(...)):
                 status_code=400
             )
 
-        # Detect card bounding box
-        result = getbounding(image, display=False)
+        # Detect card bounding box (in a scan worker with SCAN_PROCESSES)
+        scan_pool = get_scan_pool()
+        bundle = active_bundle()
+        if scan_pool is not None:
+            detected = await scan_pool.run(detect_task, image, False, bundle)
+        else:
+            result = getbounding(image, display=False)
+            detected = result[1:] if isinstance(result, tuple) else None
         
-        if result is None or not isinstance(result, tuple):
+        if detected is None:
             return JSONResponse(
                 content={"error": "Failed to detect card"},
                 status_code=400
             )
 
-        model, bbox, bbox_image = result
+        bbox, detections = detected
 
         if bbox is None:
             return JSONResponse(
@@ -268,30 +413,35 @@ async def scan_card_extra_info(file: UploadFile = File(...)):
             )
         
         # Crop the card
-        card_image = crop_out_card(image, bbox, save_path=None, debug=False)
+        card_image = crop_out_card(upload.crop_source(bbox), bbox, save_path=None, debug=False)
         
-        if card_image is None:
+        if card_image is None or card_image.size == 0:
             return JSONResponse(
                 content={"error": "Failed to crop card"},
                 status_code=500
             )
         
-        # Extract text with OCR
-        card_info, annotated_image = get_text_from_image(card_image, debug=True, getmore=True, show_window=False)
+        if scan_pool is not None: # only the crop goes to the worker
+            identified = await scan_pool.run(identify_task, card_image, 5, bundle, True)
+            card_info, ocr_results, best, matches = identified["card_info"], identified["ocr_results"], identified["best"], identified["matches"]
+        else:
+            # Extract text with OCR
+            card_info, ocr_results = get_text_from_image(card_image, debug=True, getmore=True, show_window=False)
 
-        detected_name = card_info.get('name')
-        best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=detected_name)
+            detected_name = card_info.get('name')
+            best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=detected_name, card_number=card_info.get('card_number'))
         
-        filename = best['card_name']
-        
-        parts = filename.split("_")
-        card_num = parts[-1].replace(".jpg", "")
-        set_name = parts[-2]
-        card_id = f"{set_name}-{card_num}"
+        card_id = best['card_id']
+        set_name = best['set_id']
+        card_num = best['number']
         
         # Fetch full card data from database
         card_data = get_card_from_db(card_id)
         
+        # Only this endpoint returns the annotated images, so only it pays for rendering them
+        bbox_image = draw_detections(image, detections)
+        annotated_image = draw_ocr(card_image, ocr_results)
+
         # Convert images to base64 for JSON response
         _, base_image_encoded = cv2.imencode('.jpg', image)
         base_image_base64 = base64.b64encode(base_image_encoded).decode('utf-8')
@@ -324,6 +474,7 @@ async def scan_card_extra_info(file: UploadFile = File(...)):
             "top_matches": [
                 {
                     "rank": m['rank'],
+                    "card_id": m['card_id'],
                     "card_name": m['card_name'],
                     "card_path": m.get('card_path', ''),
                     "similarity": m['similarity']
@@ -333,6 +484,10 @@ async def scan_card_extra_info(file: UploadFile = File(...)):
             "card_data": card_data
         }, status_code=200)
 
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except (RingFull, FrameTooLarge, BrokenProcessPool) as e:
+        return scan_pool_error_response(e)
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(
@@ -344,6 +499,7 @@ async def scan_card_extra_info(file: UploadFile = File(...)):
         )
 
 @app.post("/scan_card/") #Scan uploaded image (no extra info just straight business)
+@admission_controlled(single_scan_admission)
 async def scan_card(file: UploadFile = File(...)): 
     try:
         # Check if CLIP is ready
@@ -356,7 +512,7 @@ async def scan_card(file: UploadFile = File(...)):
                 status_code=503  # Service Unavailable
             )
         
-        image, _ = await read_image_from_upload(file)
+        image, upload = await read_image_from_upload(file)
 
         if image is None:
             return JSONResponse(
@@ -364,45 +520,65 @@ async def scan_card(file: UploadFile = File(...)):
                 status_code=400
             )
 
-        # Detect card bounding box
-        result = getbounding(image, display=False)
-        
-        if result is None or not isinstance(result, tuple):
-            return JSONResponse(
-                content={"error": "Failed to detect card"},
-                status_code=400
-            )
-        
-        model, bbox, bbox_image = result
-        
-        if bbox is None:
-            return JSONResponse(
-                content={"error": "No card detected in image"},
-                status_code=404
-            )
-        
-        # Crop the card
-        card_image = crop_out_card(image, bbox, save_path=None)
-        
-        if card_image is None:
-            return JSONResponse(
-                content={"error": "Failed to crop card"},
-                status_code=500
-            )
-        
-        # Extract text with OCR
-        card_info = get_text_from_image(card_image, debug=False)
-        
-        # Find matches with CLIP
-        detected_name = card_info.get('name')
-        best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=detected_name)
-        
-        filename = best['card_name']
+        scan_pool = get_scan_pool()
+        if scan_pool is not None: # worker processes, frames handed over through shared memory (shm_transport.py)
+            bundle = active_bundle()
+            try:
+                detected = await scan_pool.run(detect_task, image, False, bundle)
+                bbox = detected[0] if detected else None
+                if bbox is None:
+                    return JSONResponse(
+                        content={"error": "No card detected in image"},
+                        status_code=404
+                    )
+                # Crop here (from a larger decode if the card is small) and hand the worker only the crop, not the whole frame
+                card_image = crop_out_card(upload.crop_source(bbox), bbox, save_path=None)
+                if card_image is None or card_image.size == 0:
+                    return JSONResponse(
+                        content={"error": "Failed to crop card"},
+                        status_code=500
+                    )
+                identified = await scan_pool.run(identify_task, card_image, 5, bundle)
+            except (RingFull, FrameTooLarge, BrokenProcessPool) as e:
+                return scan_pool_error_response(e)
+            card_info, best, matches = identified["card_info"], identified["best"], identified["matches"]
+        else:
+            # Detect card bounding box
+            result = getbounding(image, display=False)
+            
+            if result is None or not isinstance(result, tuple):
+                return JSONResponse(
+                    content={"error": "Failed to detect card"},
+                    status_code=400
+                )
+            
+            model, bbox, _ = result
+            
+            if bbox is None:
+                return JSONResponse(
+                    content={"error": "No card detected in image"},
+                    status_code=404
+                )
+            
+            # Crop the card
+            card_image = crop_out_card(upload.crop_source(bbox), bbox, save_path=None)
+            
+            if card_image is None:
+                return JSONResponse(
+                    content={"error": "Failed to crop card"},
+                    status_code=500
+                )
+            
+            # Extract text with OCR
+            card_info = get_text_from_image(card_image, debug=False)
+            
+            # Find matches with CLIP
+            detected_name = card_info.get('name')
+            best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=detected_name)
         
-        parts = filename.split("_")
-        card_num = parts[-1].replace(".jpg", "")
-        set_name = parts[-2]
-        card_id = f"{set_name}-{card_num}"
+        card_id = best['card_id']
+        set_name = best['set_id']
+        card_num = best['number']
         
         # Fetch full card data from database
         card_data = get_card_from_db(card_id)
@@ -422,6 +598,7 @@ async def scan_card(file: UploadFile = File(...)):
             "top_matches": [
                 {
                     "rank": m['rank'],
+                    "card_id": m['card_id'],
                     "card_name": m['card_name'],
                     "card_path": m.get('card_path', ''),
                     "similarity": m['similarity']
@@ -433,6 +610,8 @@ async def scan_card(file: UploadFile = File(...)):
         
         return JSONResponse(content=response_data, status_code=200)
 
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(
@@ -443,8 +622,43 @@ async def scan_card(file: UploadFile = File(...)):
             status_code=500
         )
 
+async def detect_multi_in_pool(scan_pool, upload, bundle, tiled=None): #getbounding(multi_card=True) for /scan_multiple_cards/ in a scan worker -> (bbox_list, detections) or None
+    # A worker can't call back for upload.full_image like hires= does in process, so the full-frame pass runs on the
+    # detection frame and, if it wants tiles, a second pass tiles the largest decode that fits a shared memory slot
+    image = upload.image
+    detected = await scan_pool.run(detect_task, image, True, bundle, 0.7, False)
+    if detected is None or tiled is False or not (tiled or should_tile(detected[1], image.shape[0])):
+        return detected
+    hires = await asyncio.get_running_loop().run_in_executor(None, upload.largest_within, scan_pool.ring.slot_bytes)
+    if not tiled and max(hires.shape[:2]) < TILE_MIN_SIDE:
+        return detected
+    tiled_result = await scan_pool.run(detect_task, hires, True, bundle, 0.7, True)
+    if tiled_result is None:
+        return detected
+    bbox_list, detections = tiled_result
+    scale = image.shape[1] / hires.shape[1] # bbox_norm is resolution independent, detections are drawn on the detection frame
+    return bbox_list, [(xyxy * scale, c) for xyxy, c in detections]
+
+async def identify_in_pool(scan_pool, upload, bbox_list, bundle, concurrency): #OCR + CLIP for every card of a multi-card scan in the scan workers, at most concurrency at once
+    # Crops are cut here and only they go through shared memory. Results land on the bbox dicts as 'identified'
+    loop = asyncio.get_running_loop()
+    def crop_all():
+        for bbox_data in bbox_list:
+            if bbox_data.get('card_image') is None:
+                bbox_data['card_image'] = crop_out_card(upload.crop_source(bbox_data['bbox_norm']), bbox_data['bbox_norm'], save_path=None, debug=False)
+            if bbox_data['card_image'] is not None and bbox_data['card_image'].size == 0:
+                bbox_data['card_image'] = None
+    await loop.run_in_executor(None, crop_all)
+
+    limit = asyncio.Semaphore(concurrency)
+    async def identify_one(bbox_data):
+        async with limit:
+            bbox_data['identified'] = await scan_pool.run(identify_task, bbox_data['card_image'], 5, bundle)
+    await asyncio.gather(*(identify_one(b) for b in bbox_list if b['card_image'] is not None))
+
 @app.post("/scan_multiple_cards/") #Scan multiple Pokemon cards from a single image, ONLY FOR UPLOADING IMAGES
-async def scan_multiple_cards(file: UploadFile = File(...)):
+@admission_controlled(multi_scan_admission)
+async def scan_multiple_cards(file: UploadFile = File(...), mode: str = "detect"): # mode=binder slices a 3x3 / 3x4 binder page by its grid (binder_grid.py)
     try:
         # Check if CLIP is ready
         if not _clip_initialized:
@@ -456,24 +670,64 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                 status_code=503
             )
         
-        image, _ = await read_image_from_upload(file)
+        image, upload = await read_image_from_upload(file)
 
         if image is None:
             return JSONResponse(
                 content={"error": "Invalid or unsupported image file"},
                 status_code=400
             )
+        # every card of this image goes through the same model bundle, even if one is swapped in meanwhile
+        matcher = current_matcher()
+        bundle = active_bundle()
+        scan_pool = get_scan_pool() # with SCAN_PROCESSES, detection and OCR + CLIP run in the scan workers
 
-        # Detect multiple cards with 70% confidence threshold
-        result = getbounding(image, display=False, multi_card=True, conf_threshold=0.7)
-        
-        if result is None or not isinstance(result, tuple):
-            return JSONResponse(
-                content={"error": "Failed to detect cards"},
-                status_code=400
-            )
-        
-        model, bbox_list, bbox_image = result
+        grid = None
+        detected = None
+        if mode == "binder":
+            # One full-frame detector pass finds the page and validates the grid, then every pocket is sliced directly
+            if scan_pool is not None:
+                detected = await detect_multi_in_pool(scan_pool, upload, bundle, tiled=False)
+            else:
+                result = getbounding(image, display=False, multi_card=True, conf_threshold=0.7, tiled=False)
+                detected = result[1:] if isinstance(result, tuple) else None
+            if detected and detected[0]:
+                grid = fit_binder_grid(image, detected[1])
+
+        if grid:
+            pockets = slice_pockets(upload.full_image(), grid, image.shape)
+            bbox_list = [
+                {
+                    'bbox_norm': p['bbox_norm'],
+                    'confidence': p['confidence'],
+                    'index': idx,
+                    'slot': p['slot'],
+                    'row': p['row'],
+                    'col': p['col'],
+                    'card_image': p['card_image']
+                }
+                for idx, p in enumerate(pp for pp in pockets if not pp['empty'])
+            ]
+            # All pockets through CLIP in one forward pass (the scan workers embed them one by one instead)
+            embeddings = embed_card_images([b['card_image'] for b in bbox_list], matcher) if scan_pool is None else None
+            if embeddings is not None:
+                for i, bbox_data in enumerate(bbox_list):
+                    bbox_data['embedding'] = embeddings[i:i + 1]
+        else:
+            # Detect multiple cards with 70% confidence threshold
+            if scan_pool is not None:
+                detected = await detect_multi_in_pool(scan_pool, upload, bundle)
+            else:
+                result = getbounding(image, display=False, multi_card=True, conf_threshold=0.7, hires=upload.full_image) # tiles come from full-res on big binder pages
+                detected = result[1:] if isinstance(result, tuple) else None
+            
+            if detected is None:
+                return JSONResponse(
+                    content={"error": "Failed to detect cards"},
+                    status_code=400
+                )
+            
+            bbox_list, detections = detected
         
         if not bbox_list or len(bbox_list) == 0:
             return JSONResponse(
@@ -484,7 +738,27 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                 status_code=404
             )
         
+        # Up to one card-unit per card from what the multi-card budget has free now, the thread pool below never runs more cards than that
+        granted_units = current_ticket().grow(len(bbox_list) - 1)
         print(f"\nProcessing {len(bbox_list)} cards in parallel")
+
+        # Use max 10 worker, and no more than the card-units admission gave this request
+        max_workers = max(1, min(10, len(bbox_list), granted_units))
+
+        if scan_pool is not None:
+            # OCR + CLIP in the scan workers, process_single_card below only builds the results
+            await identify_in_pool(scan_pool, upload, bbox_list, bundle, max_workers)
+        elif BATCH_OCR:
+            # Crop every card up front and read all the headers in one batched EasyOCR call (see get_text_from_images)
+            try:
+                for bbox_data in bbox_list:
+                    if bbox_data.get('card_image') is None:
+                        bbox_data['card_image'] = crop_out_card(upload.crop_source(bbox_data['bbox_norm']), bbox_data['bbox_norm'], save_path=None, debug=False)
+                readable = [b for b in bbox_list if b['card_image'] is not None and b['card_image'].size]
+                for bbox_data, card_info in zip(readable, get_text_from_images([b['card_image'] for b in readable])):
+                    bbox_data['card_info'] = card_info
+            except Exception as e: # the threads below fall back to reading their own card
+                print(f"Batched OCR failed: {e}")
         
         # Function to process a single card
         def process_single_card(idx, bbox_data, image_copy):
@@ -496,8 +770,10 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
             print(f"\nCard {card_num}/{len(bbox_list)} (Confidence: {confidence:.1%})")
             
             try:
-                # Crop the card (use image_copy to avoid threading issues)
-                card_image = crop_out_card(image_copy, bbox_norm, save_path=None, debug=False)
+                # Binder pockets are already sliced, otherwise crop (from the full-res view if the detection frame is too small for this one)
+                card_image = bbox_data.get('card_image')
+                if card_image is None:
+                    card_image = crop_out_card(upload.crop_source(bbox_norm), bbox_norm, save_path=None, debug=False)
                 
                 if card_image is None:
                     print(f"Failed to crop card {card_num}")
@@ -508,13 +784,19 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                         "confidence": confidence
                     }
                 
-                # Extract text with OCR
-                card_info = get_text_from_image(card_image, debug=False)
+                # Extract text with OCR (already done in one batch unless BATCH_OCR is off or failed, or by a scan worker)
+                identified = bbox_data.get('identified')
+                card_info = identified['card_info'] if identified else bbox_data.get('card_info')
+                if card_info is None:
+                    card_info = get_text_from_image(card_image, debug=False)
                 detected_name = card_info.get('name', 'Unknown')
                 print(f"OCR detected name: {detected_name}")
                 
                 # Find matches with CLIP
-                best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=detected_name)
+                if identified:
+                    best, matches = identified['best'], identified['matches']
+                else:
+                    best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=detected_name, embedding=bbox_data.get('embedding'), matcher=matcher)
                 
                 if not best:
                     print(f"No CLIP match found for card {card_num}")
@@ -526,11 +808,9 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                         "ocr_name": detected_name
                     }
                 
-                filename = best['card_name']
-                parts = filename.split("_")
-                card_number = parts[-1].replace(".jpg", "")
-                set_name = parts[-2]
-                card_id = f"{set_name}-{card_number}"
+                card_id = best['card_id']
+                set_name = best['set_id']
+                card_number = best['number']
                 
                 print(f"Identified as: {card_id} (similarity: {best['similarity']:.4f})")
                 
@@ -544,11 +824,9 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                 # Build all match variants with full card data
                 all_match_variants = []
                 for m in matches[:10]:  # Get top 10 matches to give user more options
-                    variant_filename = m['card_name']
-                    variant_parts = variant_filename.split("_")
-                    variant_card_num = variant_parts[-1].replace(".jpg", "")
-                    variant_set = variant_parts[-2]
-                    variant_card_id = f"{variant_set}-{variant_card_num}"
+                    variant_card_id = m['card_id']
+                    variant_set = m['set_id']
+                    variant_card_num = m['number']
                     
                     # Fetch card data for this variant
                     variant_card_data = get_card_from_db(variant_card_id)
@@ -563,7 +841,7 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                         "card_data": variant_card_data
                     })
                 
-                return {
+                card_result = {
                     "success": True,
                     "card_number": card_num,
                     "detection_confidence": confidence,
@@ -578,6 +856,9 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                     "card_data": card_data,
                     "all_matches": all_match_variants
                 }
+                if 'slot' in bbox_data: # binder mode, where on the page this card sits
+                    card_result.update(slot=bbox_data['slot'], row=bbox_data['row'], col=bbox_data['col'])
+                return card_result
                 
             except Exception as e:
                 print(f"Error processing card {card_num}: {e}")
@@ -593,9 +874,6 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
         processed_cards = []
         failed_cards = []
         
-        # Use max 10 worker, hopefully this runs fine
-        max_workers = min(10, len(bbox_list))
-        
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_idx = {
                 executor.submit(process_single_card, idx, bbox_data, image): idx 
@@ -614,6 +892,8 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
                         "error": result["error"],
                         "confidence": result.get("confidence", 0)
                     })
+                    if grid:
+                        failed_cards[-1]["slot"] = bbox_list[result["card_number"] - 1]['slot']
         
         # Sort processed cards by card_number to maintain original order
         processed_cards.sort(key=lambda x: x["card_number"])
@@ -623,6 +903,7 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
         print(f"{len(processed_cards)} successful, {len(failed_cards)} failed")
         
         # Convert bbox image with all detections to base64
+        bbox_image = draw_grid(image, grid, pockets) if grid else draw_detections(image, detections, multi_card=True)
         _, bbox_image_encoded = cv2.imencode('.jpg', bbox_image)
         bbox_image_base64 = base64.b64encode(bbox_image_encoded).decode('utf-8')
 
@@ -631,6 +912,7 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
         # Build response
         response_data = {
             "success": True,
+            "mode": "binder" if grid else "detect",
             "total_detected": len(bbox_list),
             "successfully_processed": len(processed_cards),
             "failed": len(failed_cards),
@@ -638,6 +920,12 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
             "cards": processed_cards,
             "failed_cards": failed_cards if failed_cards else None
         }
+        if grid:
+            response_data["grid"] = {
+                "rows": grid['rows'],
+                "cols": grid['cols'],
+                "empty_slots": [p['slot'] for p in pockets if p['empty']]
+            }
 
         print("built now send")
 
@@ -646,6 +934,12 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
 
         return JSONResponse(content=response_data, status_code=200)
 
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except UploadTooLarge as e:
+        return upload_too_large_response(e)
+    except (RingFull, FrameTooLarge, BrokenProcessPool) as e:
+        return scan_pool_error_response(e)
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(
@@ -656,6 +950,159 @@ async def scan_multiple_cards(file: UploadFile = File(...)):
             status_code=500
         )
 
+LIVE_MAX_IDENTIFY = int(os.getenv("LIVE_MAX_IDENTIFY", "1"))  # OCR + CLIP jobs in flight per live connection
+
+class LiveScanSession: #Per-connection state for /ws/live_scan
+    def __init__(self):
+        self.tracker = CardTracker()
+        self.latest_frame = None  # only the newest frame is kept, older unprocessed ones are dropped
+        self.new_frame = asyncio.Event()
+        self.send_lock = asyncio.Lock()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.identifying = 0
+
+    def track_events(self, frame_shape): #Current tracks as JSON-friendly dicts with normalized boxes
+        h, w = frame_shape[:2]
+        tracks = []
+        for track in self.tracker.tracks:
+            x1, y1, x2, y2 = [float(v) for v in track.box]
+            tracks.append({
+                "track_id": track.id,
+                "bbox": [max(0.0, x1 / w), max(0.0, y1 / h), min(1.0, x2 / w), min(1.0, y2 / h)],
+                "state": "identified" if track.identity else ("identifying" if track.pending else ("stable" if track.stable else "moving")),
+                "card_id": track.identity['card_id'] if track.identity else None
+            })
+        return tracks
+
+@app.websocket("/ws/live_scan") #Live scanning: client streams downscaled JPEG frames as binary messages, server pushes track + identification events
+async def live_scan_ws(websocket: WebSocket):
+    await websocket.accept()
+    if not _clip_initialized:
+        await websocket.send_json({"type": "error", "error": "CLIP model is still initializing. Please try again in a moment.", "clip_ready": False})
+        await websocket.close(code=1013)
+        return
+
+    session = LiveScanSession()
+    loop = asyncio.get_running_loop()
+    scan_pool = get_scan_pool() # with SCAN_PROCESSES, detection and identification run in the scan workers
+
+    async def send(message):
+        async with session.send_lock:
+            await websocket.send_json(convert_numpy_types(message))
+
+    async def receive_frames(): # latest frame wins, so a slow server skips frames instead of queueing them
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    if session.latest_frame is not None:
+                        session.dropped += 1
+                    session.latest_frame = message["bytes"]
+                    session.received += 1
+                    session.new_frame.set()
+                elif message.get("text"):
+                    try:
+                        command = json.loads(message["text"])
+                    except ValueError:
+                        await send({"type": "error", "error": "Text messages must be JSON, e.g. {\"type\": \"reset\"}"})
+                        continue
+                    if isinstance(command, dict) and command.get("type") == "reset":
+                        session.tracker = CardTracker()
+        finally:
+            session.closed = True
+            session.new_frame.set()
+
+    async def identify(track, card_image):
+        card_data = None
+        try:
+            if scan_pool is not None:
+                track.identity = await scan_pool.run(identify_card_task, card_image, active_bundle())
+            else:
+                track.identity = await loop.run_in_executor(None, identify_card, card_image)
+            if track.identity:
+                card_data = await loop.run_in_executor(None, get_card_from_db, track.identity['card_id'])
+        except Exception:
+            traceback.print_exc()
+        finally:
+            single_scan_admission.release(1)
+            if not track.identity: # back off before trying this card again
+                session.tracker.identification_failed(track)
+            track.pending = False
+            session.identifying -= 1
+        if track.identity and not session.closed:
+            await send({"type": "identified", "track_id": track.id, **track.identity, "card_data": card_data})
+
+    async def process_frames():
+        frame_idx = 0
+        while True:
+            await session.new_frame.wait()
+            session.new_frame.clear()
+            if session.closed:
+                break
+            data, session.latest_frame = session.latest_frame, None
+            if data is None:
+                continue
+
+            try:
+                upload = await decode_upload_async(data)
+            except UploadTooLarge as e: # skip the frame, the connection stays up
+                await send({"type": "error", "error": str(e)})
+                continue
+            if upload is None:
+                await send({"type": "error", "error": "Invalid or unsupported image frame"})
+                continue
+            frame = upload.image
+
+            # Detector on every Nth frame, tracks carry boxes and identities in between
+            if frame_idx % LIVE_DETECT_EVERY == 0:
+                try:
+                    if scan_pool is not None:
+                        detections = [await scan_pool.run(detect_frame_task, frame, 0.5, active_bundle())]
+                    else:
+                        detections = await loop.run_in_executor(None, detect_cards, [frame], 0.5)
+                except (RingFull, FrameTooLarge, BrokenProcessPool) as e: # skip the frame, the connection stays up
+                    await send({"type": "error", "error": str(e) or "Scan worker crashed"})
+                    continue
+                session.tracker.update(detections[0], frame)
+            else:
+                session.tracker.predict()
+            frame_idx += 1
+            session.processed += 1
+
+            for track in session.tracker.ready_for_identification()[:max(0, LIVE_MAX_IDENTIFY - session.identifying)]:
+                if not single_scan_admission.try_acquire(1): # uploads get the CPU first, try again on a later frame
+                    break
+                track.pending = True
+                session.identifying += 1
+                asyncio.create_task(identify(track, crop_box(frame, track.box).copy()))
+
+            await send({
+                "type": "tracks",
+                "frame": session.received,
+                "tracks": session.track_events(frame.shape),
+                "stats": {"received": session.received, "processed": session.processed, "dropped": session.dropped}
+            })
+
+    receiver = asyncio.create_task(receive_frames())
+    processor = asyncio.create_task(process_frames())
+    try:
+        done, _ = await asyncio.wait([receiver, processor], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            e = None if task.cancelled() else task.exception()
+            if e is not None:
+                traceback.print_exception(type(e), e, e.__traceback__)
+    finally:
+        session.closed = True
+        session.new_frame.set()
+        receiver.cancel()
+        processor.cancel()
+    print(f"Live scan closed: {session.received} frames received, {session.processed} processed, {session.dropped} dropped")
+
 @app.post("/add_to_collection/") #Add card to user's collection
 async def add_to_collection(card_upload: CardUpload): 
     try:
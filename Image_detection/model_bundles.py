@@ -0,0 +1,190 @@
+# VERSIONED MODEL / INDEX BUNDLES AND HOT RELOAD
+# A bundle is a directory MODEL_BUNDLE_DIR/<version>/ with the files one matcher needs:
+#   clip_card_index.faiss, clip_card_index_map.pkl, clip_card_index_ids.pkl            (required)
+#   clip_card_embeddings.f32.npy + clip_card_index_<mode>.faiss                          (COARSE_SEARCH)
+#   best.pt / best.onnx (detector), clip_visual.onnx (SCAN_BACKEND=onnx)               (optional)
+# Optional files a bundle doesn't ship fall back to the unversioned ones, so an index-only bundle keeps the current
+# detector. The version loaded at startup comes from, in order: the MODEL_BUNDLE env var if set, else the ACTIVE
+# file a successful reload wrote, else the unversioned files in Training/training_card_identifier and
+# detector_models, as before (MODEL_BUNDLE_SOURCE says which, the matcher logs it when it loads).
+# build_faiss_index.py writes a bundle when MODEL_BUNDLE_OUTPUT is set.
+# BundleReloader loads a version in a background thread, smoke tests it and only then hands it to swap(), which
+# scan_card does with one assignment. Requests that already took the old matcher finish on it.
+# Under serve_prefork.py the workers pass reload requests to the parent through a ReloadChannel. The parent loads
+# the bundle, smoke tests it in a throwaway fork and rolls the workers, so every worker (and every respawn) forks
+# from the new bundle. A successful swap is written to MODEL_BUNDLE_DIR/ACTIVE, which the next start picks up
+# unless MODEL_BUNDLE is set.
+import os
+import re
+import json
+import time
+import threading
+import multiprocessing
+from collections import deque
+from typing import NamedTuple, Optional
+try:
+    from .card_identity import IDENTIFIER_DIR, project_root
+except ImportError: # running scan_card.py directly
+    from card_identity import IDENTIFIER_DIR, project_root
+
+MODEL_BUNDLE_DIR = os.getenv("MODEL_BUNDLE_DIR", os.path.join(project_root, 'model_bundles'))
+ACTIVE_FILE = os.path.join(MODEL_BUNDLE_DIR, "ACTIVE")  # last version a reload swapped in, used at startup when MODEL_BUNDLE isn't set
+UNVERSIONED = "unversioned"  # version name reported for the files outside MODEL_BUNDLE_DIR
+
+def recorded_bundle(): #Version in ACTIVE_FILE (UNVERSIONED after a rollback), "" when no reload ever succeeded here (or that bundle is gone)
+    try:
+        with open(ACTIVE_FILE) as f:
+            version = f.read().strip()
+    except OSError:
+        return ""
+    if version == UNVERSIONED:
+        return version
+    return version if version and os.path.isdir(os.path.join(MODEL_BUNDLE_DIR, version)) else ""
+
+def record_bundle(version): #Remember version as the one to start with, written atomically
+    os.makedirs(MODEL_BUNDLE_DIR, exist_ok=True)
+    tmp = f"{ACTIVE_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, ACTIVE_FILE)
+    if os.getenv("MODEL_BUNDLE") and os.getenv("MODEL_BUNDLE") != version:
+        print(f"MODEL_BUNDLE={os.getenv('MODEL_BUNDLE')} is set, the next start loads that instead of '{version}'")
+
+def startup_bundle(): #(version, source) to load at startup: an explicit MODEL_BUNDLE wins over the ACTIVE file
+    if os.getenv("MODEL_BUNDLE"):
+        return os.getenv("MODEL_BUNDLE"), "MODEL_BUNDLE env var"
+    recorded = recorded_bundle()
+    if recorded:
+        return recorded, ACTIVE_FILE
+    return "", "default"
+
+MODEL_BUNDLE, MODEL_BUNDLE_SOURCE = startup_bundle()  # version loaded at startup, "" = unversioned files
+
+INDEX_FILE = "clip_card_index.faiss"
+INDEX_MAP_FILE = "clip_card_index_map.pkl"
+IDENTITY_TABLE_FILE = "clip_card_index_ids.pkl"
+DETECTOR_PT_FILE = "best.pt"
+DETECTOR_ONNX_FILE = "best.onnx"
+CLIP_ONNX_FILE = "clip_visual.onnx"
+REQUIRED_FILES = (INDEX_FILE, INDEX_MAP_FILE, IDENTITY_TABLE_FILE)
+
+_VERSION_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")  # a plain directory name, no paths
+
+class SmokeTestFailed(Exception):
+    pass
+
+class BundleFiles(NamedTuple): #Paths of one version, None for optional files the bundle doesn't ship
+    version: str
+    directory: str
+    index: str
+    index_map: str
+    identities: str
+    detector_pt: Optional[str]
+    detector_onnx: Optional[str]
+    clip_onnx: Optional[str]
+
+def _optional(directory, filename):
+    path = os.path.join(directory, filename)
+    return path if os.path.exists(path) else None
+
+def bundle_files(version=MODEL_BUNDLE): #BundleFiles for a version ("" or UNVERSIONED = the old fixed paths), raises if it isn't usable
+    if not version or version == UNVERSIONED:
+        return BundleFiles(UNVERSIONED, IDENTIFIER_DIR, os.path.join(IDENTIFIER_DIR, INDEX_FILE),
+                           os.path.join(IDENTIFIER_DIR, INDEX_MAP_FILE), os.path.join(IDENTIFIER_DIR, IDENTITY_TABLE_FILE),
+                           None, None, None)
+    if not _VERSION_RE.match(version):
+        raise ValueError(f"Invalid bundle version '{version}'")
+    directory = os.path.join(MODEL_BUNDLE_DIR, version)
+    missing = [f for f in REQUIRED_FILES if not os.path.exists(os.path.join(directory, f))]
+    if missing:
+        raise FileNotFoundError(f"Bundle '{version}' in {MODEL_BUNDLE_DIR} is missing {', '.join(missing)}")
+    return BundleFiles(version, directory, os.path.join(directory, INDEX_FILE), os.path.join(directory, INDEX_MAP_FILE),
+                       os.path.join(directory, IDENTITY_TABLE_FILE), _optional(directory, DETECTOR_PT_FILE),
+                       _optional(directory, DETECTOR_ONNX_FILE), _optional(directory, CLIP_ONNX_FILE))
+
+def list_bundles(): #Versions in MODEL_BUNDLE_DIR that have the required files, sorted
+    if not os.path.isdir(MODEL_BUNDLE_DIR):
+        return []
+    return sorted(name for name in os.listdir(MODEL_BUNDLE_DIR)
+                  if _VERSION_RE.match(name) and all(os.path.exists(os.path.join(MODEL_BUNDLE_DIR, name, f)) for f in REQUIRED_FILES))
+
+class BundleReloader: #One reload at a time: load -> smoke test -> swap in a background thread, outcomes kept for /admin/models
+    def __init__(self, history=10):
+        self._lock = threading.Lock()
+        self.current = None  # the reload in progress, if any
+        self.history = deque(maxlen=history)
+
+    def start(self, version, load, smoke_test, swap): #Begin reloading version, False if another reload is still running
+        # load(version) -> bundle, smoke_test(bundle) -> details dict (raises SmokeTestFailed), swap(bundle)
+        with self._lock:
+            if self.current is not None:
+                return False
+            self.current = {"version": version, "state": "loading", "started": time.time()}
+        threading.Thread(target=self._run, args=(version, load, smoke_test, swap), name=f"bundle-reload-{version}", daemon=True).start()
+        return True
+
+    def _run(self, version, load, smoke_test, swap):
+        outcome = self.current
+        start = time.perf_counter()
+        try:
+            bundle = load(version)
+            outcome["state"] = "smoke_test"
+            outcome["load_seconds"] = round(time.perf_counter() - start, 2)
+            outcome["smoke_test"] = smoke_test(bundle)
+            swap(bundle)
+            record_bundle(version)
+            outcome["state"] = "active"
+            print(f"Model bundle '{version}' is active ({time.perf_counter() - start:.1f}s)")
+        except Exception as e: # the old bundle keeps serving
+            outcome["state"] = "failed"
+            outcome["error"] = f"{type(e).__name__}: {e}"
+            print(f"Reloading model bundle '{version}' failed, keeping the current one: {outcome['error']}")
+        outcome["seconds"] = round(time.perf_counter() - start, 2)
+        with self._lock:
+            self.history.appendleft(outcome)
+            self.current = None
+
+    def status(self):
+        with self._lock:
+            return {"reloading": dict(self.current) if self.current else None, "recent": list(self.history)}
+
+class ReloadChannel: #Pre-fork workers queue a reload for the parent and read its progress, shared memory made before forking
+    STATUS_BYTES = 16384
+
+    def __init__(self):
+        self._lock = multiprocessing.Lock()
+        self._requested = multiprocessing.Array('c', 128, lock=False)  # version a worker asked for, b"" = none
+        self._busy = multiprocessing.Value('b', 0, lock=False)  # parent is working on a request
+        self._status = multiprocessing.Array('c', self.STATUS_BYTES, lock=False)  # JSON, same shape as BundleReloader.status()
+
+    def request(self, version): #Worker: ask the parent to reload version, False if a reload is already queued or running
+        with self._lock:
+            if self._requested.value or self._busy.value:
+                return False
+            self._requested.value = version.encode()
+        return True
+
+    def take_request(self): #Parent: the queued version (now marked busy), or None
+        with self._lock:
+            version = self._requested.value.decode()
+            if not version:
+                return None
+            self._requested.value = b""
+            self._busy.value = 1
+        return version
+
+    def publish(self, reloading, recent, done=False): #Parent: progress for the workers' /admin/models, done=True accepts the next request
+        recent = list(recent)
+        data = json.dumps({"reloading": reloading, "recent": recent}).encode()
+        while len(data) >= self.STATUS_BYTES and recent: # oldest outcomes go first
+            recent.pop()
+            data = json.dumps({"reloading": reloading, "recent": recent}).encode()
+        with self._lock:
+            self._status.value = data
+            if done:
+                self._busy.value = 0
+
+    def status(self):
+        with self._lock:
+            data = self._status.value
+        return json.loads(data) if data else {"reloading": None, "recent": []}
@@ -0,0 +1,138 @@
+# FUZZY CARD NAME LOOKUP FOR THE OCR SANITY CHECK
+# The matcher used to require every OCR word to appear verbatim in a filename, so one misread letter ("Pikachv")
+# failed the check and sent it to a 1000-wide FAISS search that still found nothing. Here the distinct words of
+# every catalog name go into a trigram index (verified by edit distance), and each word points at the names that contain it.
+# A query looks up every OCR word as a substring of a catalog word (the old rule) or within a small edit distance,
+# intersects the names, and returns the FAISS rows of every name tied for the fewest edits. It is built once in initialize_clip_matcher from the identity table (same rows as the
+# index map), and a lookup takes microseconds.
+import unicodedata
+import numpy as np
+
+MIN_WORD_LENGTH = 2  # shorter OCR fragments are ignored, they match almost anything
+
+def normalize_name(text): #Lowercase, accents stripped, anything that isn't a letter or digit becomes a space
+    nfd = unicodedata.normalize('NFD', text)
+    without_accents = ''.join(c for c in nfd if unicodedata.category(c) != 'Mn').lower()
+    return ''.join(c if c.isalnum() else ' ' for c in without_accents)
+
+def max_distance(word): #Edits allowed for an OCR word: none for very short words, then one per 4 letters
+    return 0 if len(word) <= 3 else max(1, len(word) // 4)
+
+def edit_distance(a, b, limit=None): #Levenshtein distance, stops early once every cell of a row is over limit
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramWords: #Vocabulary words by trigram, finds every word within k edits by verifying only words that share enough trigrams
+    # One edit changes at most 3 trigrams, so a word within k edits of the query shares at least (query trigrams - 3k)
+    def __init__(self, words):
+        self.words = list(words)
+        self.lengths = [len(w) for w in self.words]
+        self.grams = {}
+        for word_id, word in enumerate(self.words):
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, []).append(word_id)
+
+    def search(self, word, max_dist): #[(distance, word), ...] within max_dist
+        query = trigrams(word)
+        needed = max(1, len(query) - 3 * max_dist)
+        shared = {}
+        for gram in query:
+            for word_id in self.grams.get(gram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        found = []
+        for word_id, count in shared.items():
+            if count >= needed and abs(self.lengths[word_id] - len(word)) <= max_dist:
+                d = edit_distance(word, self.words[word_id], limit=max_dist)
+                if d <= max_dist:
+                    found.append((d, self.words[word_id]))
+        return found
+
+    def containing(self, word): #Vocabulary words that contain word as a substring ("pika" -> pikachu), the old filename check's rule
+        if len(word) < 3: # no inner trigram to narrow it down
+            return []
+        shared = None
+        for i in range(len(word) - 2):
+            ids = set(self.grams.get(word[i:i + 3], ()))
+            shared = ids if shared is None else shared & ids
+            if not shared:
+                return []
+        return [self.words[word_id] for word_id in shared if word in self.words[word_id]]
+
+class NameIndex:
+    def __init__(self, display_names):
+        self.names = []  # distinct normalized names
+        self.name_words = []  # word tuple per name
+        name_ids = {}
+        rows = []
+        for row, display_name in enumerate(display_names):
+            normalized = ' '.join(normalize_name(display_name or '').split())
+            if not normalized:
+                continue
+            name_id = name_ids.get(normalized)
+            if name_id is None:
+                name_id = name_ids[normalized] = len(self.names)
+                self.names.append(normalized)
+                self.name_words.append(tuple(normalized.split()))
+                rows.append([])
+            rows[name_id].append(row)
+        self.rows = [np.array(r, dtype=np.int64) for r in rows]
+
+        self.postings = {}  # word -> set of name ids containing it
+        for name_id, words in enumerate(self.name_words):
+            for word in words:
+                self.postings.setdefault(word, set()).add(name_id)
+        self.vocabulary = TrigramWords(self.postings)
+
+    def distances(self, ocr_text): #name id -> summed edit distance for every name that (nearly) contains all OCR words, {} if none
+        words = [w for w in normalize_name(ocr_text or '').split() if len(w) >= MIN_WORD_LENGTH]
+        if not words:
+            return {}
+
+        candidates = None  # name id -> summed edit distance over the OCR words
+        for word in words:
+            hits = {}
+            # names containing the word as read match outright (like the old substring check), only misreads pay for the fuzzy search
+            matches = [(0, vocab_word) for vocab_word in self.vocabulary.containing(word)]
+            if word in self.postings:
+                matches.append((0, word))
+            else:
+                matches += self.vocabulary.search(word, max_distance(word))
+            for d, vocab_word in matches:
+                for name_id in self.postings[vocab_word]:
+                    hits[name_id] = min(hits.get(name_id, d), d)
+            if candidates is None:
+                candidates = hits
+            else: # every OCR word has to be (nearly) in the name
+                candidates = {name_id: candidates[name_id] + d for name_id, d in hits.items() if name_id in candidates}
+            if not candidates:
+                return {}
+        return candidates
+
+    def lookup(self, ocr_text, limit=5): #Closest names for noisy OCR text -> [(name, total edits, row ids), ...], best first
+        candidates = self.distances(ocr_text)
+        # Fewer edits first, then names with fewer words ("Pikachu" before "Pikachu V" for OCR "Pikachv")
+        ranked = sorted(candidates.items(), key=lambda item: (item[1], len(self.name_words[item[0]])))
+        return [(self.names[name_id], distance, self.rows[name_id]) for name_id, distance in ranked[:limit]]
+
+    def candidate_rows(self, ocr_text): #FAISS rows of every name with the fewest edits, or None
+        # No limit: OCR "Pikachu" matches Pikachu V, Surfing Pikachu, Dark Pikachu... all at 0 edits, and CLIP decides between them
+        candidates = self.distances(ocr_text)
+        if not candidates:
+            return None
+        best = min(candidates.values())
+        return np.concatenate([self.rows[name_id] for name_id, distance in candidates.items() if distance == best])
@@ -0,0 +1,94 @@
+# ONNX RUNTIME INFERENCE FOR THE YOLO DETECTOR AND THE CLIP IMAGE ENCODER (CPU only)
+# Graphs are produced by Training/export_onnx.py. Used by scan_card.py when SCAN_BACKEND=onnx.
+import os
+import cv2
+import numpy as np
+
+project_root = os.path.join(os.path.dirname(__file__), '..')
+DETECTOR_ONNX_PATH = os.getenv("DETECTOR_ONNX_PATH", os.path.join(project_root, 'detector_models', 'pokemon_detector4', 'weights', 'best.onnx'))
+CLIP_ONNX_PATH = os.getenv("CLIP_ONNX_PATH", os.path.join(project_root, 'Training', 'training_card_identifier', 'clip_visual.onnx'))
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+ONNX_INTRA_OP_THREADS = _env_int("ONNX_INTRA_OP_THREADS")  # threads used inside one operator (None = onnxruntime default)
+ONNX_INTER_OP_THREADS = _env_int("ONNX_INTER_OP_THREADS")  # threads used to run independent operators in parallel
+
+def make_session(model_path, intra_op_threads=ONNX_INTRA_OP_THREADS, inter_op_threads=ONNX_INTER_OP_THREADS):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+def letterbox(image, size=640, pad_value=114): #Same resize + pad YOLO does before inference, returns (padded, scale, (left, top))
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else image
+    dw, dh = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(pad_value, pad_value, pad_value))
+    return padded, scale, (left, top)
+
+class OnnxDetector: #Drop-in for the ultralytics YOLO model, returns [(xyxy, confidence), ...] per image sorted by confidence
+    def __init__(self, model_path=DETECTOR_ONNX_PATH, imgsz=640, iou_threshold=0.7, max_det=300):
+        self.session = make_session(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def preprocess(self, images): #BGR uint8 images -> NCHW float32 RGB batch
+        batch = np.empty((len(images), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        metas = []
+        for i, image in enumerate(images):
+            padded, scale, pad = letterbox(image, self.imgsz)
+            batch[i] = padded[:, :, ::-1].transpose(2, 0, 1) / 255.0
+            metas.append((scale, pad, image.shape[:2]))
+        return batch, metas
+
+    def postprocess(self, output, meta, conf): #(4 + classes, anchors) raw head output -> boxes in original pixel coords
+        scale, (left, top), (h, w) = meta
+        preds = output.T
+        scores = preds[:, 4:].max(axis=1)
+        keep = scores >= conf
+        preds, scores = preds[keep], scores[keep]
+        if len(scores) == 0:
+            return []
+
+        cx, cy, bw, bh = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - left) / scale).clip(0, w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - top) / scale).clip(0, h)
+
+        xywh = [[float(b[0]), float(b[1]), float(b[2] - b[0]), float(b[3] - b[1])] for b in boxes]
+        kept = cv2.dnn.NMSBoxes(xywh, scores.astype(float).tolist(), conf, self.iou_threshold)
+        kept = np.asarray(kept, dtype=np.int64).reshape(-1) # NMSBoxes returns () when it drops everything (it keeps scores > conf, not >=)
+        if len(kept) == 0:
+            return []
+        kept = kept[np.argsort(-scores[kept])][:self.max_det]
+        return [(boxes[i].astype(np.float32), float(scores[i])) for i in kept]
+
+    def detect_batch(self, images, conf=0.25):
+        batch, metas = self.preprocess(images)
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [self.postprocess(outputs[i], metas[i], conf) for i in range(len(images))]
+
+class OnnxClipEncoder: #CLIP visual tower, takes the same preprocessed (N, 3, 224, 224) tensor the torch path gets
+    def __init__(self, model_path=CLIP_ONNX_PATH):
+        self.session = make_session(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def encode(self, input_array): #Returns L2-normalized float32 embeddings
+        emb = self.session.run(None, {self.input_name: np.ascontiguousarray(input_array, dtype=np.float32)})[0]
+        emb = emb / np.linalg.norm(emb, axis=-1, keepdims=True)
+        return emb.astype('float32')
@@ -0,0 +1,52 @@
+# ON-DEMAND VISUALIZATION FOR DETECTION AND OCR RESULTS
+# getbounding and get_text_from_image only return structured results (boxes, confidences, OCR text boxes), so the
+# normal scan path never copies or draws on a full frame. Annotated images are rendered here, only by callers that
+# actually show or return them: /scan_card_extra_info/, the multi-card detection_image and the debug windows.
+import cv2
+
+def line_sizes(image): #Rectangle / text / corner sizes scaled to the image so boxes stay visible on big photos
+    base_dim = min(image.shape[:2])
+    rect_thickness = max(2, int(round(base_dim * 0.005)))
+    text_thickness = max(1, int(round(base_dim * 0.003)))
+    corner_radius = max(3, int(round(base_dim * 0.002)))
+    return rect_thickness, text_thickness, corner_radius
+
+def card_color(idx): #Different color for each card in multi-card mode
+    return ((idx * 80) % 255, (idx * 120 + 100) % 255, (idx * 160 + 50) % 255)
+
+def draw_detections(image, detections, multi_card=False): #Copy of image with [(xyxy, confidence), ...] drawn on it
+    out = image.copy()
+    if len(detections) == 0:
+        cv2.putText(out, 'No card detected', (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return out
+
+    rect_thickness, text_thickness, corner_radius = line_sizes(image)
+    if multi_card:
+        for idx, ((x1, y1, x2, y2), confidence) in enumerate(detections):
+            color = card_color(idx)
+            cv2.rectangle(out, (int(x1), int(y1)), (int(x2), int(y2)), color, rect_thickness)
+            cv2.putText(out, f'Card {idx+1} ({confidence:.1%})', (int(x1), int(y1) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, text_thickness)
+        return out
+
+    (x1, y1, x2, y2), confidence = detections[0] # single card mode only uses the best detection
+    cv2.rectangle(out, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), rect_thickness)
+    cv2.circle(out, (int(x1), int(y1)), corner_radius, (0, 0, 255), -1)  # Top-left
+    cv2.circle(out, (int(x2), int(y2)), corner_radius, (255, 0, 0), -1)  # Bottom-right
+    cv2.putText(out, f'Pokemon Card ({confidence:.1%})', (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), text_thickness)
+    return out
+
+def draw_ocr(card_image, ocr_results): #Copy of the card with EasyOCR's (bbox, text, confidence) results drawn on it
+    out = card_image.copy()
+    for bbox, text, confidence in ocr_results:
+        top_left = tuple(map(int, bbox[0]))
+        bottom_right = tuple(map(int, bbox[2]))
+        cv2.rectangle(out, top_left, bottom_right, (0, 255, 0), 2)
+        cv2.putText(out, text, (top_left[0], top_left[1] - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return out
+
+def show(title, image): #Blocking debug window
+    cv2.imshow(title, image)
+    print("\nPress any key to close the window...")
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
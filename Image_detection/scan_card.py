@@ -1,7 +1,6 @@
 # MAIN MODULE FOR POKEMON CARD SCANNER USING YOLO + CLIP + FAISS + BACK BACK END FOR API
 # ALSO RUN BY ITESLF JUST FOR TESTING PURPOSES
 import cv2
-import easyocr
 import requests
 import urllib.request
 import os
@@ -11,15 +10,71 @@ from PIL import Image as PILImage
 import re
 import ssl
 import json
-import torch
-import unicodedata
-from ultralytics import YOLO
+import threading
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from . import local_catalog
+    from .card_identity import load_identity_table, IDENTITY_TABLE_PATH
+    from . import onnx_backend
+    from .card_tracker import CardTracker, crop_box
+    from .set_filter import SetFilter, SET_FILTER, SET_FILTER_MIN_SIMILARITY, read_collector_number, parse_collector_number, search_rows
+    from .name_index import NameIndex
+    from .coarse_search import TwoStageIndex, COARSE_SEARCH
+    from .model_bundles import bundle_files, BundleReloader, SmokeTestFailed, MODEL_BUNDLE, MODEL_BUNDLE_SOURCE, UNVERSIONED
+    from .startup_profile import lazy_import, timed
+    from . import render
+    from . import clip_preprocess
+    from .clip_preprocess import CLIP_PREPROCESS
+except ImportError: # running this file directly for testing
+    import local_catalog
+    from card_identity import load_identity_table, IDENTITY_TABLE_PATH
+    import onnx_backend
+    from card_tracker import CardTracker, crop_box
+    from set_filter import SetFilter, SET_FILTER, SET_FILTER_MIN_SIMILARITY, read_collector_number, parse_collector_number, search_rows
+    from name_index import NameIndex
+    from coarse_search import TwoStageIndex, COARSE_SEARCH
+    from model_bundles import bundle_files, BundleReloader, SmokeTestFailed, MODEL_BUNDLE, MODEL_BUNDLE_SOURCE, UNVERSIONED
+    from startup_profile import lazy_import, timed
+    import render
+    import clip_preprocess
+    from clip_preprocess import CLIP_PREPROCESS
+# torch, ultralytics, easyocr, clip, faiss and clip_encoder (torch) are imported on first use through lazy_import,
+# so importing this module (and main.py) stays cheap and /health answers while the models warm up
+clip_encoder = None
+CLIP_ENCODER_MODULE = f"{__package__}.clip_encoder" if __package__ else "clip_encoder"
 ssl._create_default_https_context = ssl._create_unverified_context #Mac was throwing a hissy fit
 
-_clip_model = None
-_clip_preprocess = None
-_faiss_index = None
-_faiss_image_paths = None
+_matcher = None  # MatcherState of the active model bundle, replaced as a whole by swap_bundle
+_matcher_lock = threading.Lock()
+_bundle_reloader = BundleReloader()
+_reload_channel = None  # ReloadChannel to the pre-fork parent, which reloads and rolls every worker (serve_prefork.py)
+_detector = None
+_detector_path = None  # weights of the active bundle's detector, None = DETECTOR_MODEL_PATH / DETECTOR_ONNX_PATH
+_detector_lock = threading.Lock()
+_ocr_reader = None
+_ocr_reader_lock = threading.Lock()
+
+LIVE_DETECT_EVERY = int(os.getenv("LIVE_DETECT_EVERY", "5"))  # live mode runs the detector on every Nth frame
+FAISS_MMAP = os.getenv("FAISS_MMAP", "0") == "1"  # map the index file instead of reading it, pages are shared between processes
+SCAN_BACKEND = os.getenv("SCAN_BACKEND", "torch").lower()  # torch (ultralytics + clip) or onnx (onnxruntime, see Training/export_onnx.py)
+DETECTOR_MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'detector_models/pokemon_detector4/weights/best.pt')
+
+# Tiled detection for binder pages / table spreads (multi_card only), see detect_cards_tiled
+DETECT_TILE_SIZE = int(os.getenv("DETECT_TILE_SIZE", "1280"))  # tile side in source pixels, each tile is letterboxed to 640 by the detector
+DETECT_TILE_OVERLAP = float(os.getenv("DETECT_TILE_OVERLAP", "0.2"))  # fraction of a tile shared with its neighbour
+TILE_MIN_SIDE = int(os.getenv("TILE_MIN_SIDE", "2000"))  # auto mode only tiles frames (or their hires copy) whose long side is at least this
+TILE_MIN_CARDS = int(os.getenv("TILE_MIN_CARDS", "6"))  # ...and that show at least this many cards in the full-frame pass
+TILE_SMALL_CARD = float(os.getenv("TILE_SMALL_CARD", "0.2"))  # ...or whose cards are shorter than this fraction of the frame
+TILE_NMS_IOU = 0.5
+BATCH_OCR = os.getenv("BATCH_OCR", "1") == "1"  # multi-card scans OCR every card header in one batched EasyOCR call
+OCR_HEADER_FRACTION = 0.3  # batched OCR only reads the top of each card, the name and energy checks look at the top 25%
+OCR_HEADER_WIDTH = 640  # every header is resized to the same shape so EasyOCR can stack them
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "16"))  # text boxes per recognizer forward pass
+OCR_NAME_MARGIN = float(os.getenv("OCR_NAME_MARGIN", "0.05"))  # a name match from outside the top_k may replace CLIP's top-1 only this close to it
+SMOKE_TEST_MIN_SIMILARITY = float(os.getenv("SMOKE_TEST_MIN_SIMILARITY", "0.9"))  # a new bundle must find a reference card as itself at least this well
 
 def take_picture(): #take picture from the webcam
     cap = cv2.VideoCapture(0)
@@ -48,65 +103,140 @@ def take_picture(): #take picture from the webcam
     cv2.destroyAllWindows()
     return None
 
-def getbounding(image_input=None, display=True, multi_card=False, conf_threshold=0.7): #detect pokemon card in image using
-    
-    if YOLO is None:
-        print("YOLO not available!")
-        return None
-    
-    project_root = os.path.join(os.path.dirname(__file__), '..')
-    model_path = os.path.join(project_root, 'detector_models/pokemon_detector4/weights/best.pt')
+def load_detector(path=None): #Card detector from a weights file, None = the default weights for SCAN_BACKEND
+    if SCAN_BACKEND == "onnx":
+        return onnx_backend.OnnxDetector(path) if path else onnx_backend.OnnxDetector()
+    return lazy_import("ultralytics").YOLO(path or DETECTOR_MODEL_PATH)
+
+def detector_weights(files): #The bundle's own detector for this backend, or None when it keeps the default one
+    return files.detector_onnx if SCAN_BACKEND == "onnx" else files.detector_pt
+
+def get_detector(): #Load the card detector once per process instead of on every getbounding call
+    global _detector, _detector_path
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                if _detector_path is None and MODEL_BUNDLE:
+                    _detector_path = detector_weights(bundle_files(MODEL_BUNDLE))
+                with timed("model", "detector"):
+                    _detector = load_detector(_detector_path)
+    return _detector
+
+def get_ocr_reader(): #One EasyOCR reader per process, building it loads the CRAFT + recognizer weights
+    global _ocr_reader
+    if _ocr_reader is None:
+        with _ocr_reader_lock:
+            if _ocr_reader is None:
+                easyocr = lazy_import("easyocr")
+                with timed("model", "easyocr"):
+                    _ocr_reader = easyocr.Reader(['en'], gpu=False)
+    return _ocr_reader
+
+def detect_cards(images, conf=0.25): #Run the detector on a list of BGR images -> [(xyxy, confidence), ...] per image, highest confidence first
+    return run_detector(get_detector(), images, conf)
+
+def run_detector(detector, images, conf=0.25): #detect_cards with a given detector (bundle smoke tests run one that isn't active yet)
+    if SCAN_BACKEND == "onnx":
+        return detector.detect_batch(images, conf=conf)
+    with _detector_lock: # ultralytics predictors aren't safe to share between threads
+        results = detector(images, conf=conf, verbose=False)
+    return [[(box.xyxy[0].cpu().numpy(), float(box.conf[0])) for box in result.boxes] for result in results]
+
+def tile_grid(h, w, tile_size=DETECT_TILE_SIZE, overlap=DETECT_TILE_OVERLAP): #Top-left corners of overlapping tiles covering an h x w frame
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size) # last tile sits flush with the edge
+        return positions
+
+    return [(x, y) for y in starts(h) for x in starts(w)]
+
+def should_tile(detections, frame_height): #Auto mode: lots of cards, or small ones (or none found at all). Frame size is checked separately
+    if len(detections) >= TILE_MIN_CARDS:
+        return True
+    heights = [(xyxy[3] - xyxy[1]) / frame_height for xyxy, _ in detections]
+    return not heights or float(np.median(heights)) < TILE_SMALL_CARD
+
+def detect_cards_tiled(image, conf=0.25, global_detections=None, tile_size=DETECT_TILE_SIZE, overlap=DETECT_TILE_OVERLAP): #Detect on overlapping tiles in one batch and merge with NMS -> [(xyxy, confidence), ...]
+    h, w = image.shape[:2]
+    corners = tile_grid(h, w, tile_size, overlap)
+    tiles = [image[y:y + tile_size, x:x + tile_size] for x, y in corners]
+    per_tile = detect_cards(tiles, conf=conf)
+
+    margin = 4
+    boxes, scores = [], []
+    for (x0, y0), tile, detections in zip(corners, tiles, per_tile):
+        th, tw = tile.shape[:2]
+        for (x1, y1, x2, y2), confidence in detections:
+            # A box touching an inner tile edge is a cut-off card, the neighbouring tile (or the full-frame pass) sees it whole
+            if (x0 > 0 and x1 <= margin) or (y0 > 0 and y1 <= margin) or (x0 + tw < w and x2 >= tw - margin) or (y0 + th < h and y2 >= th - margin):
+                continue
+            boxes.append([x1 + x0, y1 + y0, x2 + x0, y2 + y0])
+            scores.append(confidence)
+
+    for xyxy, confidence in global_detections or []: # full-frame boxes catch cards bigger than a tile
+        boxes.append(list(xyxy))
+        scores.append(confidence)
+
+    if not boxes:
+        return []
+    xywh = [[float(b[0]), float(b[1]), float(b[2] - b[0]), float(b[3] - b[1])] for b in boxes]
+    kept = np.array(cv2.dnn.NMSBoxes(xywh, [float(c) for c in scores], conf, TILE_NMS_IOU)).reshape(-1)
+    kept = sorted(kept, key=lambda i: -scores[i])
+    print(f"Tiled detection: {len(tiles)} tiles of {tile_size}px, {len(boxes)} boxes -> {len(kept)} cards")
+    return [(np.array(boxes[i], dtype=np.float32), float(scores[i])) for i in kept]
+
+def getbounding(image_input=None, display=True, multi_card=False, conf_threshold=0.7, tiled=None, hires=None): #detect pokemon card in image using
+    # Returns (model, bbox_norm or bbox_list, detections) with detections = [(xyxy, confidence), ...] in image_input
+    # pixels. Nothing is drawn here, render.draw_detections(image, detections) makes the annotated copy when wanted.
+    # tiled: None = automatic (see should_tile), True/False to force. hires: optional higher resolution copy of the
+    # same frame (array, or a callable returning one) to cut the tiles from, boxes still come back relative to image_input
     
     try:
-        model = YOLO(model_path)
+        model = get_detector()
         if image_input is not None: # Check if input is a file path or numpy array
             
             if isinstance(image_input, str):
                 print(f"\nDetecting Pokemon card in: {image_input}")
                 image = cv2.imread(image_input)
-                source_for_yolo = image_input
                 
             else: # It's a numpy array (frame from camera)
                 print(f"\nDetecting Pokemon card in captured frame...")
                 image = image_input
-                source_for_yolo = image_input
             
             # Use appropriate confidence threshold
             detection_conf = conf_threshold if multi_card else 0.25
-            results = model(source_for_yolo, conf=detection_conf, verbose=False)
-            result = results[0]  # Get the first result
+            detections = detect_cards([image], conf=detection_conf)[0]
+
+            if multi_card and (tiled or (tiled is None and should_tile(detections, image.shape[0]))):
+                source = hires() if callable(hires) else hires # only decoded once we know we might tile
+                source = image if source is None else source
+                if tiled or max(source.shape[:2]) >= TILE_MIN_SIDE:
+                    scale = source.shape[1] / image.shape[1]
+                    detections = detect_cards_tiled(source, conf=detection_conf, global_detections=[(xyxy * scale, c) for xyxy, c in detections])
+                    detections = [(xyxy / scale, c) for xyxy, c in detections]
 
             # Check if any detections were made
-            if len(result.boxes) == 0:
+            if len(detections) == 0:
                 print("No Pokemon card detected in the image!")
                 if display:
-                    cv2.putText(image, 'No card detected', (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    cv2.imshow('Card Detection', image)
-                    print("Press any key to close...")
-                    cv2.waitKey(0)
-                    cv2.destroyAllWindows()
+                    render.show('Card Detection', render.draw_detections(image, detections))
                 
                 if multi_card:
-                    return model, [], image
-                return model, None, image
+                    return model, [], detections
+                return model, None, detections
             
             h, w = image.shape[:2]
-            bbox_image = image.copy()
-            # Compute drawing thicknesses scaled to image size so boxes are visible
-            # Use a small proportion of the smaller image dimension with sensible minima
-            base_dim = min(h, w)
-            rect_thickness = max(2, int(round(base_dim * 0.005)))
-            text_thickness = max(1, int(round(base_dim * 0.003)))
-            corner_radius = max(3, int(round(base_dim * 0.002)))
             
             if multi_card:
                 # Process ALL detected cards above threshold
                 bbox_list = []
-                print(f"\nDetected {len(result.boxes)} card(s) with confidence >= {conf_threshold:.0%}")
+                print(f"\nDetected {len(detections)} card(s) with confidence >= {conf_threshold:.0%}")
                 
-                for idx, box in enumerate(result.boxes):
-                    bbox_xyxy = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2] in pixels
-                    confidence = box.conf[0].cpu().numpy()
+                for idx, (bbox_xyxy, confidence) in enumerate(detections): # bbox_xyxy is [x1, y1, x2, y2] in pixels
                     
                     # Convert to normalized coordinates
                     x1, y1, x2, y2 = bbox_xyxy
@@ -118,52 +248,25 @@ def getbounding(image_input=None, display=True, multi_card=False, conf_threshold
                         'index': idx
                     })
                     
-                    # Draw bounding box with different colors for each card
-                    color = ((idx * 80) % 255, (idx * 120 + 100) % 255, (idx * 160 + 50) % 255)
-                    cv2.rectangle(bbox_image, (int(x1), int(y1)), (int(x2), int(y2)), color, rect_thickness)
-                    
-                    # Add label with card number and confidence
-                    text = f'Card {idx+1} ({confidence:.1%})'
-                    cv2.putText(bbox_image, text, (int(x1), int(y1) - 10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, text_thickness)
-                    
                     print(f"  Card {idx+1}: Confidence {confidence:.1%} at [{bbox_norm[0]:.3f}, {bbox_norm[1]:.3f}, {bbox_norm[2]:.3f}, {bbox_norm[3]:.3f}]")
                 
                 if display:
-                    cv2.imshow('YOLO Multi-Card Detection', bbox_image)
-                    print("\nPress any key to close the window...")
-                    cv2.waitKey(0)
-                    cv2.destroyAllWindows()
+                    render.show('YOLO Multi-Card Detection', render.draw_detections(image, detections, multi_card=True))
                 
-                return model, bbox_list, bbox_image
+                return model, bbox_list, detections
             
             else:
                 # Single card mode - return only the highest confidence detection
-                box = result.boxes[0] 
-                bbox_xyxy = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2] in pixels
-                confidence = box.conf[0].cpu().numpy()
+                bbox_xyxy, confidence = detections[0]  # [x1, y1, x2, y2] in pixels
                 
                 # Convert to normalized coordinates [x1, y1, x2, y2]
                 x1, y1, x2, y2 = bbox_xyxy
                 bbox_norm = [x1/w, y1/h, x2/w, y2/h]
                 
-                # Draw bounding box on image copy for visualization
-                cv2.rectangle(bbox_image, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), rect_thickness)
-                cv2.circle(bbox_image, (int(x1), int(y1)), corner_radius, (0, 0, 255), -1)  # Top-left
-                cv2.circle(bbox_image, (int(x2), int(y2)), corner_radius, (255, 0, 0), -1)  # Bottom-right
-                
-                # Add text
-                text = f'Pokemon Card ({confidence:.1%})'
-                cv2.putText(bbox_image, text, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), text_thickness)
-                
                 if display:
-                    # Display
-                    cv2.imshow('YOLO Card Detection', bbox_image)
-                    print("\nPress any key to close the window...")
-                    cv2.waitKey(0)
-                    cv2.destroyAllWindows()
+                    render.show('YOLO Card Detection', render.draw_detections(image, detections))
                 
-                return model, bbox_norm, bbox_image
+                return model, bbox_norm, detections
         
         return model
         
@@ -209,15 +312,7 @@ def crop_out_card(image_input, bbox_norm, save_path=None, debug=False): #When gi
         traceback.print_exc()
         return None
 
-def get_text_from_image(image, debug=False, getmore=False, show_window=True): #uses ocr to extract text from card images
-    reader = easyocr.Reader(['en'], gpu=False)
-    reader.whitelist = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789/-"
-    
-    h, w = image.shape[:2]
-    if debug:
-        debug_image = image.copy()
-        
-    results = reader.readtext(image)
+def parse_card_text(results, h, w, debug=False, getmore=False): #EasyOCR (bbox, text, confidence) results in card pixels (h x w) -> card_info dict
     card_info = {
         'name': None,
         'hp': None,
@@ -244,8 +339,6 @@ def get_text_from_image(image, debug=False, getmore=False, show_window=True): #u
 
         if debug:
             print(f"Text: '{text}' | Confidence: {confidence:.2f} | Y-pos: {y_position:.2f} | X-pos: {x_position:.2f}")
-            cv2.rectangle(debug_image, top_left, bottom_right, (0, 255, 0), 2)
-            cv2.putText(debug_image, text, (top_left[0], top_left[1] - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
         
         # Check for "ENERGY" text only in top 20%
         potential_energy_matches = ["ENERGY", "ENFRGY", "ENERBY", "ENERG", "ENCRGY", "ENERCY"]
@@ -335,32 +428,98 @@ def get_text_from_image(image, debug=False, getmore=False, show_window=True): #u
         print(f"Card Number: {card_info['card_number']}")
         if is_energy_card:
             print("Card Type: ENERGY CARD")
-        
+    
+    return card_info
+
+def get_text_from_image(image, debug=False, getmore=False, show_window=True): #uses ocr to extract text from card images
+    # debug=True also returns EasyOCR's raw (bbox, text, confidence) results instead of drawing on a copy of the card
+    reader = get_ocr_reader()
+    reader.whitelist = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789/-"
+    
+    h, w = image.shape[:2]
+    results = reader.readtext(image)
+    card_info = parse_card_text(results, h, w, debug=debug, getmore=getmore)
+    
+    if debug:
         # Only show window if show_window is True
         if show_window:
-            cv2.imshow('OCR Detection Results', debug_image)
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
+            render.show('OCR Detection Results', render.draw_ocr(image, results))
         
-        return card_info, debug_image
+        return card_info, results # raw OCR boxes, render.draw_ocr(image, results) for the annotated card
     
     return card_info
 
-def initialize_clip_matcher(): #Lazy initialize CLIP, FAISS and mappings. Force CPU and disable SSL checks cause it throws fits at me.
-    global _clip_model, _clip_preprocess, _faiss_index, _faiss_image_paths
+def card_header(card_image, fraction=OCR_HEADER_FRACTION, width=OCR_HEADER_WIDTH): #Top of the card resized to the fixed batch shape
+    h, w = card_image.shape[:2]
+    header = card_image[:max(1, int(h * fraction))]
+    height = int(round(width * 88 / 63 * fraction)) # header of a standard card at this width
+    return cv2.resize(header, (width, height), interpolation=cv2.INTER_AREA if w > width else cv2.INTER_CUBIC)
+
+def get_text_from_images(card_images, batch_size=OCR_BATCH_SIZE): #Batched get_text_from_image for the multi-card path -> [card_info, ...]
+    # One readtext_batched call runs the text detector over all headers at once and the recognizer over all their
+    # text boxes in batches, instead of one detector + recognizer pass per card from competing threads.
+    # Boxes are mapped back to each card's own pixels so parse_card_text sees the same positions as a full read.
+    if not card_images:
+        return []
+    reader = get_ocr_reader()
+    headers = [card_header(card_image) for card_image in card_images]
+    height, width = headers[0].shape[:2]
+    batched = reader.readtext_batched(headers, n_width=width, n_height=height, batch_size=batch_size)
+
+    infos = []
+    for card_image, results in zip(card_images, batched):
+        h, w = card_image.shape[:2]
+        sx, sy = w / width, max(1, int(h * OCR_HEADER_FRACTION)) / height
+        mapped = [([[x * sx, y * sy] for x, y in box], text, confidence) for box, text, confidence in results]
+        infos.append(parse_card_text(mapped, h, w))
+    return infos
 
-    if _clip_model is not None:
+class MatcherState: #CLIP encoder + FAISS index + row tables of one bundle. A search reads all of them from one snapshot
+    def __init__(self, version, clip_model, clip_preprocess, clip_precision, encoder_key, faiss_index, image_paths, identities, name_index, set_filter):
+        self.version = version
+        self.clip_model = clip_model
+        self.clip_preprocess = clip_preprocess
+        self.clip_precision = clip_precision
+        self.encoder_key = encoder_key  # bundles with the same key share the loaded CLIP model
+        self.faiss_index = faiss_index
+        self.image_paths = image_paths
+        self.identities = identities
+        self.name_index = name_index  # fuzzy catalog name -> rows, for the OCR sanity check
+        self.set_filter = set_filter  # printed set total -> candidate rows, only built with SET_FILTER=1
+
+# The matcher used to be these module globals, scan_card._faiss_index etc. still read the active bundle
+_MATCHER_GLOBALS = {"_clip_model": "clip_model", "_clip_preprocess": "clip_preprocess", "_clip_precision": "clip_precision",
+                    "_faiss_index": "faiss_index", "_faiss_image_paths": "image_paths", "_card_identities": "identities",
+                    "_name_index": "name_index", "_set_filter": "set_filter"}
+
+def __getattr__(name):
+    if name in _MATCHER_GLOBALS:
+        return getattr(_matcher, _MATCHER_GLOBALS[name], None)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def initialize_clip_matcher(): #Lazy initialize CLIP, FAISS and mappings from the MODEL_BUNDLE version (see model_bundles.py)
+    global _matcher
+
+    if _matcher is not None:
         return True
 
-    # Paths to index/map built earlier
-    project_root = os.path.join(os.path.dirname(__file__), '..')
-    index_path = os.path.join(project_root, 'Training', 'training_card_identifier', 'clip_card_index.faiss')
-    map_path = os.path.join(project_root, 'Training', 'training_card_identifier', 'clip_card_index_map.pkl')
+    with _matcher_lock:
+        if _matcher is not None:
+            return True
+        try:
+            print(f"Model bundle '{MODEL_BUNDLE or UNVERSIONED}' (from {MODEL_BUNDLE_SOURCE})")
+            _matcher = load_matcher(bundle_files(MODEL_BUNDLE))
+            return True
+        except Exception as e:
+            print(f"Failed to initialize CLIP matcher: {e}")
+            return False
 
-    # Quick existence checks
-    if not os.path.exists(index_path) or not os.path.exists(map_path):
-        print(f"CLIP/FAISS index or map not found. Expected at:\n  {index_path}\n  {map_path}")
-        return False
+def load_clip_encoder(files, reuse=None): #(model, preprocess, precision, encoder key) for a bundle. Force CPU and disable SSL checks cause it throws fits at me.
+    # reuse: a MatcherState whose model is handed back as is when the encoder is the same, a reload doesn't hold two copies
+    global clip_encoder
+    encoder_key = ("onnx", files.clip_onnx or onnx_backend.CLIP_ONNX_PATH) if SCAN_BACKEND == "onnx" else ("torch", "ViT-B/32")
+    if reuse is not None and reuse.encoder_key == encoder_key:
+        return reuse.clip_model, reuse.clip_preprocess, reuse.clip_precision, encoder_key
 
     # Some hacky force fixes
     os.environ.setdefault('PYTORCH_ENABLE_MPS_FALLBACK', '1')
@@ -369,83 +528,252 @@ def initialize_clip_matcher(): #Lazy initialize CLIP, FAISS and mappings. Force
     except Exception:
         pass
 
-    # Import torch/clip/faiss lazily
+    # Load CLIP model (force jit=False)
     try:
-        # Force CPU to avoid MPS cause it causes issues
+        if SCAN_BACKEND == "onnx":
+            # Only the exported visual tower is loaded, preprocessing is clip.load's transform redone without torch
+            with timed("model", "clip"):
+                model = onnx_backend.OnnxClipEncoder(encoder_key[1])
+            print(f"CLIP image encoder running on onnxruntime: {encoder_key[1]}")
+            return model, clip_preprocess.pil_transform, "onnx", encoder_key
+
+        # Import torch/clip lazily (torch backend only), force CPU to avoid MPS cause it causes issues
+        torch = lazy_import("torch")
         torch.set_default_device('cpu')
         torch_device = 'cpu'
+        clip = lazy_import("clip")
+        clip_encoder = lazy_import(CLIP_ENCODER_MODULE)
+
+        cache_model = os.path.expanduser('~/.cache/clip/ViT-B-32.pt')
+        if os.path.exists(cache_model):
+            print(f"Using cached CLIP model: {cache_model}")
+        else:
+            print(f"CLIP model not cached - will download 338MB (may cause OOM on 512MB instances)")
+        with timed("model", "clip"):
+            model, preprocess = clip.load('ViT-B/32', device=torch_device, jit=False, download_root=os.path.expanduser('~/.cache/clip'))
+            model = clip_encoder.drop_text_tower(model)
+            model, precision = clip_encoder.apply_precision(model, clip_encoder.CLIP_PRECISION)
+        print(f"CLIP image encoder running in {precision}")
+        return model, preprocess, precision, encoder_key
+    except Exception as e:
+        print(f"Error loading CLIP model (likely OOM): {e}")
+        raise
+
+def load_matcher(files, reuse=None): #Load one bundle's CLIP encoder, FAISS index and row tables -> MatcherState
+    # Quick existence checks
+    if not os.path.exists(files.index) or not os.path.exists(files.index_map):
+        raise FileNotFoundError(f"CLIP/FAISS index or map not found. Expected at:\n  {files.index}\n  {files.index_map}")
+
+    faiss = lazy_import("faiss")
+    import pickle
+    clip_model, preprocess, precision, encoder_key = load_clip_encoder(files, reuse)
+
+    # Load FAISS index and mapping
+    with timed("model", "faiss_index"):
+        # COARSE_SEARCH: shortlist from a PCA / binary index, exact rerank from the memory-mapped embeddings
+        faiss_index = TwoStageIndex.load(files.directory) if COARSE_SEARCH else None
+        if faiss_index is not None:
+            print(f"Two-stage search: {COARSE_SEARCH} shortlist of {faiss_index.shortlist}, exact rerank")
+        else:
+            faiss_index = faiss.read_index(files.index, faiss.IO_FLAG_MMAP if FAISS_MMAP else 0)
+        with open(files.index_map, 'rb') as f:
+            image_paths = pickle.load(f)
+
+        # Row id -> card id/set/number/name/path, so matches never need filename parsing
+        identities = load_identity_table(files.identities, map_path=files.index_map)
+    with timed("model", "name_index"):
+        name_index = NameIndex(identities['display_name'])
+    if len(identities['card_id']) != faiss_index.ntotal:
+        print(f"WARNING: identity table has {len(identities['card_id'])} rows but index has {faiss_index.ntotal} vectors")
+
+    set_filter = None
+    if SET_FILTER:
+        set_totals = local_catalog.get_set_totals() if local_catalog.is_available() else {}
+        if set_totals:
+            set_filter = SetFilter(identities, set_totals)
+            print(f"Set filter: {len(set_totals)} sets with printed totals")
+        else:
+            print("SET_FILTER=1 but the local catalog has no set totals (rebuild it with Database/build_local_catalog.py), searching everything")
+
+    print(f"CLIP + FAISS initialized: bundle '{files.version}', indexed {faiss_index.ntotal} cards")
+    return MatcherState(files.version, clip_model, preprocess, precision, encoder_key, faiss_index, image_paths, identities, name_index, set_filter)
+
+def current_matcher(): #The active MatcherState (loaded on first use), or None. Take it once and pass it along so one request sees one bundle
+    if _matcher is None and not initialize_clip_matcher():
+        return None
+    return _matcher
+
+def active_bundle(): #Version name of the active bundle, None before it is loaded
+    return _matcher.version if _matcher is not None else None
 
-        import clip
-        import faiss
-        import pickle
+def load_bundle(version): #Load a bundle next to the active one -> (matcher, detector or None when the detector weights don't change, weights path)
+    files = bundle_files(version)
+    matcher = load_matcher(files, reuse=_matcher)
+    path = detector_weights(files)
+    detector = load_detector(path) if path != _detector_path else None
+    return matcher, detector, path
 
-        # Load CLIP model (force jit=False)
+def swap_bundle(bundle): #Make a loaded bundle the active one. Plain assignments, requests that already took the old objects keep them
+    global _matcher, _detector, _detector_path
+    matcher, detector, path = bundle
+    if detector is not None:
+        with _detector_lock: # not in the middle of get_detector's first load
+            _detector, _detector_path = detector, path
+    _matcher = matcher
+
+def smoke_test_image(identities, tries=20): #(row, BGR image) of a reference card that is on this machine, spread over the table, or (None, None)
+    paths = identities['image_path']
+    for row in np.unique(np.linspace(0, len(paths) - 1, min(len(paths), tries)).astype(int)):
+        if paths[row] and os.path.exists(paths[row]):
+            image = cv2.imread(paths[row])
+            if image is not None:
+                return int(row), image
+    return None, None
+
+def smoke_test_bundle(bundle): #A reference card through the new bundle has to come back as itself, raises SmokeTestFailed otherwise
+    matcher, detector, _ = bundle
+    start = time.perf_counter()
+    ids = matcher.identities
+    if len(ids['card_id']) != matcher.faiss_index.ntotal:
+        raise SmokeTestFailed(f"identity table has {len(ids['card_id'])} rows but the index has {matcher.faiss_index.ntotal} vectors")
+
+    row, image = smoke_test_image(ids)
+    if image is None: # no reference images on this machine: a blank card still exercises the encoder
+        image = np.full((880, 630, 3), 127, dtype=np.uint8)
+    embedding = embed_card_images([image], matcher=matcher)
+    if embedding is None or embedding.shape[1] != matcher.faiss_index.d:
+        raise SmokeTestFailed(f"CLIP embedding shape {None if embedding is None else embedding.shape} doesn't fit the {matcher.faiss_index.d}-d index")
+    if row is None: # ...and the index has to find its own first vector
         try:
-            cache_model = os.path.expanduser('~/.cache/clip/ViT-B-32.pt')
-            if os.path.exists(cache_model):
-                print(f"Using cached CLIP model: {cache_model}")
-            else:
-                print(f"CLIP model not cached - will download 338MB (may cause OOM on 512MB instances)")
-            _clip_model, _clip_preprocess = clip.load('ViT-B/32', device=torch_device, jit=False, download_root=os.path.expanduser('~/.cache/clip'))
-        except Exception as e:
-            print(f"Error loading CLIP model (likely OOM): {e}")
-            raise
+            embedding, row = matcher.faiss_index.reconstruct(0)[None, :], 0
+        except RuntimeError:
+            pass
 
-        # Load FAISS index and mapping
-        _faiss_index = faiss.read_index(index_path)
-        with open(map_path, 'rb') as f:
-            _faiss_image_paths = pickle.load(f)
+    matches = search_embedding(embedding, top_k=5, matcher=matcher)
+    if not matches:
+        raise SmokeTestFailed("the index returned no matches")
+    expected = ids['card_id'][row] if row is not None else None
+    # reprints with identical art score the same, so any match tied with the best counts
+    tied = [m['card_id'] for m in matches if m['similarity'] >= matches[0]['similarity'] - 0.01]
+    if expected is not None and (expected not in tied or matches[0]['similarity'] < SMOKE_TEST_MIN_SIMILARITY):
+        raise SmokeTestFailed(f"reference card {expected} came back as {matches[0]['card_id']} (similarity={matches[0]['similarity']:.3f})")
+    if detector is not None:
+        run_detector(detector, [image], conf=0.5)
+    return {"card_id": expected, "top_match": matches[0]['card_id'], "similarity": round(matches[0]['similarity'], 4),
+            "ms": round((time.perf_counter() - start) * 1000, 1)}
 
-        print(f"CLIP + FAISS initialized: indexed {_faiss_index.ntotal} cards")
-        return True
+def reload_bundle(version): #Load version in the background, smoke test it, then swap it in. False if a reload is already running
+    bundle_files(version) # unknown versions and missing files fail here, before a thread starts
+    if _reload_channel is not None: # pre-fork worker: the parent does it for all workers
+        return _reload_channel.request(version)
+    return _bundle_reloader.start(version, load_bundle, smoke_test_bundle, swap_bundle)
 
-    except Exception as e:
-        print(f"Failed to initialize CLIP matcher: {e}")
-        return False
+def use_reload_channel(channel): #Send reloads to the pre-fork parent instead of reloading this process only
+    global _reload_channel
+    _reload_channel = channel
+
+def use_bundle(version): #Switch this process to version right away (scan worker processes follow the API process, which already smoke tested it)
+    if not version or current_matcher() is None or _matcher.version == version:
+        return
+    with _matcher_lock:
+        if _matcher.version != version:
+            swap_bundle(load_bundle(version))
 
+def bundle_status(): #Active bundle, detector weights and reload progress, for /admin/models
+    reloads = _reload_channel.status() if _reload_channel is not None else _bundle_reloader.status()
+    return {"active": active_bundle(), "detector": _detector_path or "default", **reloads}
 
-def find_matches_with_clip(cropped_image, top_k=5): #Return top_k matches (list of dict) for a cropped card image (numpy BGR array).
-    if not initialize_clip_matcher():
+
+def embed_card_image(cropped_image, matcher=None): #CLIP embedding of a cropped card (numpy BGR array) -> (1, 512) normalized float32, or None
+    return embed_card_images([cropped_image], matcher)
+
+def embed_card_images(cropped_images, matcher=None): #Batch version of embed_card_image, one CLIP forward pass -> (N, 512), or None
+    if not cropped_images:
         return None
-    
+    matcher = matcher or current_matcher()
+    if matcher is None:
+        return None
+
     try:
-        img_rgb = cv2.cvtColor(cropped_image, cv2.COLOR_BGR2RGB)
-        pil_img = PILImage.fromarray(img_rgb)
-        input_tensor = _clip_preprocess(pil_img).unsqueeze(0).to('cpu')
+        if CLIP_PREPROCESS == "cv2":
+            batch = clip_preprocess.preprocess_batch(cropped_images) # this thread's reusable buffer, consumed right below
+        else:
+            tensors = [matcher.clip_preprocess(PILImage.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))) for img in cropped_images]
+            batch = np.stack([np.asarray(t, dtype=np.float32) for t in tensors]) # torch tensors or pil_transform arrays
     except Exception as e:
-        print(f"Failed to preprocess image for CLIP: {e}")
+        print(f"Failed to preprocess images for CLIP: {e}")
         return None
 
-    with torch.no_grad():
-        emb = _clip_model.encode_image(input_tensor)
-        emb = emb / emb.norm(dim=-1, keepdim=True)
-        emb_np = emb.cpu().numpy().astype('float32')
+    if SCAN_BACKEND == "onnx":
+        return matcher.clip_model.encode(batch)
+    return clip_encoder.encode_images(matcher.clip_model, lazy_import("torch").from_numpy(batch)) # shares the buffer, no copy
 
-    # Search FAISS
-    D, I = _faiss_index.search(emb_np, top_k)
+def search_embedding(emb_np, top_k=5, index=None, printed_total=None, matcher=None): #Search FAISS (the bundle's index unless another one is passed in) and return match dicts
+    # printed_total: only search the sets printed with this "/TTT" total (see set_filter.py), falls back to everything
+    matcher = matcher or current_matcher()
+    restricted = None
+    if printed_total and matcher.set_filter is not None and index is None:
+        restricted = matcher.set_filter.search(matcher.faiss_index, emb_np, printed_total, top_k)
+    if restricted is not None:
+        D, I = restricted
+    else:
+        index = matcher.faiss_index if index is None else index
+        D, I = index.search(emb_np, top_k)
+    return match_dicts(D, I, matcher)
 
-    # Get the current project root to fix image paths
-    project_root = os.path.join(os.path.dirname(__file__), '..')
-    new_image_base = os.path.join(project_root, 'Image_detection', 'reference_images', 'EverySinglePokemonCard')
-    
+def match_dicts(D, I, matcher=None): #FAISS (D, I) for one query -> match dicts, identities come straight from the table built alongside the index
+    ids = (matcher or current_matcher()).identities
     results = []
     for rank, (score, idx) in enumerate(zip(D[0], I[0]), start=1):
-        old_path = _faiss_image_paths[idx]
-        name = os.path.basename(old_path)
-        
-        # Fix the path to point to the new location
-        new_path = os.path.join(new_image_base, name)
-        
-        # Fallback to old path if new path doesn't exist (shouldn't happen but just in case)
-        if not os.path.exists(new_path) and os.path.exists(old_path):
-            new_path = old_path
-        
-        results.append({'rank': rank, 'card_name': name, 'card_path': new_path, 'similarity': float(score)})
+        if idx < 0: # FAISS pads with -1 when there are fewer than top_k results
+            break
+        results.append({
+            'rank': rank,
+            'card_name': ids['filename'][idx],
+            'card_path': ids['image_path'][idx],
+            'similarity': float(score),
+            'card_id': ids['card_id'][idx],
+            'set_id': ids['set_id'][idx],
+            'number': ids['number'][idx],
+            'display_name': ids['display_name'][idx],
+            'row_id': int(idx)
+        })
 
     return results
 
-def get_best_matched_clip(cropped_image, top_k=5, show_image=False, ocr_name=None): #Find best matches for cropped_image and optionally display the top result using OpenCV.
-    matches = find_matches_with_clip(cropped_image, top_k=top_k)
+def find_matches_with_clip(cropped_image, top_k=5, index=None): #Return top_k matches (list of dict) for a cropped card image (numpy BGR array).
+    matcher = current_matcher()
+    emb_np = embed_card_image(cropped_image, matcher)
+    if emb_np is None:
+        return None
+    return search_embedding(emb_np, top_k=top_k, index=index, matcher=matcher)
+
+def get_best_matched_clip(cropped_image, top_k=5, show_image=False, ocr_name=None, index=None, embedding=None, card_number=None, matcher=None): #Find best matches for cropped_image and optionally display the top result using OpenCV.
+    # matcher: the bundle an embedding passed in was made with, so a reload in between can't mix two of them
+    matcher = matcher or current_matcher()
+    if matcher is None:
+        print("No matches found or CLIP matcher failed to initialize.")
+        return None, None
+
+    # Embed once, the looser OCR fallback below reuses the same embedding
+    if embedding is None:
+        embedding = embed_card_image(cropped_image, matcher)
+
+    # SET_FILTER: read "NNN/TTT" off the card (unless the caller already has it) and only search sets printed with TTT
+    printed_total = None
+    if matcher.set_filter is not None and index is None and embedding is not None:
+        parsed = parse_collector_number(card_number) if isinstance(card_number, str) else card_number
+        if parsed is None and cropped_image is not None:
+            parsed = read_collector_number(cropped_image, get_ocr_reader())
+        printed_total = parsed[1] if parsed else None
+
+    matches = search_embedding(embedding, top_k=top_k, index=index, printed_total=printed_total, matcher=matcher) if embedding is not None else None
+    if printed_total and (not matches or matches[0]['similarity'] < SET_FILTER_MIN_SIMILARITY):
+        print(f"Nothing close enough in sets printed with /{printed_total}, searching every set")
+        printed_total = None
+        matches = search_embedding(embedding, top_k=top_k, index=index, matcher=matcher)
+    elif printed_total:
+        print(f"Searched only sets printed with /{printed_total}")
     if not matches:
         print("No matches found or CLIP matcher failed to initialize.")
         return None, None
@@ -454,64 +782,128 @@ def get_best_matched_clip(cropped_image, top_k=5, show_image=False, ocr_name=Non
     for m in matches:
         print(f"Rank {m['rank']}: {m['card_name']} — similarity={m['similarity']:.4f}")
         
-    # Sanity check: prefer match where OCR name appears in filename
+    # Sanity check: prefer a match whose catalog name is within a few OCR misreads of the OCR name (name_index.py)
     best = matches[0]  # default to highest similarity
     
-    if ocr_name:
-                
-        def normalize_text(text): #Remove accents and convert to lowercase for comparison.
-            # Normalize unicode (NFD = decomposed form, then filter out combining marks)
-            nfd = unicodedata.normalize('NFD', text)
-            without_accents = ''.join(c for c in nfd if unicodedata.category(c) != 'Mn')
-            return without_accents.lower()
-        
-        ocr_normalized = normalize_text(ocr_name)
-        ocr_words = ocr_normalized.split(" ")
-        print(f"\nSanity check: looking for OCR name '{ocr_name}' in filenames...")
-        
-        found_match = False
-        for m in matches:
-            filename_normalized = normalize_text(m['card_name'])
-            
-            # Check if all words from OCR name appear in filename
-            all_words_found = all(word in filename_normalized for word in ocr_words)
-            
-            if all_words_found:
-                print(f"Match found: '{ocr_name}' in '{m['card_name']}'")
-                best = m
-                found_match = True
-                break
-        
-        if not found_match:
-            # Check only the top 1000 matches for any word match (looser)
-            matches = find_matches_with_clip(cropped_image, top_k=1000)
-            print(f"Scanning {len(matches)} matches for OCR name '{ocr_name}' (looser match)...")
-            for m in matches:
-                filename_normalized = normalize_text(m['card_name'])
-                if any(word and word in filename_normalized for word in ocr_words):
-                    print(f"Looser match found in top-{len(matches)}: '{ocr_name}' in '{m['card_name']}'")
-                    best = m
-                    found_match = True
-                    break
-            if not found_match:
-                print(f"WARNING: OCR name '{ocr_name}' not found in top-{len(matches)} filenames, using highest similarity match.")
+    if ocr_name and matcher.name_index is not None:
+        candidates = matcher.name_index.candidate_rows(ocr_name)
+        in_sets = matcher.set_filter.candidate_rows(printed_total) if printed_total else None
+        if candidates is not None and in_sets is not None:
+            narrowed = np.intersect1d(candidates, in_sets)
+            candidates = narrowed if len(narrowed) else candidates
+
+        if candidates is None:
+            print(f"WARNING: OCR name '{ocr_name}' is not close to any catalog name, using highest similarity match.")
+        else:
+            candidate_rows = set(candidates.tolist())
+            named = next((m for m in matches if m['row_id'] in candidate_rows), None)
+            if named is not None:
+                print(f"Match found: '{ocr_name}' ~ '{named['display_name']}'")
+            else:
+                # None of the top_k carry that name: rank just the rows with that name by CLIP similarity
+                D, I = search_rows(matcher.faiss_index if index is None else index, embedding, candidates, 1)
+                named = match_dicts(D, I, matcher)[0]
+                print(f"'{ocr_name}' ~ '{named['display_name']}' outside the top {len(matches)}, best of its {len(candidates)} rows: similarity={named['similarity']:.4f}")
+                if named['similarity'] < matches[0]['similarity'] - OCR_NAME_MARGIN: # OCR misread or a name CLIP clearly disagrees with
+                    print(f"Keeping CLIP's top match, '{named['display_name']}' is more than {OCR_NAME_MARGIN} below it")
+                    named = matches[0]
+            best = named
    
     return best, matches
 
+def identify_card(card_image): #OCR + CLIP for one cropped card -> small identity dict (or None), shared by the live scanners
+    card_info = get_text_from_image(card_image, debug=False, show_window=False)
+    best, _ = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=card_info.get('name'))
+    if not best:
+        return None
+    return {
+        'card_id': best['card_id'],
+        'display_name': best['display_name'],
+        'set_id': best['set_id'],
+        'number': best['number'],
+        'similarity': best['similarity'],
+        'ocr_name': card_info.get('name')
+    }
+
+def live_scan(camera=0, detect_every=LIVE_DETECT_EVERY, conf=0.5): #Continuous webcam scanning, ESC to exit
+    initialize_clip_matcher()
+    cap = cv2.VideoCapture(camera)
+    tracker = CardTracker()
+    identifier = ThreadPoolExecutor(max_workers=1) # OCR + CLIP off the video loop so the preview stays live
+    timings = {stage: deque(maxlen=30) for stage in ("detect", "track", "identify", "frame")}
+    identified = []
+
+    def identify_track(track, card_image):
+        start = time.perf_counter()
+        try:
+            track.identity = identify_card(card_image)
+        finally:
+            if not track.identity: # back off before trying this card again
+                tracker.identification_failed(track)
+            track.pending = False
+            timings["identify"].append(time.perf_counter() - start)
+        if track.identity:
+            identified.append(track.identity)
+            print(f"Track {track.id}: {track.identity['display_name']} ({track.identity['card_id']}, similarity={track.identity['similarity']:.3f})")
+
+    frame_idx = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("Failed to grab camera frame")
+            break
+        frame_start = time.perf_counter()
+
+        if frame_idx % detect_every == 0:
+            start = time.perf_counter()
+            detections = detect_cards([frame], conf=conf)[0]
+            timings["detect"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            tracker.update(detections, frame)
+        else:
+            start = time.perf_counter()
+            tracker.predict()
+        timings["track"].append(time.perf_counter() - start)
+
+        for track in tracker.ready_for_identification(): # only new cards that have settled and are in focus
+            track.pending = True
+            identifier.submit(identify_track, track, crop_box(frame, track.box).copy())
+
+        # Overlay: boxes with cached identities, FPS and stage timings
+        for track in tracker.tracks:
+            x1, y1, x2, y2 = [int(v) for v in track.box]
+            if track.identity:
+                color, label = (0, 255, 0), f"{track.identity['display_name']} {track.identity['set_id']}-{track.identity['number']}"
+            elif track.pending:
+                color, label = (0, 200, 255), "identifying..."
+            else:
+                color, label = (200, 200, 200), "hold still" if not track.stable else "blurry"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, f"#{track.id} {label}", (x1, max(20, y1 - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+        timings["frame"].append(time.perf_counter() - frame_start)
+        fps = len(timings["frame"]) / sum(timings["frame"]) if timings["frame"] else 0
+        stats = "  ".join(f"{stage} {np.mean(times) * 1000:.0f}ms" for stage, times in timings.items() if times and stage != "frame")
+        cv2.putText(frame, f"{fps:.1f} FPS  {stats}", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+        cv2.imshow('Pokemon Card Scanner - live (ESC to exit)', frame)
+        if cv2.waitKey(1) % 256 == 27:
+            break
+        frame_idx += 1
+
+    cap.release()
+    cv2.destroyAllWindows()
+    identifier.shutdown(wait=True)
+    print(f"\nIdentified {len(identified)} card(s) this session:")
+    for identity in identified:
+        print(f"  {identity['card_id']}: {identity['display_name']}")
+    return identified
+
 def main(): #Main loop was being run when testing this file solo
     print("Starting Pokemon Card Scanner (YOLO)")
     print("\nCamera mode:")
     print("Press SPACE to capture a card, ESC to exit")
 
-    captured_frame = take_picture()
-    
-    # If an image was captured, convert to BGR format for OpenCV
-    if captured_frame is not None:
-        captured_frame = cv2.cvtColor(captured_frame, cv2.COLOR_RGB2BGR)
-
-    cv2.imshow("Captured Frame", captured_frame)
-    cv2.waitKey(1)
-    cv2.destroyAllWindows()
+    captured_frame = take_picture() # VideoCapture frames are already BGR
 
     if captured_frame is None:
         print("No image captured. Exiting.")
@@ -523,7 +915,7 @@ def main(): #Main loop was being run when testing this file solo
     result = getbounding(captured_frame, display=True)
 
     if result and isinstance(result, tuple):
-        model, bboxes = result
+        model, bboxes, _ = result
         if bboxes is not None:
             print(f"1 card detected at [{bboxes[0]:.3f}, {bboxes[1]:.3f}, {bboxes[2]:.3f}, {bboxes[3]:.3f}]")
         else:
@@ -542,7 +934,7 @@ def main(): #Main loop was being run when testing this file solo
         print(f"Failed to create cropped card image.")
     
     print("\nExtracting text from cropped card image...")
-    card_info = get_text_from_image(cropped_card, debug=True)
+    card_info, _ = get_text_from_image(cropped_card, debug=True)
     
     # Use CLIP+FAISS to find visually similar card variants
     print("\nRunning visual search (CLIP + FAISS)...")
@@ -594,37 +986,37 @@ def main(): #Main loop was being run when testing this file solo
     cv2.destroyAllWindows()
 
     if best:
-        filename = best['card_name'] # best is a dict, use dict key access
-        parts = filename.split("_")
-        
-        card_num = parts[-1].replace(".jpg", "")
-        set_name = parts[-2]
-        
-        card_id = f"{set_name}-{card_num}"
+        card_id = best['card_id']
+        set_name = best['set_id']
         
         jsonpath = "pokemon-tcg-data/cards/en"
         
         totalcarddata = None
-        for file in os.listdir(jsonpath):
-            if file.endswith(".json"):
-                if file.lower().startswith(set_name.lower()):
-                    filepath = os.path.join(jsonpath, file)
-                    try:
-                        with open(filepath, "r", encoding="utf-8") as f:
-                            json_data = json.load(f)
+        if local_catalog.is_available(): # indexed lookup instead of scanning every set file
+            totalcarddata = local_catalog.get_card_json(card_id)
+            if totalcarddata is not None:
+                jsonpath = local_catalog.CATALOG_PATH
+        if totalcarddata is None and os.path.isdir(jsonpath): # no catalog, or a card it doesn't have yet
+            for file in os.listdir(jsonpath):
+                if file.endswith(".json"):
+                    if file.lower().startswith(set_name.lower()):
+                        filepath = os.path.join(jsonpath, file)
+                        try:
+                            with open(filepath, "r", encoding="utf-8") as f:
+                                json_data = json.load(f)
                         
-                        # JSON files contain arrays of cards
-                        if isinstance(json_data, list):
-                            for card in json_data:
-                                if isinstance(card, dict) and card.get('id') == card_id:
-                                    totalcarddata = card
-                                    break
+                            # JSON files contain arrays of cards
+                            if isinstance(json_data, list):
+                                for card in json_data:
+                                    if isinstance(card, dict) and card.get('id') == card_id:
+                                        totalcarddata = card
+                                        break
                         
-                        if totalcarddata:
-                            break
-                    except Exception as e:
-                        print(f"Error reading {filepath}: {e}")
-                        continue
+                            if totalcarddata:
+                                break
+                        except Exception as e:
+                            print(f"Error reading {filepath}: {e}")
+                            continue
         
         if totalcarddata is None:
             print(f"\nNo card data found for ID '{card_id}' in {jsonpath}")
@@ -637,4 +1029,12 @@ def main(): #Main loop was being run when testing this file solo
         print("\nNo card was identified successfully.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pokemon Card Scanner (webcam)")
+    parser.add_argument("--live", action="store_true", help="Continuous scanning with tracking instead of a single SPACE capture")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--detect-every", type=int, default=LIVE_DETECT_EVERY, help="Run the detector on every Nth frame in --live mode")
+    args = parser.parse_args()
+    if args.live:
+        live_scan(camera=args.camera, detect_every=args.detect_every)
+    else:
+        main()
\ No newline at end of file
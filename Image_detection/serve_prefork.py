@@ -0,0 +1,275 @@
+# PRE-FORK MULTI-WORKER SERVER
+# `uvicorn --workers N` starts N fresh interpreters and each one loads CLIP, YOLO, EasyOCR and the FAISS index
+# on its own, so RAM grows with the worker count. Here the parent loads everything once, freezes the heap
+# (gc.freeze, so the collector doesn't dirty the shared pages) and forks N workers that inherit the weights
+# copy-on-write and all accept() on one listening socket. The parent then supervises them: dead or wedged
+# workers (no heartbeat) are replaced, and the startup log shows RSS / PSS / shared / private memory per worker.
+# The parent never runs inference before forking. An OpenMP pool started in the parent can deadlock forked children.
+# Model bundle reloads (POST /admin/reload_models on any worker) come to the parent through a ReloadChannel: it
+# loads the bundle, runs the smoke query in a throwaway fork, swaps it in and replaces the workers one at a time
+# (the old ones finish their requests on SIGTERM). Respawned workers fork from the parent, so they get it too.
+#Usage:
+#  python -m Image_detection.serve_prefork --workers 4 --port 8000
+import os
+import gc
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import threading
+import multiprocessing
+
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "120"))  # seconds; handlers run inference on the event loop, so keep this generous
+RESPAWN_BACKOFF = 2.0
+ROLL_INTERVAL = float(os.getenv("ROLL_INTERVAL", "2"))  # seconds between replacing workers on a bundle reload, the new one starts accepting meanwhile
+
+def preload_models(): #Everything the request path would otherwise load lazily, loaded in the parent before forking
+    timings = {}
+    start = time.perf_counter()
+    from . import main # builds the app, the heavy libraries load below
+    from . import scan_card
+    timings["import"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ok = scan_card.initialize_clip_matcher()
+    timings["clip+faiss"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_card.get_detector()
+    timings["detector"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_card.get_ocr_reader()
+    timings["easyocr"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    main.supabase.client() # the proxy builds it on first use, do that once here instead of once per worker
+    timings["supabase"] = time.perf_counter() - start
+
+    main.register_heif_decoder()
+    main._clip_initialized = ok # workers answer scans as soon as they start
+    main.mark("models_warm")
+    print("Preloaded in parent: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items()))
+    main.print_profile()
+    return main.app
+
+def memory_info(pid): #RSS / PSS / shared / private in MB from /proc/<pid>/smaps_rollup (Linux), None elsewhere
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+def print_memory_table(parent_pid, workers):
+    rows = [("parent", parent_pid)] + [(f"worker {slot}", pid) for slot, pid in sorted(workers.items())]
+    print(f"{'process':10} {'pid':>7} {'rss MB':>8} {'pss MB':>8} {'shared MB':>10} {'private MB':>11}")
+    total_pss = 0.0
+    for name, pid in rows:
+        info = memory_info(pid)
+        if info is None:
+            print(f"{name:10} {pid:>7}  (memory figures need /proc)")
+            continue
+        total_pss += info["pss"]
+        print(f"{name:10} {pid:>7} {info['rss']:8.0f} {info['pss']:8.0f} {info['shared']:10.0f} {info['private']:11.0f}")
+    if total_pss:
+        print(f"Total PSS {total_pss:.0f} MB across {len(rows)} processes (RSS double counts the shared model pages, PSS doesn't)")
+
+def smoke_test_in_child(bundle): #Run the bundle's smoke query in a throwaway fork, the parent itself never runs inference
+    from . import scan_card
+    from .model_bundles import SmokeTestFailed
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            import torch
+            torch.set_num_threads(1)
+            result = {"ok": True, "smoke_test": scan_card.smoke_test_bundle(bundle)}
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        os.write(write_fd, json.dumps(result).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    result = json.loads(data) if data else {"ok": False, "error": "smoke test process died"}
+    if not result["ok"]:
+        raise SmokeTestFailed(result["error"])
+    return result["smoke_test"]
+
+def run_worker(slot, app, sock, heartbeats, threads_per_worker, args): #Child process: own uvicorn server on the inherited socket
+    import asyncio
+    import uvicorn
+    import torch
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    torch.set_num_threads(threads_per_worker) # N workers x all cores each would oversubscribe the CPU
+
+    async def heartbeat(): # from inside the event loop, so a wedged loop stops beating
+        while True:
+            heartbeats[slot] = time.time()
+            await asyncio.sleep(1)
+
+    @app.on_event("startup")
+    async def start_heartbeat():
+        asyncio.get_running_loop().create_task(heartbeat())
+
+    config = uvicorn.Config(app, log_level="info", loop=args.loop, http=args.http)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+def spawn(slot, app, sock, heartbeats, threads_per_worker, args):
+    heartbeats[slot] = time.time()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(slot, app, sock, heartbeats, threads_per_worker, args)
+        finally:
+            os._exit(1)
+    print(f"Worker {slot} started (pid {pid})")
+    return pid
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Pokemon Card Scanner API from N forked workers that share one copy of the models")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--loop", default="auto", help="uvicorn event loop (auto, asyncio, uvloop)")
+    parser.add_argument("--http", default="auto", help="uvicorn HTTP protocol (auto, h11, httptools)")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="torch threads per worker (default: cores / workers)")
+    args = parser.parse_args()
+    threads_per_worker = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    print(f"Starting Pokemon Card Scanner API with {args.workers} pre-forked workers...")
+    app = preload_models()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    heartbeats = multiprocessing.Array('d', args.workers, lock=False)  # shared memory, one timestamp per worker slot
+    from . import scan_card
+    from .model_bundles import ReloadChannel, record_bundle
+    channel = ReloadChannel()
+    scan_card.use_reload_channel(channel) # inherited by every worker
+    reloads = []  # recent outcomes, newest first
+
+    gc.collect()
+    gc.freeze() # move everything loaded so far out of the collector's reach so it never writes to those pages
+
+    workers = {slot: spawn(slot, app, sock, heartbeats, threads_per_worker, args) for slot in range(args.workers)}
+    retiring = set()  # workers replaced by a reload that are still finishing their requests
+    stopping = threading.Event()
+
+    def shutdown(signum, frame):
+        stopping.set()
+        for pid in list(workers.values()) + list(retiring):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    def reload_bundle(version): #Load + smoke test in the parent, swap, then roll the workers onto it one at a time
+        outcome = {"version": version, "state": "loading", "started": time.time()}
+        channel.publish(outcome, reloads)
+        start = time.perf_counter()
+        try:
+            bundle = scan_card.load_bundle(version) # reading files and weights only, no inference
+            outcome.update(state="smoke_test", load_seconds=round(time.perf_counter() - start, 2))
+            channel.publish(outcome, reloads)
+            outcome["smoke_test"] = smoke_test_in_child(bundle)
+            scan_card.swap_bundle(bundle) # workers forked from now on, respawns included, get the new bundle
+            record_bundle(version)
+            gc.collect()
+            gc.freeze()
+            outcome["state"] = "rolling"
+            for slot, old_pid in list(workers.items()):
+                if stopping.is_set():
+                    break
+                channel.publish(outcome, reloads)
+                workers[slot] = spawn(slot, app, sock, heartbeats, threads_per_worker, args)
+                retiring.add(old_pid)
+                try:
+                    os.kill(old_pid, signal.SIGTERM) # uvicorn stops accepting and finishes what it has, the reaper collects it
+                except ProcessLookupError:
+                    pass
+                time.sleep(ROLL_INTERVAL)
+            outcome["state"] = "active"
+            print(f"Model bundle '{version}' is active on all {len(workers)} workers ({time.perf_counter() - start:.1f}s)")
+        except Exception as e: # nothing was swapped unless the smoke test passed, the workers keep serving
+            outcome["state"] = "failed"
+            outcome["error"] = f"{type(e).__name__}: {e}"
+            print(f"Reloading model bundle '{version}' failed, keeping the current one: {outcome['error']}")
+        outcome["seconds"] = round(time.perf_counter() - start, 2)
+        reloads.insert(0, outcome)
+        del reloads[10:]
+        channel.publish(None, reloads, done=True)
+
+    memory_logged_at = time.time() + 5 # once the workers have settled
+    while not stopping.is_set():
+        # Reap workers that exited and start replacements
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid == 0:
+                break
+            retiring.discard(pid)
+            slot = next((s for s, p in workers.items() if p == pid), None)
+            if slot is not None and not stopping.is_set():
+                print(f"Worker {slot} (pid {pid}) exited with status {status}, restarting")
+                time.sleep(RESPAWN_BACKOFF)
+                workers[slot] = spawn(slot, app, sock, heartbeats, threads_per_worker, args)
+
+        # A worker got POST /admin/reload_models (blocks supervision for the load, heartbeats are checked right after)
+        version = channel.take_request()
+        if version and not stopping.is_set():
+            reload_bundle(version)
+
+        # Kill workers whose event loop stopped beating, the reaper above replaces them
+        now = time.time()
+        for slot, pid in list(workers.items()):
+            if now - heartbeats[slot] > WORKER_HEARTBEAT_TIMEOUT:
+                print(f"Worker {slot} (pid {pid}) missed heartbeats for {now - heartbeats[slot]:.0f}s, killing it")
+                heartbeats[slot] = now
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+        if memory_logged_at and now >= memory_logged_at:
+            print_memory_table(os.getpid(), workers)
+            memory_logged_at = None
+        time.sleep(1)
+
+    for pid in list(workers.values()) + list(retiring):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    print("All workers stopped")
+
+if __name__ == "__main__":
+    sys.exit(main())
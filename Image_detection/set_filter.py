@@ -0,0 +1,117 @@
+# NARROW THE CLIP SEARCH BY THE PRINTED COLLECTOR NUMBER ("NNN/TTT")
+# The set total TTT printed under the art names only a few sets (the sets table of the local catalog, built from
+# pokemon-tcg-data's printedTotal). With SET_FILTER=1 the matcher OCRs the bottom strip of the card, looks up
+# the sets with that printed total and searches only their rows. The search goes through a small flat sub-index
+# per total, cached, so it scans a few hundred vectors instead of the whole catalog, and reprints from other
+# sets can no longer win on art alone. Indexes that can't reconstruct vectors fall back to a FAISS ID selector.
+# No readable number, an unknown total or a weak best match inside the candidate sets means a normal full search.
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+SET_FILTER = os.getenv("SET_FILTER", "0") == "1"  # OCR the collector number and search only sets with that printed total
+SET_FILTER_MIN_SIMILARITY = float(os.getenv("SET_FILTER_MIN_SIMILARITY", "0.75"))  # below this inside the candidate sets, search everything
+FOOTER_FRACTION = 0.12  # bottom strip of the card with the collector number (left on modern cards, right on older ones)
+SUB_INDEX_CACHE = 64  # printed totals whose sub-index stays built
+
+# OCR mixes up digits with look-alike letters in the small footer font
+_DIGIT_FIXES = str.maketrans({"O": "0", "o": "0", "D": "0", "Q": "0", "I": "1", "l": "1", "|": "1", "i": "1",
+                              "Z": "2", "S": "5", "s": "5", "B": "8", "G": "6", "\\": "/"})
+_NUMBER_RE = re.compile(r"(\d{1,3})\s*/\s*(\d{2,3})")
+
+def parse_collector_number(text): #"O25/l98" -> (25, 198), or None when there is no NNN/TTT in the text
+    match = _NUMBER_RE.search(text.translate(_DIGIT_FIXES))
+    if not match:
+        return None
+    number, total = int(match.group(1)), int(match.group(2))
+    if total == 0:
+        return None
+    return number, total
+
+def read_collector_number(card_image, reader): #OCR the footer strip of a cropped card -> (number, total) or None
+    h = card_image.shape[0]
+    footer = card_image[int(h * (1 - FOOTER_FRACTION)):]
+    if footer.size == 0:
+        return None
+    results = reader.readtext(footer, allowlist="0123456789/OoIlSB")
+    # Numbers are sometimes split into two boxes ("025" and "/198"), so also try the boxes joined left to right
+    texts = [text for _, text, _ in results]
+    joined = " ".join(text for _, text, _ in sorted(results, key=lambda r: r[0][0][0]))
+    for text in texts + [joined]:
+        parsed = parse_collector_number(text)
+        if parsed:
+            return parsed
+    return None
+
+def selector_params(index, rows): #FAISS search parameters that only admit these row ids
+    import faiss
+    selector = faiss.IDSelectorBatch(rows)
+    if isinstance(index, faiss.IndexIVF): # the params type has to match the index, and carry its current knobs
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def search_rows(index, emb_np, rows, top_k): #Exact top_k among a small set of row ids -> (D, I) like index.search
+    k = min(top_k, len(rows))
+    try:
+        vectors = index.reconstruct_batch(rows)
+    except RuntimeError:
+        return index.search(emb_np, k, params=selector_params(index, rows))
+    scores = vectors @ emb_np[0]
+    order = np.argsort(-scores)[:k]
+    return scores[order][None, :], rows[order][None, :]
+
+class SetFilter: #printed total -> candidate FAISS rows, with a cache of per-total flat sub-indexes
+    def __init__(self, identities, set_totals):
+        self.sets_by_total = {}
+        for set_id, total in set_totals.items():
+            self.sets_by_total.setdefault(int(total), []).append(set_id)
+        rows_by_set = {}
+        for row, set_id in enumerate(identities['set_id']):
+            rows_by_set.setdefault(set_id, []).append(row)
+        self.rows_by_set = {set_id: np.array(rows, dtype=np.int64) for set_id, rows in rows_by_set.items()}
+        self._sub_indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def candidate_rows(self, total): #Sorted row ids of every set printed with this total, or None
+        sets = [s for s in self.sets_by_total.get(total, []) if s in self.rows_by_set]
+        if not sets:
+            return None
+        return np.sort(np.concatenate([self.rows_by_set[s] for s in sets]))
+
+    def sub_index(self, index, total): #(flat index over the candidate rows, their global row ids), or (None, rows) if index can't reconstruct
+        with self._lock:
+            if total in self._sub_indexes:
+                self._sub_indexes.move_to_end(total)
+                return self._sub_indexes[total]
+        rows = self.candidate_rows(total)
+        if rows is None:
+            return None, None
+        import faiss
+        try:
+            vectors = index.reconstruct_batch(rows)
+        except RuntimeError: # IVF without a direct map, HNSW on some builds
+            return None, rows
+        sub = faiss.IndexFlatIP(index.d)
+        sub.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        with self._lock:
+            self._sub_indexes[total] = (sub, rows)
+            while len(self._sub_indexes) > SUB_INDEX_CACHE:
+                self._sub_indexes.popitem(last=False)
+        return sub, rows
+
+    def search(self, index, emb_np, total, top_k): #(D, I) with I as global row ids, restricted to the sets printed with total, or None
+        sub, rows = self.sub_index(index, total)
+        if rows is None:
+            return None
+        k = min(top_k, len(rows))
+        if sub is not None:
+            D, I = sub.search(emb_np, k)
+            return D, np.where(I >= 0, rows[np.maximum(I, 0)], -1)
+        return index.search(emb_np, k, params=selector_params(index, rows))
+
+    def stats(self):
+        return {"printed_totals": len(self.sets_by_total), "cached_sub_indexes": len(self._sub_indexes)}
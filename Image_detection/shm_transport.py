@@ -0,0 +1,244 @@
+# SHARED MEMORY IMAGE HAND-OFF TO SCAN WORKER PROCESSES
+# With SCAN_PROCESSES > 0, every scan endpoint (/scan_card/, /scan_card_extra_info/, /scan_multiple_cards/ and
+# /ws/live_scan) runs detection, OCR and CLIP in a pool of worker processes instead of in the API process, which
+# then never loads the models. Pickling a decoded phone photo (tens of MB) into a worker for every call would eat
+# most of the win, so images go through a ring of fixed-size slots in one multiprocessing.shared_memory segment: the
+# API process copies the detection frame (or, for identification, just the card crop it cut out) into a free slot,
+# the worker maps the same bytes as a read-only numpy view and runs the detector or OCR + CLIP on it in place, and
+# only a FrameRef (segment name, offset, shape, dtype) and the small result dicts are pickled. Slots are reused, and at most SHM_SLOTS frames are in flight. put() waits for a
+# free slot up to a deadline. Each slot carries a generation counter so a worker can't silently read a slot that
+# was already handed to another request.
+# The workers are started and load their models at API startup (warm_up), and a pool broken by a dead worker
+# (OOM kill in torch, segfault) is replaced on the next call instead of failing every scan until a restart.
+import os
+import queue
+import asyncio
+import threading
+import multiprocessing
+from typing import NamedTuple
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+MB = 1024 * 1024
+SCAN_PROCESSES = int(os.getenv("SCAN_PROCESSES", "0"))  # inference worker processes for /scan_card/, 0 = run in the API process
+SHM_SLOTS = int(os.getenv("SHM_SLOTS", str(max(2, 2 * SCAN_PROCESSES))))  # frames in flight across all workers
+SHM_SLOT_MB = int(os.getenv("SHM_SLOT_MB", "48"))  # one slot holds a decoded frame up to this size (a 12MP BGR photo is ~36MB)
+SHM_PUT_TIMEOUT = float(os.getenv("SHM_PUT_TIMEOUT", "10"))  # seconds to wait for a free slot
+HEADER_BYTES = 4096  # per-slot generation counters live at the start of the segment
+
+class RingFull(Exception):
+    pass
+
+class FrameTooLarge(Exception):
+    pass
+
+class StaleFrame(Exception):
+    pass
+
+class FrameRef(NamedTuple): #What actually crosses the process boundary for a frame
+    shm_name: str
+    slot: int
+    generation: int
+    offset: int
+    shape: tuple
+    dtype: str
+
+class FrameRing: #Owned by the API process: one shared segment cut into equal slots, free slots in a FIFO
+    def __init__(self, slots=SHM_SLOTS, slot_bytes=SHM_SLOT_MB * MB):
+        if slots * 8 > HEADER_BYTES:
+            raise ValueError(f"At most {HEADER_BYTES // 8} slots")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        # tmpfs backed on Linux, pages are only allocated once a slot is written to
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + slots * slot_bytes)
+        self.generations = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.generations[:] = 0
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self.puts = 0
+        self.waits = 0
+        self.full = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def put(self, image, timeout=SHM_PUT_TIMEOUT): #Copy a frame into a free slot -> FrameRef. Blocks while every slot is in use
+        image = np.ascontiguousarray(image)
+        if image.nbytes > self.slot_bytes:
+            raise FrameTooLarge(f"{image.nbytes / MB:.1f}MB frame does not fit a {self.slot_bytes / MB:.0f}MB slot")
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            self.waits += 1
+            try:
+                slot = self._free.get(timeout=timeout)
+            except queue.Empty:
+                self.full += 1
+                raise RingFull(f"All {self.slots} shared memory slots busy for {timeout:g}s")
+        offset = HEADER_BYTES + slot * self.slot_bytes
+        np.copyto(np.ndarray(image.shape, dtype=image.dtype, buffer=self.shm.buf, offset=offset), image)
+        self.generations[slot] += 1
+        self.puts += 1
+        return FrameRef(self.shm.name, slot, int(self.generations[slot]), offset, image.shape, image.dtype.str)
+
+    def release(self, ref): #Give the slot back. Bumping the generation makes any late reader of the old frame fail loudly
+        self.generations[ref.slot] += 1
+        self._free.put(ref.slot)
+
+    def stats(self):
+        return {"slots": self.slots, "slot_mb": self.slot_bytes // MB, "free": self._free.qsize(),
+                "puts": self.puts, "waited": self.waits, "ring_full": self.full}
+
+    def close(self):
+        self.generations = None # drop the view before closing, SharedMemory refuses to close with exports alive
+        self.shm.close()
+        self.shm.unlink()
+
+# Worker side: segments attached once per process, frames read in place
+_segments = {}
+
+def _segment(name):
+    shm = _segments.get(name)
+    if shm is None:
+        shm = _segments[name] = shared_memory.SharedMemory(name=name)
+    return shm
+
+def frame_view(ref): #Read-only numpy view of a frame in shared memory, no copy
+    shm = _segment(ref.shm_name)
+    check_current(ref)
+    view = np.ndarray(ref.shape, dtype=np.dtype(ref.dtype), buffer=shm.buf, offset=ref.offset)
+    view.flags.writeable = False # the slot belongs to the API process, crops are views of it too
+    return view
+
+def check_current(ref): #Raise if the slot was released (and maybe reused) since ref was handed out
+    generation = np.ndarray((1,), dtype=np.int64, buffer=_segment(ref.shm_name).buf, offset=ref.slot * 8)[0]
+    if generation != ref.generation:
+        raise StaleFrame(f"Slot {ref.slot} moved on to generation {generation}, expected {ref.generation}")
+
+def _init_worker(threads): #Process pool initializer: load the models once per worker
+    # N workers x all cores each would oversubscribe the CPU. onnx_backend reads its cap when scan_card imports it
+    os.environ.setdefault("ONNX_INTRA_OP_THREADS", str(threads))
+    from . import scan_card
+    if scan_card.SCAN_BACKEND != "onnx": # the onnx backend never imports torch for CLIP or the detector
+        import torch
+        torch.set_num_threads(threads)
+    scan_card.initialize_clip_matcher()
+    scan_card.get_detector()
+    scan_card.get_ocr_reader()
+
+def warm_task(): #Worker: nothing left to do once the initializer has loaded the models
+    return os.getpid()
+
+def detect_task(ref, multi_card=False, bundle=None, conf_threshold=0.7, tiled=None): #Worker: getbounding on a shared frame -> (bbox or bbox list, detections), or None
+    # bundle: the API process's active model bundle version, a worker still on an older one switches first
+    from .scan_card import getbounding, use_bundle
+    use_bundle(bundle)
+    result = getbounding(frame_view(ref), display=False, multi_card=multi_card, conf_threshold=conf_threshold, tiled=tiled)
+    check_current(ref)
+    if not isinstance(result, tuple):
+        return None
+    return result[1], result[2] # (model, bbox, detections): the model stays here
+
+def detect_frame_task(ref, conf=0.25, bundle=None): #Worker: raw detector boxes for one live frame -> [(xyxy, confidence), ...]
+    from .scan_card import detect_cards, use_bundle
+    use_bundle(bundle)
+    detections = detect_cards([frame_view(ref)], conf=conf)[0]
+    check_current(ref)
+    return detections
+
+def identify_task(ref, top_k=5, bundle=None, getmore=False): #Worker: OCR + CLIP on a shared card crop -> {"card_info", "best", "matches"}
+    # getmore: what /scan_card_extra_info/ does, more OCR fields, the raw OCR boxes as "ocr_results" and the printed number for the match
+    from .scan_card import get_text_from_image, get_best_matched_clip, use_bundle
+    use_bundle(bundle)
+    card_image = frame_view(ref)
+    ocr_results = None
+    if getmore:
+        card_info, ocr_results = get_text_from_image(card_image, debug=True, getmore=True, show_window=False)
+        best, matches = get_best_matched_clip(card_image, top_k=top_k, show_image=False, ocr_name=card_info.get('name'), card_number=card_info.get('card_number'))
+    else:
+        card_info = get_text_from_image(card_image, debug=False)
+        best, matches = get_best_matched_clip(card_image, top_k=top_k, show_image=False, ocr_name=card_info.get('name'))
+    check_current(ref) # the answer came from the crop we were given, not a later tenant of the slot
+    identified = {"card_info": card_info, "best": best, "matches": matches}
+    if getmore:
+        identified["ocr_results"] = ocr_results
+    return identified
+
+def identify_card_task(ref, bundle=None): #Worker: scan_card.identify_card on a shared card crop (live scanning) -> identity dict or None
+    from .scan_card import identify_card, use_bundle
+    use_bundle(bundle)
+    identity = identify_card(frame_view(ref))
+    check_current(ref)
+    return identity
+
+class ScanProcessPool: #Process pool + frame ring, used from the API process's event loop
+    def __init__(self, processes=SCAN_PROCESSES, slots=SHM_SLOTS):
+        self.ring = FrameRing(slots)
+        self.processes = processes
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self.executor = self._new_executor()
+
+    def _new_executor(self):
+        threads = max(1, (os.cpu_count() or 1) // self.processes)
+        # spawn, not fork: forking the API process after torch started its thread pools can deadlock the children
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(threads,))
+
+    def _submit_warm_up(self): #One no-op per worker so every process starts (and loads its models) now
+        return [self.executor.submit(warm_task) for _ in range(self.processes)]
+
+    async def warm_up(self): #Wait until every worker has loaded its models -> worker pids
+        return set(await asyncio.gather(*(asyncio.wrap_future(f) for f in self._submit_warm_up())))
+
+    def rebuild(self, broken): #Replace a pool that lost a worker, once per breakage, and warm the new one in the background
+        with self._lock:
+            if self.executor is not broken:
+                return
+            print("A scan worker process died, starting a new pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+            self.restarts += 1
+            self._submit_warm_up()
+
+    async def run(self, task, image, *args): #Put image (a frame or a card crop) in a slot, run task(ref, *args) in a worker, free the slot
+        loop = asyncio.get_running_loop()
+        ref = await loop.run_in_executor(None, self.ring.put, image) # the copy (and a wait for a slot) off the event loop
+        executor = self.executor
+        try:
+            return await asyncio.wrap_future(executor.submit(task, ref, *args))
+        except BrokenProcessPool: # this request fails, the next one gets a fresh pool
+            self.rebuild(executor)
+            raise
+        finally:
+            self.ring.release(ref)
+
+    def stats(self):
+        return {"processes": self.processes, "restarts": self.restarts, **self.ring.stats()}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.ring.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_scan_pool(): #The shared pool when SCAN_PROCESSES > 0, else None (scan in process as before)
+    global _pool
+    if SCAN_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ScanProcessPool()
+    return _pool
+
+def shutdown_scan_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -0,0 +1,62 @@
+# STARTUP PROFILE: WHERE THE API PROCESS SPENDS ITS COLD START
+# Heavy libraries (torch, ultralytics, easyocr, clip, faiss, supabase) are imported through lazy_import and
+# model loads are wrapped in timed(), so every process can say how long each one took and how long after
+# process start it finished. Served on /startup_profile and printed once the background warmup is done.
+import sys
+import time
+import threading
+import importlib
+import importlib.util
+import contextlib
+
+PROCESS_START = time.time()  # main.py imports this module first, so this is close to interpreter start
+
+_events = []  # {"kind", "name", "seconds", "at"} with "at" = seconds since PROCESS_START when it finished
+_milestones = {}
+_lock = threading.Lock()
+
+def _record(kind, name, seconds):
+    with _lock:
+        _events.append({"kind": kind, "name": name, "seconds": round(seconds, 3), "at": round(time.time() - PROCESS_START, 3)})
+
+@contextlib.contextmanager
+def timed(kind, name): #with timed("model", "clip"): ... records how long the block took
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(kind, name, time.perf_counter() - start)
+
+def lazy_import(name, package=None): #importlib.import_module that records the first (expensive) import of each module
+    full_name = importlib.util.resolve_name(name, package) if name.startswith(".") else name
+    module = sys.modules.get(full_name)
+    if module is not None:
+        return module
+    with timed("import", full_name):
+        return importlib.import_module(name, package)
+
+def mark(name): #Milestone such as app_ready or models_warm, kept once
+    with _lock:
+        _milestones.setdefault(name, round(time.time() - PROCESS_START, 3))
+
+def milestones():
+    with _lock:
+        return dict(_milestones)
+
+def summary():
+    with _lock:
+        events = list(_events)
+    return {
+        "uptime_seconds": round(time.time() - PROCESS_START, 3),
+        "milestones": milestones(),
+        "imports": [e for e in events if e["kind"] == "import"],
+        "models": [e for e in events if e["kind"] == "model"],
+    }
+
+def print_profile():
+    profile = summary()
+    print("Startup profile (seconds, finished at seconds since process start):")
+    for event in profile["imports"] + profile["models"]:
+        print(f"  {event['kind']:6} {event['name']:28} {event['seconds']:7.2f}  @ {event['at']:.2f}")
+    for name, at in profile["milestones"].items():
+        print(f"  {'mark':6} {name:28} {'':7}  @ {at:.2f}")
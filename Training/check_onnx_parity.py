@@ -0,0 +1,106 @@
+#Parity check: the onnxruntime detector/encoder must agree with the PyTorch ones on the sample images
+#Run after export_onnx.py. Exits non-zero if any image falls outside the tolerances.
+import os
+import sys
+import ssl
+import cv2
+import numpy as np
+import torch
+import clip
+from PIL import Image
+from ultralytics import YOLO
+
+ssl._create_default_https_context = ssl._create_unverified_context
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+from Image_detection.onnx_backend import OnnxDetector, OnnxClipEncoder
+from Image_detection import clip_encoder
+
+IMAGES_DIR = os.path.join(SCRIPT_DIR, '..', 'Image_detection', 'images')
+DETECTOR_PT_PATH = os.path.join(SCRIPT_DIR, '..', 'detector_models', 'pokemon_detector4', 'weights', 'best.pt')
+FAISS_INDEX_FILE = os.path.join(SCRIPT_DIR, 'training_card_identifier', 'clip_card_index.faiss')
+
+MIN_BOX_IOU = 0.9        # top box has to land in the same place
+MAX_CONF_DIFF = 0.05     # letterbox padding differs slightly (ultralytics pads to a stride multiple, we pad to 640)
+MIN_EMB_COSINE = 0.999   # fp32 graph vs fp32 torch, should be numerically the same
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def check_detector(images):
+    torch_model = YOLO(DETECTOR_PT_PATH)
+    onnx_model = OnnxDetector()
+    failures = []
+    for name, image in images:
+        result = torch_model(image, conf=0.25, verbose=False)[0]
+        torch_boxes = [(box.xyxy[0].cpu().numpy(), float(box.conf[0])) for box in result.boxes]
+        onnx_boxes = onnx_model.detect_batch([image], conf=0.25)[0]
+
+        if not torch_boxes and not onnx_boxes:
+            print(f"  {name}: no detections in either backend")
+            continue
+        if not torch_boxes or not onnx_boxes:
+            failures.append(f"{name}: torch found {len(torch_boxes)} boxes, onnx found {len(onnx_boxes)}")
+            continue
+
+        box_iou = iou(torch_boxes[0][0], onnx_boxes[0][0])
+        conf_diff = abs(torch_boxes[0][1] - onnx_boxes[0][1])
+        print(f"  {name}: top box IoU={box_iou:.3f} conf torch={torch_boxes[0][1]:.3f} onnx={onnx_boxes[0][1]:.3f}")
+        if box_iou < MIN_BOX_IOU or conf_diff > MAX_CONF_DIFF:
+            failures.append(f"{name}: IoU {box_iou:.3f}, conf diff {conf_diff:.3f}")
+    return failures
+
+def check_clip(images):
+    torch_model, preprocess = clip.load("ViT-B/32", device="cpu", jit=False)
+    torch_model.eval()
+    onnx_model = OnnxClipEncoder()
+
+    index = None
+    if os.path.exists(FAISS_INDEX_FILE):
+        import faiss
+        index = faiss.read_index(FAISS_INDEX_FILE)
+
+    failures = []
+    for name, image in images:
+        tensor = preprocess(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))).unsqueeze(0)
+        emb_torch = clip_encoder.encode_images(torch_model, tensor)
+        emb_onnx = onnx_model.encode(tensor.numpy())
+        cosine = float(np.sum(emb_torch * emb_onnx))
+        line = f"  {name}: embedding cosine={cosine:.6f}"
+        if cosine < MIN_EMB_COSINE:
+            failures.append(f"{name}: embedding cosine {cosine:.6f}")
+
+        if index is not None:
+            _, I_torch = index.search(emb_torch, 5)
+            _, I_onnx = index.search(emb_onnx, 5)
+            line += f" top-5 same={list(I_torch[0]) == list(I_onnx[0])}"
+            if I_torch[0][0] != I_onnx[0][0]:
+                failures.append(f"{name}: top-1 differs ({I_torch[0][0]} vs {I_onnx[0][0]})")
+        print(line)
+    return failures
+
+if __name__ == "__main__":
+    images = []
+    for filename in sorted(os.listdir(IMAGES_DIR)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            image = cv2.imread(os.path.join(IMAGES_DIR, filename))
+            if image is not None:
+                images.append((filename, image))
+
+    print(f"Checking {len(images)} images\n\nDetector (YOLO .pt vs best.onnx):")
+    failures = check_detector(images)
+    print("\nCLIP visual tower (torch vs clip_visual.onnx):")
+    failures += check_clip(images)
+
+    print('\n' + '=' * 60)
+    if failures:
+        print(f"PARITY FAILED ({len(failures)}):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("ONNX backend matches PyTorch on all images")
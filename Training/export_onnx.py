@@ -0,0 +1,64 @@
+#Export the YOLO card detector and the CLIP visual tower to ONNX for the onnxruntime backend (SCAN_BACKEND=onnx)
+#Usage: python export_onnx.py [--opset 17] [--skip-detector] [--skip-clip]
+import os
+import sys
+import ssl
+import argparse
+import torch
+import clip
+from ultralytics import YOLO
+
+ssl._create_default_https_context = ssl._create_unverified_context
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+from Image_detection.onnx_backend import DETECTOR_ONNX_PATH, CLIP_ONNX_PATH
+
+DETECTOR_PT_PATH = os.path.join(SCRIPT_DIR, '..', 'detector_models', 'pokemon_detector4', 'weights', 'best.pt')
+
+class VisualTower(torch.nn.Module): #Just the image half of CLIP, output is the raw (unnormalized) 512-d embedding
+    def __init__(self, clip_model):
+        super().__init__()
+        self.visual = clip_model.visual
+
+    def forward(self, image):
+        return self.visual(image)
+
+def export_detector(opset):
+    print(f"Exporting detector: {DETECTOR_PT_PATH}")
+    model = YOLO(DETECTOR_PT_PATH)
+    # dynamic=True keeps the batch axis free so tiles/frames can go through in one call
+    exported = model.export(format="onnx", imgsz=640, dynamic=True, simplify=True, opset=opset)
+    if os.path.abspath(exported) != os.path.abspath(DETECTOR_ONNX_PATH):
+        os.replace(exported, DETECTOR_ONNX_PATH)
+    print(f"Detector written to {DETECTOR_ONNX_PATH}")
+
+def export_clip(opset):
+    print("Exporting CLIP ViT-B/32 visual tower...")
+    model, _ = clip.load("ViT-B/32", device="cpu", jit=False)
+    wrapper = VisualTower(model.float()).eval()
+    dummy = torch.randn(1, 3, 224, 224)
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, dummy, CLIP_ONNX_PATH,
+            input_names=["image"], output_names=["embedding"],
+            dynamic_axes={"image": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=opset, do_constant_folding=True
+        )
+    print(f"CLIP visual tower written to {CLIP_ONNX_PATH} ({os.path.getsize(CLIP_ONNX_PATH) / 1024 / 1024:.1f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export detector + CLIP visual tower to ONNX")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--skip-detector", action="store_true")
+    parser.add_argument("--skip-clip", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_detector:
+        export_detector(args.opset)
+    if not args.skip_clip:
+        export_clip(args.opset)
+    print("Run check_onnx_parity.py to check the exported graphs against PyTorch.")
+
+if __name__ == "__main__":
+    main()
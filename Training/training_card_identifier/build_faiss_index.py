@@ -2,11 +2,21 @@ import faiss
 import pickle
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from Image_detection.card_identity import build_identity_table, save_identity_table
+from Image_detection.coarse_search import build_coarse_index, coarse_index_file, EMBEDDING_MATRIX_FILE
+from Image_detection.model_bundles import MODEL_BUNDLE_DIR, INDEX_FILE, INDEX_MAP_FILE as BUNDLE_MAP_FILE, IDENTITY_TABLE_FILE as BUNDLE_IDS_FILE
 
 # Files
-EMBEDDINGS_FILE = "clip_card_embeddings.pkl"
-FAISS_INDEX_FILE = "clip_card_index.faiss"
-INDEX_MAP_FILE = "clip_card_index_map.pkl"
+EMBEDDINGS_FILE = os.getenv("CLIP_EMBEDDINGS_FILE", "clip_card_embeddings.pkl")  # e.g. clip_card_embeddings_int8.pkl from validate_quantized_clip.py --rebuild
+BUNDLE_VERSION = os.getenv("MODEL_BUNDLE_OUTPUT", "")  # write a versioned bundle to MODEL_BUNDLE_DIR/<version>/ instead of this folder
+OUTPUT_DIR = os.path.join(MODEL_BUNDLE_DIR, BUNDLE_VERSION) if BUNDLE_VERSION else "."
+FAISS_INDEX_FILE = os.path.join(OUTPUT_DIR, INDEX_FILE)
+INDEX_MAP_FILE = os.path.join(OUTPUT_DIR, BUNDLE_MAP_FILE)
+IDENTITY_TABLE_FILE = os.path.join(OUTPUT_DIR, BUNDLE_IDS_FILE)
+COARSE_MODES = [m.strip() for m in os.getenv("COARSE_MODES", "pca64,pca128,bin512").split(",") if m.strip()]  # coarse indexes for COARSE_SEARCH
 
 print("Building FAISS index for fast similarity search...")
 
@@ -30,19 +40,35 @@ print(f"Embedding dimension: {embeddings.shape[1]}D")
 # Create FAISS index
 print("\nCreating FAISS index...")
 d = embeddings.shape[1]  # dimension of embeddings (512 for ViT-B/32)
+embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
 index = faiss.IndexFlatIP(d)  # Inner Product = Cosine similarity (for normalized vectors)
 index.add(embeddings)
 
 print(f"Index created with {index.ntotal} vectors")
 
 # Save index
+os.makedirs(OUTPUT_DIR, exist_ok=True)
 print(f"\nSaving FAISS index to {FAISS_INDEX_FILE}...")
 faiss.write_index(index, FAISS_INDEX_FILE)
 print(f"Saving index mapping to {INDEX_MAP_FILE}...")
 with open(INDEX_MAP_FILE, "wb") as f:
     pickle.dump(image_paths, f)
+print(f"Saving identity table to {IDENTITY_TABLE_FILE}...")
+identity_table = build_identity_table(image_paths, check_exists=True)
+save_identity_table(identity_table, IDENTITY_TABLE_FILE)
 
+# Two-stage search files: the raw matrix (memory mapped for the exact rerank) and one small coarse index per mode
+print(f"Saving embedding matrix to {EMBEDDING_MATRIX_FILE}...")
+np.save(os.path.join(OUTPUT_DIR, EMBEDDING_MATRIX_FILE), embeddings)
+for mode in COARSE_MODES:
+    coarse_path = os.path.join(OUTPUT_DIR, coarse_index_file(mode))
+    faiss.write_index(build_coarse_index(embeddings, mode), coarse_path)
+    print(f"Coarse index {coarse_path}: {os.path.getsize(coarse_path) / 1e6:.1f} MB")
 
 print(f"Total cards indexed: {len(image_paths)}")
 print(f"Index file: {FAISS_INDEX_FILE}")
-print(f"Map file: {INDEX_MAP_FILE}")
\ No newline at end of file
+print(f"Map file: {INDEX_MAP_FILE}")
+print(f"Identity table: {IDENTITY_TABLE_FILE}")
+print(f"Coarse indexes: {', '.join(coarse_index_file(m) for m in COARSE_MODES) or 'none'}")
+if BUNDLE_VERSION:
+    print(f"Bundle '{BUNDLE_VERSION}' written, load it with MODEL_BUNDLE={BUNDLE_VERSION} or POST /admin/reload_models?version={BUNDLE_VERSION}")
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# Test script for card matching system
+# Test script for card matching system (full pipeline timings live in Benchmarks/bench_scan.py)
 
 import sys
 import os
@@ -12,24 +12,32 @@ os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
 import torch
 torch.set_default_device('cpu')
 
-from find_card_match import find_best_match
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from Image_detection.scan_card import getbounding, crop_out_card, get_text_from_image, get_best_matched_clip
 
 if __name__ == "__main__":
     # Test with captured card
-    image_path = '../../Image_detection/images/captured_card_3.jpeg'
+    image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../Image_detection/images/captured_card_3.jpeg')
     
     print("Testing card matching system...")
     
-    result = find_best_match(image_path, top_k=5, show_image=False)
+    result = getbounding(image_path, display=False)
+    if not result or not isinstance(result, tuple) or result[1] is None:
+        print("No card detected")
+        sys.exit(1)
+    
+    card_image = crop_out_card(image_path, result[1])
+    card_info = get_text_from_image(card_image, debug=False)
+    best, matches = get_best_matched_clip(card_image, top_k=5, show_image=False, ocr_name=card_info.get('name'))
     
     print('\n' + '='*60)
     print('TEST RESULT:')
     print('='*60)
-    print(f'Best Match: {result["best_match"]}')
-    print(f'Confidence: {result["confidence"]}')
-    print(f'Similarity Score: {result["similarity"]:.4f}')
+    print(f'Best Match: {best["card_id"]} ({best["display_name"]})')
+    print(f'OCR Name: {card_info.get("name")}')
+    print(f'Similarity Score: {best["similarity"]:.4f}')
     print('='*60)
     
     print("\nTop 5 matches:")
-    for i, match in enumerate(result['top_matches'], 1):
-        print(f"{i}. {match['card_name']} - {match['similarity']:.4f} ({match['confidence']})")
+    for i, match in enumerate(matches[:5], 1):
+        print(f"{i}. {match['card_name']} - {match['similarity']:.4f}")
@@ -0,0 +1,164 @@
+#Check that a quantized CLIP image encoder (CLIP_PRECISION=int8/bf16) still finds the same cards as the fp32 index
+#Reports top-1/top-5 agreement against the fp32 FAISS index plus model size, RSS and latency side by side.
+#Usage: python validate_quantized_clip.py --precision int8 [--queries ../../Image_detection/images] [--reference-sample 200] [--rebuild]
+import os
+import sys
+import copy
+import time
+import pickle
+import random
+import argparse
+import multiprocessing
+import ssl
+import numpy as np
+import torch
+import clip
+import faiss
+from PIL import Image
+from tqdm import tqdm
+
+ssl._create_default_https_context = ssl._create_unverified_context
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', '..'))
+from Image_detection import clip_encoder
+from Image_detection.card_identity import load_identity_table, IDENTITY_TABLE_PATH
+
+FAISS_INDEX_FILE = os.path.join(SCRIPT_DIR, "clip_card_index.faiss")
+INDEX_MAP_FILE = os.path.join(SCRIPT_DIR, "clip_card_index_map.pkl")
+DEFAULT_QUERIES = os.path.join(SCRIPT_DIR, '..', '..', 'Image_detection', 'images')
+BATCH_SIZE = 32
+
+def current_rss_mb(): #Resident memory right now (Linux), falls back to peak RSS elsewhere
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def load_rss_mb(precision): #RSS one loaded encoder adds to a process that has only imported torch/clip, runs in a fresh process
+    rss_start = current_rss_mb()
+    model, _ = clip.load("ViT-B/32", device="cpu", jit=False)
+    model, used = clip_encoder.apply_precision(clip_encoder.drop_text_tower(model).eval(), precision)
+    return current_rss_mb() - rss_start, used
+
+def measure_load_rss(precision): #load_rss_mb in a spawned child, so the number isn't inflated by models this process already holds
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(load_rss_mb, (precision,))
+
+def list_images(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+
+def embed_paths(model, preprocess, paths, desc): #Returns (embeddings, per-image seconds)
+    embeddings = []
+    timings = []
+    for path in tqdm(paths, desc=desc):
+        tensor = preprocess(Image.open(path).convert('RGB')).unsqueeze(0)
+        start = time.perf_counter()
+        embeddings.append(clip_encoder.encode_images(model, tensor)[0])
+        timings.append(time.perf_counter() - start)
+    return np.array(embeddings, dtype="float32"), timings
+
+def rebuild_reference_embeddings(model, preprocess, paths, output_file): #Same format as build_card_embeddings.py, so build_faiss_index.py can consume it
+    image_paths = []
+    embeddings = []
+    for i in tqdm(range(0, len(paths), BATCH_SIZE), desc="Re-embedding references"):
+        batch_images = []
+        valid_paths = []
+        for img_path in paths[i:i + BATCH_SIZE]:
+            try:
+                batch_images.append(preprocess(Image.open(img_path)))
+                valid_paths.append(img_path)
+            except Exception as e:
+                print(f"\nFailed to load {os.path.basename(img_path)}: {e}")
+        if not batch_images:
+            continue
+        embeddings.extend(clip_encoder.encode_images(model, torch.stack(batch_images)))
+        image_paths.extend(valid_paths)
+
+    with open(output_file, "wb") as f:
+        pickle.dump({"paths": image_paths, "embeddings": np.array(embeddings).astype("float32")}, f)
+    print(f"Saved {len(image_paths)} embeddings to {output_file}")
+    print(f"Build the index with: CLIP_EMBEDDINGS_FILE={os.path.basename(output_file)} python build_faiss_index.py")
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a quantized CLIP encoder against the fp32 FAISS index")
+    parser.add_argument("--precision", default="int8", choices=[p for p in clip_encoder.SUPPORTED_PRECISIONS if p != "fp32"])
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Folder of query photos/crops")
+    parser.add_argument("--reference-sample", type=int, default=200, help="Also query with N random reference images")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads for the latency numbers")
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed every reference image with the quantized encoder")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    index = faiss.read_index(FAISS_INDEX_FILE)
+    identities = load_identity_table(IDENTITY_TABLE_PATH, map_path=INDEX_MAP_FILE)
+
+    queries = list_images(args.queries) if os.path.isdir(args.queries) else []
+    reference_paths = [p for p in identities['image_path'] if os.path.exists(p)]
+    if args.reference_sample and reference_paths:
+        random.seed(0)
+        queries += random.sample(reference_paths, min(args.reference_sample, len(reference_paths)))
+    if not queries:
+        print("No query images found")
+        exit(1)
+    print(f"{len(queries)} query images")
+
+    # Each encoder's memory is measured on its own: in this process the quantized copy is made while fp32 is still resident
+    rss_fp32, _ = measure_load_rss("fp32")
+    rss_q, used = measure_load_rss(args.precision)
+    if used != args.precision:
+        print(f"{args.precision} not available on this machine")
+        exit(1)
+
+    model_fp32, preprocess = clip.load("ViT-B/32", device="cpu", jit=False)
+    model_fp32 = clip_encoder.drop_text_tower(model_fp32).eval()
+    model_q, _ = clip_encoder.apply_precision(copy.deepcopy(model_fp32), args.precision)
+
+    emb_fp32, t_fp32 = embed_paths(model_fp32, preprocess, queries, "fp32")
+    emb_q, t_q = embed_paths(model_q, preprocess, queries, args.precision)
+
+    _, I_fp32 = index.search(emb_fp32, args.top_k)
+    _, I_q = index.search(emb_q, args.top_k)
+
+    top1_agree = float(np.mean(I_fp32[:, 0] == I_q[:, 0]))
+    top1_in_topk = float(np.mean([I_fp32[i, 0] in I_q[i] for i in range(len(queries))]))
+    topk_overlap = float(np.mean([len(set(I_fp32[i]) & set(I_q[i])) / args.top_k for i in range(len(queries))]))
+    cosine = float(np.mean(np.sum(emb_fp32 * emb_q, axis=1)))
+
+    disagreements = [
+        (os.path.basename(queries[i]), identities['card_id'][I_fp32[i, 0]], identities['card_id'][I_q[i, 0]])
+        for i in range(len(queries)) if I_fp32[i, 0] != I_q[i, 0]
+    ]
+
+    print(f"\n{'':24} {'fp32':>12} {args.precision:>12}")
+    print(f"{'Weights (MB)':24} {clip_encoder.model_size_mb(model_fp32):12.1f} {clip_encoder.model_size_mb(model_q):12.1f}")
+    print(f"{'RSS after load (MB)':24} {rss_fp32:12.1f} {rss_q:12.1f}")
+    print(f"{'Latency p50 (ms)':24} {np.percentile(t_fp32, 50) * 1000:12.1f} {np.percentile(t_q, 50) * 1000:12.1f}")
+    print(f"{'Latency p95 (ms)':24} {np.percentile(t_fp32, 95) * 1000:12.1f} {np.percentile(t_q, 95) * 1000:12.1f}")
+    print(f"\nTop-1 agreement:            {top1_agree:.1%}")
+    print(f"fp32 top-1 in {args.precision} top-{args.top_k}:    {top1_in_topk:.1%}")
+    print(f"Top-{args.top_k} overlap:              {topk_overlap:.1%}")
+    print(f"Mean embedding cosine:      {cosine:.4f}")
+
+    if disagreements:
+        print(f"\nTop-1 disagreements ({len(disagreements)}):")
+        for name, fp32_id, q_id in disagreements[:20]:
+            print(f"  {name}: fp32={fp32_id} {args.precision}={q_id}")
+
+    if args.rebuild:
+        rebuild_reference_embeddings(model_q, preprocess, reference_paths, os.path.join(SCRIPT_DIR, f"clip_card_embeddings_{args.precision}.pkl"))
+
+if __name__ == "__main__":
+    main()